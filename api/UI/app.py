@@ -1,5 +1,6 @@
 # api/UI/app.py
 import os
+import json
 import time
 import requests
 import streamlit as st
@@ -47,6 +48,8 @@ with st.sidebar:
     top_k = st.slider("Top-k passages", 1, 12, 4, 1)
     score_thr = st.slider("Min cosine score", 0.0, 1.0, 0.50, 0.01)
     exact_search = st.toggle("Exact search (exhaustive)", value=False)
+    hybrid = st.toggle("Keyword + semantic (BM25 hybrid)", value=False,
+                       help="Also match exact terms like product names or SLA tiers; scores become rank-fusion scores")
     max_per_doc = st.slider("Max chunks per doc", 1, 5, 2, 1)
 
     if "latency_samples" not in st.session_state:
@@ -57,6 +60,12 @@ with st.sidebar:
         st.caption(f"Avg client RTT: **{avg:.1f} ms** (last {len(st.session_state.latency_samples)})")
 
     if st.button("Clear chat"):
+        if st.session_state.get("chat_session_id"):
+            try:  # free the server-side conversation
+                requests.delete(f"{API_BASE}/chat/{st.session_state.chat_session_id}", timeout=5)
+            except Exception:
+                pass
+        st.session_state.chat_session_id = None
         st.session_state.history = []
         st.session_state.latency_samples = []
 
@@ -71,34 +80,90 @@ with st.expander("Server config", expanded=False):
 # ========== Session state ==========
 if "history" not in st.session_state:
     st.session_state.history = []
+if "chat_session_id" not in st.session_state:
+    st.session_state.chat_session_id = None  # server-side conversation (see /chat)
 
 # ========== Helper to call API (measures client RTT) ==========
-def call_api(query: str, k: int, thr: float, exact: bool, per_doc: int) -> dict:
+def _iter_sse(resp):
+    """Yield (event, data) pairs from a text/event-stream response."""
+    event, data_lines = "message", []
+    for line in resp.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if line == "":
+            if data_lines:
+                yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+
+
+def call_api(query: str, k: int, thr: float, exact: bool, per_doc: int, hybrid: bool = False, on_token=None) -> dict:
+    """
+    Streams one /chat/stream turn and returns the same shape as /ask.
+    The conversation's session_id is kept in st.session_state, so follow-ups continue
+    from the server's (and Ollama's) context instead of starting over.
+    `on_token(text_so_far)` is called for every token so the caller can render incrementally.
+    """
     try:
         c0 = time.perf_counter()
         resp = requests.post(
-            f"{API_BASE}/ask",
+            f"{API_BASE}/chat/stream",
             json={
                 "query": query,
+                "session_id": st.session_state.chat_session_id,
                 "top_k": int(k),
                 "score_threshold": float(thr),
                 "exact_search": bool(exact),
                 "max_per_doc": int(per_doc),
+                "hybrid": bool(hybrid),
             },
+            stream=True,
             timeout=120,  # should align with server's request_timeout to Ollama
         )
+
+        if resp.status_code in (429, 503):  # shed by the generation scheduler
+            retry = resp.headers.get("Retry-After", "?")
+            return {"ok": False, "error": f"The assistant is busy right now, please retry in ~{retry}s."}
+
+        if not resp.headers.get("content-type", "").startswith("text/event-stream"):
+            return {"ok": False, "error": f"Unexpected response ({resp.status_code}): {resp.text[:300]}"}
+
+        data = {"ok": False, "error": "Stream ended early"}
+        sources, retrieved, parts = [], [], []
+        c_first = None
+        for event, payload in _iter_sse(resp):
+            if payload.get("session_id"):
+                st.session_state.chat_session_id = payload["session_id"]
+            if event == "retrieval":
+                sources = payload.get("sources", [])
+                retrieved = payload.get("retrieved", [])
+            elif event == "token":
+                if c_first is None:
+                    c_first = time.perf_counter()
+                parts.append(payload.get("text", ""))
+                if on_token:
+                    on_token("".join(parts))
+            elif event == "metrics":
+                data = payload
+            elif event == "error":
+                data = payload
+                break
         c1 = time.perf_counter()
         client_rtt_ms = round((c1 - c0) * 1000, 2)
 
-        # Parse body
-        if resp.headers.get("content-type", "").startswith("application/json"):
-            data = resp.json()
-        else:
-            data = {"ok": False, "error": f"Non-JSON response ({resp.status_code}): {resp.text[:300]}"}
+        if data.get("ok"):
+            data.setdefault("answer", "".join(parts))
+            data["sources"] = sources
+            data["retrieved"] = retrieved
 
         # Attach client timing
         data.setdefault("metrics", {})
         data["metrics"]["client_rtt_ms"] = client_rtt_ms
+        if c_first is not None:
+            data["metrics"]["client_first_token_ms"] = round((c_first - c0) * 1000, 2)
 
         # Keep a rolling average in sidebar
         st.session_state.latency_samples = (st.session_state.latency_samples + [client_rtt_ms])[-50:]
@@ -107,25 +172,57 @@ def call_api(query: str, k: int, thr: float, exact: bool, per_doc: int) -> dict:
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
-# ========== Chat input & flow ==========
-prompt = st.chat_input("Ask anything about our services, policies, or platform…")
 
-if prompt:
-    st.session_state.history.append({"role": "user", "text": prompt})
-    with st.spinner("Thinking…"):
-        data = call_api(prompt, top_k, score_thr, exact_search, max_per_doc)
-    if not data.get("ok"):
-        st.session_state.history.append(
-            {"role": "assistant", "text": f"⚠️ {data.get('error','Unknown error')}"}
-        )
-    else:
-        st.session_state.history.append({
-            "role": "assistant",
-            "text": (data.get("answer") or "").strip(),
-            "sources": data.get("sources", []),
-            "metrics": data.get("metrics", {}),
-            "retrieved": data.get("retrieved", []),
-        })
+def render_assistant(msg: dict) -> None:
+    st.markdown(msg.get("text") or "—")
+
+    # Sources
+    if msg.get("sources"):
+        st.caption("Sources")
+        for s in msg["sources"]:
+            doc = s.get("doc_id", "unknown")
+            chunk = s.get("chunk", "—")
+            score = s.get("score")
+            score_txt = f"{score:.3f}" if isinstance(score, (int, float)) else "—"
+            st.write(f"- `{doc}` (chunk {chunk} • score {score_txt})")
+
+    # Context the LLM saw
+    if msg.get("retrieved"):
+        with st.expander("Context used"):
+            for i, r in enumerate(msg["retrieved"], 1):
+                doc = r.get("doc_id", "unknown")
+                chk = r.get("chunk", "—")
+                sc = r.get("score")
+                sc_txt = f"{sc:.3f}" if isinstance(sc, (int, float)) else "—"
+                st.markdown(f"**{i}. {doc}#{chk} • score {sc_txt}**")
+                st.write(r.get("text", ""))
+                st.markdown("---")
+
+    # Metrics (includes timings)
+    if msg.get("metrics"):
+        with st.expander("Metrics"):
+            st.json(msg["metrics"])
+            t = msg["metrics"]
+            # Show flattened timing bullets if present
+            tm = t.get("timings_ms", {})
+            bullets = []
+            if "server_total_ms" in tm:
+                bullets.append(f"- **server_total_ms**: {tm['server_total_ms']} ms")
+            if "retrieval_ms" in tm:
+                bullets.append(f"- **retrieval_ms**: {tm['retrieval_ms']} ms")
+            if "generation_ms" in tm:
+                bullets.append(f"- **generation_ms**: {tm['generation_ms']} ms")
+            if "time_to_first_token_ms" in t:
+                bullets.append(f"- **time_to_first_token_ms**: {t['time_to_first_token_ms']} ms")
+            ol = t.get("ollama", {})
+            if "prompt_eval_ms" in ol:
+                bullets.append(f"- **prompt eval / eval**: {ol['prompt_eval_ms']} / {ol.get('eval_ms')} ms "
+                               f"({ol.get('prompt_eval_count')} / {ol.get('eval_count')} tokens)")
+            if "client_rtt_ms" in t:
+                bullets.append(f"- **client_rtt_ms**: {t['client_rtt_ms']} ms")
+            if bullets:
+                st.markdown("\n".join(bullets))
+
 
 # ========== Render conversation ==========
 for msg in st.session_state.history:
@@ -133,45 +230,31 @@ for msg in st.session_state.history:
         st.chat_message("user").markdown(msg["text"])
     else:
         with st.chat_message("assistant"):
-            st.markdown(msg.get("text") or "—")
-
-            # Sources
-            if msg.get("sources"):
-                st.caption("Sources")
-                for s in msg["sources"]:
-                    doc = s.get("doc_id", "unknown")
-                    chunk = s.get("chunk", "—")
-                    score = s.get("score")
-                    score_txt = f"{score:.3f}" if isinstance(score, (int, float)) else "—"
-                    st.write(f"- `{doc}` (chunk {chunk} • score {score_txt})")
-
-            # Context the LLM saw
-            if msg.get("retrieved"):
-                with st.expander("Context used"):
-                    for i, r in enumerate(msg["retrieved"], 1):
-                        doc = r.get("doc_id", "unknown")
-                        chk = r.get("chunk", "—")
-                        sc = r.get("score")
-                        sc_txt = f"{sc:.3f}" if isinstance(sc, (int, float)) else "—"
-                        st.markdown(f"**{i}. {doc}#{chk} • score {sc_txt}**")
-                        st.write(r.get("text", ""))
-                        st.markdown("---")
-
-            # Metrics (includes timings)
-            if msg.get("metrics"):
-                with st.expander("Metrics"):
-                    st.json(msg["metrics"])
-                    t = msg["metrics"]
-                    # Show flattened timing bullets if present
-                    tm = t.get("timings_ms", {})
-                    bullets = []
-                    if "server_total_ms" in tm:
-                        bullets.append(f"- **server_total_ms**: {tm['server_total_ms']} ms")
-                    if "retrieval_ms" in tm:
-                        bullets.append(f"- **retrieval_ms**: {tm['retrieval_ms']} ms")
-                    if "generation_ms" in tm:
-                        bullets.append(f"- **generation_ms**: {tm['generation_ms']} ms")
-                    if "client_rtt_ms" in t:
-                        bullets.append(f"- **client_rtt_ms**: {t['client_rtt_ms']} ms")
-                    if bullets:
-                        st.markdown("\n".join(bullets))
+            render_assistant(msg)
+
+# ========== Chat input & flow ==========
+prompt = st.chat_input("Ask anything about our services, policies, or platform…")
+
+if prompt:
+    st.session_state.history.append({"role": "user", "text": prompt})
+    st.chat_message("user").markdown(prompt)
+
+    with st.chat_message("assistant"):
+        live = st.empty()
+        live.markdown("_Thinking…_")
+        data = call_api(prompt, top_k, score_thr, exact_search, max_per_doc, hybrid,
+                        on_token=lambda text: live.markdown(text + "▌"))
+        live.empty()
+
+        if not data.get("ok"):
+            msg = {"role": "assistant", "text": f"⚠️ {data.get('error','Unknown error')}"}
+        else:
+            msg = {
+                "role": "assistant",
+                "text": (data.get("answer") or "").strip(),
+                "sources": data.get("sources", []),
+                "metrics": data.get("metrics", {}),
+                "retrieved": data.get("retrieved", []),
+            }
+        render_assistant(msg)
+    st.session_state.history.append(msg)
@@ -0,0 +1,163 @@
+# api/bench/chunker.py
+"""
+Chunker micro-benchmark: api/rag/chunker.py against the previous splitter
+(LangChain RecursiveCharacterTextSplitter, 800 chars / 120 overlap, one per call).
+
+Builds a synthetic markdown corpus from the kb/ vocabulary (headings, paragraphs,
+lists, code fences and a share of very long unbroken paragraphs), chunks every
+document with both, and reports chunks/s, MB/s, chunk token sizes and how many
+tokens get embedded in total (overlap included). The old splitter is timed with
+and without the token count ingest then had to run over its chunks.
+
+    python -m api.bench.chunker kb --mb 20 --out chunker.json
+
+The baseline needs langchain-text-splitters (`pip install langchain-text-splitters`);
+without it only the new chunker is measured.
+"""
+from __future__ import annotations
+import json
+import random
+import re
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+import typer
+
+from api.settings import settings
+
+app = typer.Typer(add_completion=False, help="Throughput of the markdown chunker vs the old character splitter")
+
+EMBEDDER_MAX_TOKENS = 256  # all-MiniLM-L6-v2 truncates beyond this
+
+
+def _vocabulary(kb_dir: Path) -> List[str]:
+    words: List[str] = []
+    for f in sorted(kb_dir.rglob("*")):
+        if f.is_file() and f.suffix.lower() in {".md", ".txt"}:
+            words.extend(re.findall(r"[^\W_][\w&/-]*", f.read_text(encoding="utf-8", errors="ignore")))
+    return words or ["lorem", "ipsum", "dolor", "sit", "amet"]
+
+
+def _corpus(words: List[str], mb: float, doc_kb: int, long_share: float, seed: int) -> List[str]:
+    """Synthetic markdown documents of about `doc_kb` KB each, `mb` MB in total."""
+    rng = random.Random(seed)
+
+    def sentence() -> str:
+        return " ".join(rng.choices(words, k=rng.randint(6, 24))).capitalize() + rng.choice(".!?.")
+
+    def paragraph(n: int) -> str:
+        return " ".join(sentence() for _ in range(n))
+
+    docs, total = [], 0
+    while total < mb * 2**20:
+        parts = [f"# {sentence()[:-1]}"]
+        size = 0
+        while size < doc_kb * 1024:
+            kind = rng.random()
+            if kind < 0.15:
+                parts.append(f"{'#' * rng.randint(2, 3)} {sentence()[:-1]}")
+            elif kind < 0.25:
+                parts.append("\n".join(f"- {sentence()}" for _ in range(rng.randint(3, 8))))
+            elif kind < 0.30:
+                parts.append("```\n" + "\n".join(f"x = {rng.random():.6f}  # {sentence()}" for _ in range(10)) + "\n```")
+            elif kind < 0.30 + long_share:
+                parts.append(paragraph(rng.randint(60, 200)))  # one huge paragraph, no blank lines
+            else:
+                parts.append(paragraph(rng.randint(2, 8)))
+            size += len(parts[-1]) + 2
+        doc = "\n\n".join(parts) + "\n"
+        docs.append(doc)
+        total += len(doc.encode("utf-8"))
+    return docs
+
+
+def _baseline() -> Callable[[str], List[str]]:
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    def split(text: str) -> List[str]:
+        splitter = RecursiveCharacterTextSplitter(
+            chunk_size=800, chunk_overlap=120, separators=["\n\n", "\n", " ", ""]
+        )
+        return splitter.split_text(text)
+    return split
+
+
+def _summary(name: str, n_docs: int, nbytes: int, seconds: float, sizes: List[int], extra: dict) -> dict:
+    sizes_a = np.asarray(sizes or [0])
+    return {
+        "splitter": name,
+        "docs": n_docs,
+        "chunks": len(sizes),
+        "seconds": round(seconds, 3),
+        "chunks_per_s": round(len(sizes) / seconds, 1) if seconds else 0.0,
+        "mb_per_s": round(nbytes / 2**20 / seconds, 2) if seconds else 0.0,
+        "tokens_per_chunk": {"mean": round(float(sizes_a.mean()), 1), "p95": int(np.percentile(sizes_a, 95)),
+                             "max": int(sizes_a.max())},
+        "chunks_over_embedder_limit": int((sizes_a > EMBEDDER_MAX_TOKENS).sum()),
+        "embedded_tokens": int(sizes_a.sum()),
+        **extra,
+    }
+
+
+@app.command()
+def run(
+    kb_dir: Path = typer.Argument(Path("kb"), exists=True, file_okay=False, help="Folder whose words seed the corpus"),
+    mb: float = typer.Option(10.0, "--mb", help="Synthetic corpus size"),
+    doc_kb: int = typer.Option(64, "--doc-kb", help="Approximate size of one document"),
+    long_share: float = typer.Option(0.05, "--long-share", help="Share of blocks that are very long paragraphs"),
+    target_tokens: int = typer.Option(0, "--target-tokens", help="Chunk size target (0 = CHUNK_TARGET_TOKENS)"),
+    seed: int = typer.Option(0, "--seed"),
+    out: Path = typer.Option(None, "--out", help="Write the results here as JSON"),
+):
+    """Chunk the same synthetic corpus with both splitters and compare throughput and chunk sizes."""
+    from api.rag.chunker import iter_chunks
+    from api.rag.tokens import token_counter
+
+    counter = token_counter()
+    docs = _corpus(_vocabulary(kb_dir), mb, doc_kb, long_share, seed)
+    nbytes = sum(len(d.encode("utf-8")) for d in docs)
+    typer.echo(f"Corpus: {len(docs)} docs, {nbytes / 2**20:.1f} MB; tokenizer {counter.name}")
+    counter.count_batch(["warm up"])
+
+    results: Dict[str, dict] = {}
+    t0 = time.perf_counter()
+    chunks = [c for d in docs for c in iter_chunks(d.splitlines(keepends=True), target_tokens or None, counter=counter)]
+    seconds = time.perf_counter() - t0
+    results["markdown"] = _summary("markdown", len(docs), nbytes, seconds, [c.n_tokens for c in chunks],
+                                   {"with_headings": sum(bool(c.headings) for c in chunks)})
+
+    try:
+        split = _baseline()
+    except ImportError:
+        typer.secho("langchain-text-splitters not installed: skipping the baseline", fg=typer.colors.YELLOW)
+    else:
+        t0 = time.perf_counter()
+        texts = [c for d in docs for c in split(d)]
+        split_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        sizes = counter.count_batch(texts)
+        count_s = time.perf_counter() - t0
+        results["recursive_character"] = _summary(
+            "recursive_character", len(docs), nbytes, split_s, sizes,
+            {"count_s": round(count_s, 3), "mb_per_s_with_count": round(nbytes / 2**20 / (split_s + count_s), 2)},
+        )
+
+    for r in results.values():
+        typer.echo(f"{r['splitter']:<20} {r['chunks']:>7} chunks  {r['chunks_per_s']:>9.1f} chunks/s  "
+                   f"{r['mb_per_s']:>6.2f} MB/s  tokens/chunk {r['tokens_per_chunk']['mean']:.0f} "
+                   f"(max {r['tokens_per_chunk']['max']}, {r['chunks_over_embedder_limit']} over {EMBEDDER_MAX_TOKENS})  "
+                   f"embedded {r['embedded_tokens']:,} tokens")
+    if "recursive_character" in results:
+        r = results["recursive_character"]
+        typer.echo(f"{'':<20} old splitter incl. token counting: {r['mb_per_s_with_count']:.2f} MB/s")
+
+    if out:
+        out.write_text(json.dumps({"mb": round(nbytes / 2**20, 2), "target_tokens": target_tokens or settings.CHUNK_TARGET_TOKENS,
+                                   "results": results}, indent=2), encoding="utf-8")
+        typer.echo(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,112 @@
+# api/bench/fake_ollama.py
+from __future__ import annotations
+import asyncio
+import json
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import Body, FastAPI
+from fastapi.responses import StreamingResponse
+
+
+def create_app(token_ms: float = 15.0, tokens: int = 40, prompt_ms_per_token: float = 0.05,
+               parallel: int = 1, model: str = "fake:latest") -> FastAPI:
+    """
+    Stand-in for the parts of Ollama's HTTP API the bot uses (/api/tags, /api/generate).
+    Latency is deterministic: prompt evaluation costs `prompt_ms_per_token` per (whitespace)
+    prompt token, then one token is emitted every `token_ms`. Like Ollama, at most
+    `parallel` generations run at once; the rest queue. A `context` from an earlier
+    response is only re-evaluated if it isn't the last conversation in the KV cache.
+    """
+    app = FastAPI(title="fake-ollama")
+    slots = asyncio.Semaphore(max(1, parallel))
+    kv = {"tokens": [], "next": 0}  # one cached conversation, like a single Ollama slot
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": model, "model": model}]}
+
+    @app.post("/api/generate")
+    async def generate(body: dict = Body(...)):
+        prompt = body.get("prompt", "")
+        context = body.get("context") or []
+        n_new = max(1, len(prompt.split()))
+        keep_alive = "keep_alive" in body and not prompt
+
+        async def chunks():
+            t0 = time.perf_counter_ns()
+            if keep_alive:  # model load / keep-alive ping: no generation
+                yield {"model": model, "response": "", "done": True, "done_reason": "load"}
+                return
+            async with slots:
+                hit = context == kv["tokens"][:len(context)]
+                n_prompt = n_new if hit else n_new + len(context)  # miss: the conversation is evaluated again
+                new_ids = list(range(kv["next"], kv["next"] + n_new + tokens))
+                kv["next"] += len(new_ids)
+                kv["tokens"] = context + new_ids
+                t_prompt = time.perf_counter_ns()
+                await asyncio.sleep(n_prompt * prompt_ms_per_token / 1000)
+                t_eval = time.perf_counter_ns()
+                for i in range(tokens):
+                    await asyncio.sleep(token_ms / 1000)
+                    yield {"model": model, "response": f"token{i} ", "done": False}
+                t_end = time.perf_counter_ns()
+            yield {
+                "model": model,
+                "response": "",
+                "done": True,
+                "done_reason": "stop",
+                "context": context + new_ids,
+                "total_duration": t_end - t0,
+                "load_duration": 0,
+                "prompt_eval_count": n_prompt,
+                "prompt_eval_duration": t_eval - t_prompt,
+                "eval_count": tokens,
+                "eval_duration": t_end - t_eval,
+            }
+
+        if body.get("stream", True):
+            async def lines():
+                async for c in chunks():
+                    yield json.dumps(c) + "\n"
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        text, final = [], {}
+        async for c in chunks():
+            text.append(c.get("response", ""))
+            final = c
+        return {**final, "response": "".join(text)}
+
+    return app
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeOllama:
+    """Runs the fake server on a background thread: `with FakeOllama(...) as url: ...`."""
+
+    def __init__(self, **kwargs):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(create_app(**kwargs), host="127.0.0.1", port=self.port, log_level="warning")
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def __enter__(self) -> str:
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self._server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("fake Ollama did not start")
+            time.sleep(0.01)
+        return self.url
+
+    def __exit__(self, *exc) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
@@ -0,0 +1,118 @@
+# api/bench/lexical.py
+"""
+BM25 index benchmark: build time, incremental update, query latency and memory.
+
+Indexes the kb/ chunks `--scale` times over (as distinct documents) in a scratch
+directory, then times queries with and without a doc_id filter.
+
+    python -m api.bench.lexical kb --scale 200 --queries 500 --out lexical.json
+
+End-to-end hybrid vs dense retrieval: python -m api.bench.load kb --hybrid
+"""
+from __future__ import annotations
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import typer
+
+from api.bench.load import QUESTIONS, _percentiles, _rss_mb
+
+app = typer.Typer(add_completion=False, help="Build/query/memory benchmark of the BM25 index")
+
+
+def _rows(kb_dir: Path, scale: int) -> List[Tuple[str, str, int, str]]:
+    from api.rag.chunker import chunk_text
+    docs = []
+    for f in sorted(kb_dir.rglob("*")):
+        if f.is_file() and f.suffix.lower() in {".md", ".txt"}:
+            docs.append((f.relative_to(kb_dir).as_posix(), chunk_text(f.read_text(encoding="utf-8", errors="ignore"))))
+    return [(f"{copy}/{doc_id}#{i}", f"{copy}/{doc_id}", i, chunk)
+            for copy in range(scale) for doc_id, chunks in docs for i, chunk in enumerate(chunks)]
+
+
+def _dir_bytes(path: Path) -> int:
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _time_queries(idx, queries: List[str], top_k: int, doc_ids=None) -> dict:
+    lat = []
+    for q in queries:
+        t0 = time.perf_counter()
+        idx.search(q, top_k, doc_ids)
+        lat.append((time.perf_counter() - t0) * 1000)
+    return _percentiles(lat)
+
+
+@app.command()
+def run(
+    kb_dir: Path = typer.Argument(Path("kb"), exists=True, file_okay=False, help="Folder with KB files"),
+    scale: int = typer.Option(100, "--scale", help="Copies of the KB to index"),
+    queries: int = typer.Option(300, "--queries", help="Queries to time (cycled from the load-test questions)"),
+    top_k: int = typer.Option(4, "--top-k", "-k"),
+    out: Path = typer.Option(None, "--out", help="Write the results here as JSON"),
+):
+    from api.rag.lexical import BM25Index
+
+    rows = _rows(kb_dir, max(1, scale))
+    if not rows:
+        typer.secho(f"No .md/.txt chunks under {kb_dir}", fg=typer.colors.RED)
+        raise typer.Exit(1)
+    qs = [QUESTIONS[i % len(QUESTIONS)] for i in range(queries)]
+
+    with tempfile.TemporaryDirectory(prefix="bm25-bench-") as scratch:
+        rss0 = _rss_mb()["current"]
+        idx = BM25Index(Path(scratch))
+        t0 = time.perf_counter()
+        idx.update(add=rows)
+        build_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        idx.save()
+        save_s = time.perf_counter() - t0
+        rss_build = _rss_mb()["current"] - rss0
+
+        t0 = time.perf_counter()
+        loaded = BM25Index(Path(scratch)).load()
+        load_s = time.perf_counter() - t0
+
+        # one typical re-ingest: 1% of rows replaced
+        n_change = max(1, len(rows) // 100)
+        t0 = time.perf_counter()
+        loaded.update(add=[(f"new-{pid}", doc, i, text) for pid, doc, i, text in rows[:n_change]],
+                      remove=[pid for pid, *_ in rows[:n_change]])
+        update_s = time.perf_counter() - t0
+
+        st = idx.stats()
+        result = {
+            "rows": st["rows"],
+            "terms": st["terms"],
+            "postings": st["postings"],
+            "build_s": round(build_s, 3),
+            "rows_per_s": round(len(rows) / build_s, 1) if build_s else 0.0,
+            "save_s": round(save_s, 3),
+            "load_s": round(load_s, 3),
+            "update_1pct_s": round(update_s, 3),
+            "array_mb": round(st["array_bytes"] / 2**20, 3),
+            "disk_mb": round(_dir_bytes(Path(scratch)) / 2**20, 3),
+            "rss_build_mb": round(rss_build, 1),
+            "query_ms": _time_queries(idx, qs, top_k),
+            "query_filtered_ms": _time_queries(idx, qs, top_k, doc_ids=[rows[0][1]]),
+        }
+
+    typer.echo(f"{result['rows']} rows, {result['terms']} terms, {result['postings']} postings")
+    typer.echo(f"build {result['build_s']:.2f}s ({result['rows_per_s']:.0f} rows/s) | save {result['save_s']:.2f}s | "
+               f"load {result['load_s']:.2f}s | 1% update {result['update_1pct_s']:.2f}s")
+    typer.echo(f"memory: arrays {result['array_mb']:.1f} MB, disk {result['disk_mb']:.1f} MB, "
+               f"RSS +{result['rss_build_mb']:.0f} MB while building")
+    q, fq = result["query_ms"], result["query_filtered_ms"]
+    typer.echo(f"query p50/p95/p99 {q['p50']:.3f}/{q['p95']:.3f}/{q['p99']:.3f} ms | "
+               f"doc_id-filtered {fq['p50']:.3f}/{fq['p95']:.3f}/{fq['p99']:.3f} ms")
+    if out:
+        out.write_text(json.dumps(result, indent=2), encoding="utf-8")
+        typer.echo(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,290 @@
+# api/bench/load.py
+"""
+Offline load test for the RAG API.
+
+Boots `api.main.app` in-process against an in-memory Qdrant seeded from kb/ and a
+fake Ollama server, drives concurrent request profiles and writes per-stage
+p50/p95/p99, throughput and RSS as JSON. With --baseline, exits 1 when any p95
+(or throughput) regressed by more than --max-regression.
+
+    python -m api.bench.load kb --profiles 1x20,8x80 --out bench.json
+    python -m api.bench.load kb --baseline bench.json --max-regression 0.2
+"""
+from __future__ import annotations
+import asyncio
+import json
+import platform
+import resource
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+import typer
+
+from api.bench.fake_ollama import FakeOllama
+from api.settings import settings
+
+app = typer.Typer(add_completion=False, help="Offline /ask load test (in-memory Qdrant + fake Ollama)")
+
+STAGES = ("embed_ms", "search_ms", "curation_ms", "prompt_ms", "queue_ms", "generation_ms", "server_total_ms")
+
+QUESTIONS = [
+    "What is your SLA response time for critical incidents?",
+    "Which cloud providers do you support?",
+    "How do you build Power BI dashboards?",
+    "What CRM platforms do you implement?",
+    "Do you offer web and mobile app development?",
+    "How does the customer platform handle onboarding?",
+    "What are your support hours?",
+    "How do you migrate data pipelines to the cloud?",
+    "Give me an overview of your services",
+    "What happens if an SLA is breached?",
+]
+
+
+def _parse_profiles(spec: str) -> List[Tuple[int, int]]:
+    out = []
+    for part in spec.split(","):
+        conc, _, n = part.strip().lower().partition("x")
+        out.append((int(conc), int(n)))
+    return out
+
+
+def _percentiles(values: List[float]) -> dict:
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "n": 0}
+    p50, p95, p99 = np.percentile(np.asarray(values, dtype=np.float64), [50, 95, 99])
+    return {"p50": round(float(p50), 3), "p95": round(float(p95), 3), "p99": round(float(p99), 3), "n": len(values)}
+
+
+def _rss_mb() -> dict:
+    current = 0.0
+    try:
+        with open("/proc/self/status", encoding="ascii") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    current = int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+    return {"current": round(current, 1), "peak": round(peak, 1)}
+
+
+def _metrics_from_sse(body: str) -> dict:
+    """Last `event: metrics` payload of an /ask/stream response."""
+    found: dict = {"ok": False, "error": "no metrics event"}
+    for frame in body.split("\n\n"):
+        lines = frame.splitlines()
+        if lines and lines[0] == "event: metrics":
+            found = json.loads("\n".join(l[len("data: "):] for l in lines[1:] if l.startswith("data: ")))
+        elif lines and lines[0] == "event: error":
+            found = json.loads(lines[1][len("data: "):])
+    return found
+
+
+async def _seed(kb_dir: Path, lexical: bool = False) -> int:
+    """Chunk + embed kb/ and upsert straight into the API's (in-memory) Qdrant (+ its BM25 index)."""
+    from qdrant_client.http.models import PointStruct
+    from api import main
+    from api.rag.chunker import chunk_markdown
+    from api.rag.compress import encode_vectors, sentence_payload, split_for_compression
+    from api.rag.lexical import BM25Index, index_path
+    from api.rag.manifest import content_hash
+    from api.rag.tokens import token_counter
+    from api.rag.vector import backend, point_id
+
+    points, rows = [], []
+    for f in sorted(kb_dir.rglob("*")):
+        if not f.is_file() or f.suffix.lower() not in {".md", ".txt"}:
+            continue
+        doc_id = f.relative_to(kb_dir).as_posix()
+        chunked = chunk_markdown(f.read_text(encoding="utf-8", errors="ignore"))
+        if not chunked:
+            continue
+        chunks = [c.text for c in chunked]
+        vecs = await main.aembed_array(chunks)
+        # sentence data for --compress, as ingest_kb stores it
+        sentences = split_for_compression(chunks)
+        flat = [s for pieces in sentences for s in pieces]
+        sent_vecs = await main.aembed_array(flat) if flat else None
+        sent_tokens = token_counter().count_batch(flat)
+        pos = 0
+        for i, (c, chunk, vec, pieces) in enumerate(zip(chunked, chunks, vecs, sentences)):
+            payload = {"doc_id": doc_id, "chunk_id": i, "text": chunk, "n_tokens": c.n_tokens,
+                       "tokenizer": token_counter().name, **c.payload()}
+            if pieces:
+                end = pos + len(pieces)
+                payload.update(sentence_payload(pieces, sent_tokens[pos:end]),
+                               sent_vecs=encode_vectors(sent_vecs[pos:end]))
+                pos = end
+            pid = point_id(doc_id, i, content_hash(chunk))
+            points.append(PointStruct(id=pid, vector=vec.tolist(), payload=payload))
+            rows.append((pid, doc_id, i, chunk))
+    await main.ensure_collection()
+    await backend().aclient().upsert(collection_name=settings.QDRANT_COLLECTION, points=points, wait=True)
+    if lexical:
+        idx = BM25Index(index_path(settings.QDRANT_COLLECTION))
+        idx.update(add=rows)
+        idx.save()
+    return len(points)
+
+
+async def _profile(client: httpx.AsyncClient, endpoint: str, concurrency: int, requests: int) -> dict:
+    samples: Dict[str, List[float]] = {k: [] for k in STAGES}
+    client_ms: List[float] = []
+    errors = 0
+    counter = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            body = {"query": QUESTIONS[i % len(QUESTIONS)], "top_k": 4, "score_threshold": 0.2}
+            t0 = time.perf_counter()
+            try:
+                r = await client.post(endpoint, json=body)
+                data = _metrics_from_sse(r.text) if endpoint.endswith("/stream") else r.json()
+            except Exception as e:  # transport errors count like API errors
+                data = {"ok": False, "error": str(e)}
+            client_ms.append((time.perf_counter() - t0) * 1000)
+            if not data.get("ok"):
+                errors += 1
+                continue
+            timings = data.get("metrics", {}).get("timings_ms", {})
+            for k in STAGES:
+                if k in timings:
+                    samples[k].append(float(timings[k]))
+
+    t_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t_start
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(requests / wall, 3) if wall else 0.0,
+        "latency_ms": {"client": _percentiles(client_ms), **{k: _percentiles(v) for k, v in samples.items()}},
+        "rss_mb": _rss_mb(),
+    }
+
+
+def _regressions(current: dict, baseline: dict, max_regression: float, min_delta_ms: float) -> List[str]:
+    base = {(p["concurrency"], p["requests"]): p for p in baseline.get("profiles", [])}
+    found = []
+    for p in current["profiles"]:
+        b = base.get((p["concurrency"], p["requests"]))
+        if b is None:
+            continue
+        label = f"{p['concurrency']}x{p['requests']}"
+        for stage, stats in p["latency_ms"].items():
+            old = b["latency_ms"].get(stage, {}).get("p95")
+            new = stats["p95"]
+            if old is not None and new - old > min_delta_ms and new > old * (1 + max_regression):
+                found.append(f"{label} {stage} p95 {old:.2f} → {new:.2f} ms")
+        if p["throughput_rps"] < b["throughput_rps"] * (1 - max_regression):
+            found.append(f"{label} throughput {b['throughput_rps']:.2f} → {p['throughput_rps']:.2f} req/s")
+    return found
+
+
+async def _run(kb_dir: Path, profiles: List[Tuple[int, int]], endpoint: str, cache: bool, compress: bool,
+               hybrid: bool, emb_cache: bool, ollama: dict) -> dict:
+    with FakeOllama(**ollama) as ollama_url, tempfile.TemporaryDirectory(prefix="rag-bench-") as scratch:
+        # point the app at the stand-ins before any lazy singleton is created
+        settings.VECTOR_BACKEND = "qdrant"
+        settings.QDRANT_URL = ":memory:"
+        settings.OLLAMA_URL = ollama_url
+        settings.SEMANTIC_CACHE_ENABLED = cache
+        settings.COMPRESS_CONTEXT = compress
+        settings.HYBRID_RETRIEVAL = hybrid
+        # off by default: with it, every repeat of QUESTIONS is an LRU hit and embed timings
+        # aren't comparable with runs that embed each query
+        settings.EMB_CACHE_ENABLED = emb_cache
+        # BM25 index, embedding cache and version stamps go to a scratch dir, never over real ones
+        from api.rag.sidecar import socket_path
+        settings.EMBED_SOCKET = str(socket_path())  # pinned before DATA_DIR moves
+        settings.DATA_DIR = scratch
+        settings.EMB_CACHE_PATH = ""
+        from api import main
+
+        async with main.app.router.lifespan_context(main.app):
+            t_seed = time.perf_counter()
+            n_points = await _seed(kb_dir, lexical=hybrid)
+            seed_s = time.perf_counter() - t_seed
+            typer.echo(f"Seeded {n_points} chunks in {seed_s:.1f}s | fake Ollama @ {ollama_url}")
+
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+                await client.post(endpoint, json={"query": QUESTIONS[0]})  # warm-up
+                results = []
+                for conc, n in profiles:
+                    res = await _profile(client, endpoint, conc, n)
+                    lat = res["latency_ms"]
+                    typer.echo(
+                        f"{conc:>4}x{n:<5} {res['throughput_rps']:8.2f} req/s | client p50/p95/p99 "
+                        f"{lat['client']['p50']:.0f}/{lat['client']['p95']:.0f}/{lat['client']['p99']:.0f} ms | "
+                        f"embed p95 {lat['embed_ms']['p95']:.1f} | search p95 {lat['search_ms']['p95']:.1f} | "
+                        f"errors {res['errors']} | rss {res['rss_mb']['current']} MB"
+                    )
+                    results.append(res)
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "endpoint": endpoint,
+            "emb_model": settings.EMB_PATH,
+            "points": n_points,
+            "semantic_cache": cache,
+            "compress": compress,
+            "hybrid": hybrid,
+            "emb_cache": emb_cache,
+            "fake_ollama": ollama,
+        },
+        "profiles": results,
+    }
+
+
+@app.command()
+def run(
+    kb_dir: Path = typer.Argument(Path("kb"), exists=True, file_okay=False, help="Folder to seed the in-memory Qdrant from"),
+    profiles: str = typer.Option("1x20,4x40,16x80", "--profiles", help="Comma-separated <concurrency>x<requests>"),
+    endpoint: str = typer.Option("/ask", "--endpoint", help="/ask or /ask/stream"),
+    token_ms: float = typer.Option(15.0, "--token-ms", help="Fake Ollama: ms per generated token"),
+    tokens: int = typer.Option(40, "--tokens", help="Fake Ollama: tokens per answer"),
+    prompt_ms_per_token: float = typer.Option(0.05, "--prompt-ms-per-token", help="Fake Ollama: prompt eval cost"),
+    ollama_parallel: int = typer.Option(1, "--ollama-parallel", help="Fake Ollama: concurrent generations"),
+    cache: bool = typer.Option(False, "--cache/--no-cache", help="Keep the semantic answer cache on"),
+    compress: bool = typer.Option(False, "--compress/--no-compress", help="Extractive context compression"),
+    hybrid: bool = typer.Option(False, "--hybrid/--no-hybrid", help="BM25 + vector retrieval fused with RRF"),
+    emb_cache: bool = typer.Option(False, "--emb-cache/--no-emb-cache",
+                                   help="Keep the embedding cache on (a fresh one in the scratch dir)"),
+    out: Path = typer.Option(Path("bench_results.json"), "--out", "-o"),
+    baseline: Optional[Path] = typer.Option(None, "--baseline", help="Earlier results JSON to compare against"),
+    max_regression: float = typer.Option(0.20, "--max-regression", help="Allowed p95 growth (fraction)"),
+    min_delta_ms: float = typer.Option(1.0, "--min-delta-ms", help="Ignore p95 changes smaller than this"),
+):
+    ollama = {"token_ms": token_ms, "tokens": tokens, "prompt_ms_per_token": prompt_ms_per_token,
+              "parallel": ollama_parallel}
+    result = asyncio.run(_run(kb_dir, _parse_profiles(profiles), endpoint, cache, compress, hybrid, emb_cache,
+                             ollama))
+
+    out.write_text(json.dumps(result, indent=2), encoding="utf-8")
+    typer.echo(f"Results → {out}")
+
+    if baseline is not None:
+        found = _regressions(result, json.loads(baseline.read_text(encoding="utf-8")), max_regression, min_delta_ms)
+        if found:
+            typer.secho("Regressions vs baseline:", fg=typer.colors.RED)
+            for line in found:
+                typer.echo(f"  {line}")
+            raise typer.Exit(code=1)
+        typer.secho(f"No regressions vs {baseline} (threshold {max_regression:.0%})", fg=typer.colors.GREEN)
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,176 @@
+# api/bench/quant.py
+"""
+Embedding backend × vector quantization benchmark.
+
+For each EMB_BACKEND it encodes the kb/ chunks (chunks/s, per-query latency, RSS),
+and for each backend × QDRANT_QUANTIZATION it loads a scratch collection and times
+searches. Top-k overlap is measured against the current setup: exact float32 search
+over vectors from the first backend (normally "torch").
+
+    python -m api.bench.quant kb --backends torch,torch-int8 --quantization none,scalar,binary
+    python -m api.bench.quant kb --qdrant-url http://localhost:6333 --out quant.json
+
+The in-memory Qdrant (default) stores the quantization config but searches exactly;
+point --qdrant-url at a real server for meaningful search latency and overlap.
+"""
+from __future__ import annotations
+import gc
+import json
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import typer
+
+from api.bench.load import QUESTIONS, _percentiles, _rss_mb
+from api.settings import settings
+
+app = typer.Typer(add_completion=False, help="Compare embedding backends and Qdrant quantization modes")
+
+
+def _chunks(kb_dir: Path) -> List[str]:
+    from api.rag.chunker import chunk_text
+    out: List[str] = []
+    for f in sorted(kb_dir.rglob("*")):
+        if f.is_file() and f.suffix.lower() in {".md", ".txt"}:
+            out.extend(chunk_text(f.read_text(encoding="utf-8", errors="ignore")))
+    return out
+
+
+def _top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> List[List[int]]:
+    """Exact cosine top-k (vectors are normalized)."""
+    scores = queries @ vectors.T
+    return [np.argsort(-row, kind="stable")[:k].tolist() for row in scores]
+
+
+def _overlap(found: List[List[int]], truth: List[List[int]], distinct: int) -> float:
+    """Mean share of the reference top-k found; ids are folded mod `distinct` so repeated chunks count once."""
+    shares = []
+    for f, t in zip(found, truth):
+        ref = {i % distinct for i in t}
+        shares.append(len({i % distinct for i in f} & ref) / len(ref))
+    return round(float(np.mean(shares)), 4) if shares else 0.0
+
+
+def _vector_bytes(n: int, dim: int, mode: str) -> dict:
+    """Approximate vector storage: originals (RAM unless on_disk) plus the quantized copy kept in RAM."""
+    quantized = {"none": 0, "scalar": n * dim, "binary": n * ((dim + 7) // 8)}[mode]
+    return {"original_mb": round(n * dim * 4 / 2**20, 3), "quantized_mb": round(quantized / 2**20, 3)}
+
+
+def _encode(backend: str, chunks: List[str], queries: List[str], batch_size: int) -> tuple[np.ndarray, np.ndarray, dict]:
+    from api.rag.embed import create_embedder
+
+    rss_before = _rss_mb()["current"]
+    t0 = time.perf_counter()
+    model = create_embedder(settings.EMB_PATH, backend, settings.EMB_MODEL_FILE if backend in ("onnx", "openvino") else "")
+    load_s = time.perf_counter() - t0
+
+    def encode(texts: List[str]) -> np.ndarray:
+        return model.encode(texts, batch_size=batch_size, normalize_embeddings=True,
+                            convert_to_numpy=True).astype(np.float32, copy=False)
+
+    encode(chunks[:batch_size])  # warm up kernels / allocator
+
+    t0 = time.perf_counter()
+    vectors = encode(chunks)
+    encode_s = time.perf_counter() - t0
+    lat, qvecs = [], []
+    for q in queries:
+        t1 = time.perf_counter()
+        qvecs.append(encode([q])[0])
+        lat.append((time.perf_counter() - t1) * 1000)
+    stats = {
+        "load_s": round(load_s, 3),
+        "chunks": len(chunks),
+        "encode_s": round(encode_s, 3),
+        "chunks_per_s": round(len(chunks) / encode_s, 1) if encode_s else 0.0,
+        "query_encode_ms": _percentiles(lat),
+        "rss_mb": round(_rss_mb()["current"] - rss_before, 1),
+    }
+    del model
+    gc.collect()
+    return vectors, np.stack(qvecs), stats
+
+
+def _search(url: str, name: str, mode: str, vectors: np.ndarray, queries: np.ndarray, k: int,
+            on_disk: bool) -> tuple[List[List[int]], dict]:
+    from qdrant_client import QdrantClient
+    from qdrant_client.http.models import PointStruct
+    from api.rag.vector import collection_config, search_params
+
+    q = QdrantClient(location=url)
+    if q.collection_exists(name):
+        q.delete_collection(name)
+    q.create_collection(collection_name=name, **collection_config(vectors.shape[1], quantization=mode, on_disk=on_disk))
+    try:
+        t0 = time.perf_counter()
+        for i in range(0, len(vectors), 256):
+            q.upsert(name, points=[PointStruct(id=j, vector=v.tolist(), payload={})
+                                   for j, v in enumerate(vectors[i:i + 256], start=i)], wait=True)
+        upsert_s = time.perf_counter() - t0
+        params = search_params(quantization=mode)
+        found, lat = [], []
+        for qv in queries:
+            t1 = time.perf_counter()
+            res = q.query_points(name, query=qv.tolist(), limit=k, search_params=params, with_payload=False)
+            lat.append((time.perf_counter() - t1) * 1000)
+            found.append([int(p.id) for p in res.points])
+        return found, {"upsert_s": round(upsert_s, 3), "search_ms": _percentiles(lat),
+                       **_vector_bytes(len(vectors), vectors.shape[1], mode)}
+    finally:
+        q.delete_collection(name)
+        q.close()
+
+
+@app.command()
+def run(
+    kb_dir: Path = typer.Argument(Path("kb"), exists=True, file_okay=False, help="Folder with KB files"),
+    backends: str = typer.Option("torch,torch-int8", "--backends", help="EMB_BACKENDs; the first is the reference"),
+    quantization: str = typer.Option("none,scalar,binary", "--quantization", help="QDRANT_QUANTIZATION modes"),
+    qdrant_url: str = typer.Option(":memory:", "--qdrant-url", help="Qdrant to create scratch collections in"),
+    on_disk: bool = typer.Option(False, "--on-disk/--in-ram", help="Original vectors on disk (QDRANT_ON_DISK)"),
+    top_k: int = typer.Option(5, "--top-k", "-k"),
+    batch_size: int = typer.Option(64, "--batch-size", help="encode() batch size"),
+    min_chunks: int = typer.Option(2000, "--min-chunks", help="Repeat the KB's chunks up to this many (small KBs)"),
+    out: Path = typer.Option(None, "--out", help="Write the results here as JSON"),
+):
+    """Encode throughput, search latency, memory and top-k overlap per backend × quantization."""
+    chunks = _chunks(kb_dir)
+    if not chunks:
+        typer.secho(f"No .md/.txt chunks under {kb_dir}", fg=typer.colors.RED)
+        raise typer.Exit(1)
+    distinct = len(chunks)
+    chunks = (chunks * (-(-min_chunks // distinct)))[:max(min_chunks, distinct)]
+    backend_list = [b.strip() for b in backends.split(",") if b.strip()]
+    modes = [m.strip() for m in quantization.split(",") if m.strip()]
+    if qdrant_url == ":memory:":
+        typer.secho("In-memory Qdrant searches exactly: quantized search numbers need --qdrant-url", fg=typer.colors.YELLOW)
+
+    results: Dict[str, dict] = {"model": settings.EMB_PATH, "qdrant": qdrant_url, "top_k": top_k,
+                                "on_disk": on_disk, "embedding": {}, "search": {}}
+    truth = None
+    for b in backend_list:
+        vectors, qvecs, stats = _encode(b, chunks, QUESTIONS, batch_size)
+        exact = _top_k(vectors, qvecs, top_k)
+        truth = truth if truth is not None else exact
+        stats["overlap_at_k"] = _overlap(exact, truth, distinct)  # embedding drift alone (exact search)
+        results["embedding"][b] = stats
+        typer.echo(f"{b:<12} {stats['chunks_per_s']:>9.1f} chunks/s  query p50 {stats['query_encode_ms']['p50']:7.2f} ms  "
+                   f"+{stats['rss_mb']:.0f} MB  overlap@{top_k} {stats['overlap_at_k']:.3f}")
+        for mode in modes:
+            found, s = _search(qdrant_url, f"bench_quant_{b.replace('-', '_')}_{mode}", mode, vectors, qvecs, top_k, on_disk)
+            s["overlap_at_k"] = _overlap(found, truth, distinct)
+            results["search"][f"{b}/{mode}"] = s
+            typer.echo(f"  {mode:<8} search p50 {s['search_ms']['p50']:7.2f} ms  p95 {s['search_ms']['p95']:7.2f} ms  "
+                       f"vectors {s['original_mb']:.1f} MB + {s['quantized_mb']:.1f} MB quantized  "
+                       f"overlap@{top_k} {s['overlap_at_k']:.3f}")
+
+    if out:
+        out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        typer.echo(f"Wrote {out}")
+
+
+if __name__ == "__main__":
+    app()
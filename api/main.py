@@ -2,127 +2,470 @@
 AI Support Bot — RAG API (answer-only)
 --------------------------------------
 Stack:
-- Qdrant (vector DB)
-- SentenceTransformers (embeddings)  -> settings.EMB_PATH
+- Qdrant (vector DB) or the local NumPy index -> settings.VECTOR_BACKEND
+- SentenceTransformers (embeddings)  -> settings.EMB_PATH (in-process or a shared sidecar: EMBED_MODE)
 - Ollama (LLM)                       -> settings.OLLAMA_MODEL
 
 Public endpoints for the UI:
 - GET  /health
+- GET  /ready        (200 once the embedder, Ollama model and collection are warm, else 503)
 - GET  /config
 - POST /ask
+- POST /ask/stream   (SSE: retrieval → tokens → metrics)
+- POST /ask/batch    (NDJSON, one line per question as it finishes)
+- POST /chat         (multi-turn; continues from Ollama's context instead of resending everything)
+- POST /chat/stream  (SSE, same events as /ask/stream)
+- DELETE /chat/{session_id}
+
+Ingestion (background jobs, see api/rag/jobs.py):
+- POST /ingest/jobs  (a server directory or uploaded files → job id)
+- GET  /ingest/jobs, GET /ingest/jobs/{job_id}  (status, progress, chunks/s, ETA)
+- POST /ingest/jobs/{job_id}/resume
 
 Light ops:
 - GET  /ping/qdrant
 - GET  /ping/ollama
 - GET  /ping/embeddings
 - GET  /stats
+- GET  /stats/embedder
+- GET  /stats/cache
+- GET  /stats/generation
+- GET  /stats/sessions
+- GET  /metrics      (Prometheus text format)
 """
 from __future__ import annotations
+import time
+
+_T_IMPORT = time.perf_counter()
 
+from contextlib import asynccontextmanager
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, Body
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List, Optional
-from statistics import mean
-import requests
-
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams  # PointStruct not needed now
-
-# Prefer new package; fall back to community if needed
-try:
-    from langchain_ollama import OllamaLLM as _Ollama
-except Exception:  # pragma: no cover
-    from langchain_community.llms import Ollama as _Ollama
-
-from sentence_transformers import SentenceTransformer
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-# top of file with the other imports
-from .rag.prompts import build_prompt
-from qdrant_client.http.models import SearchParams  # <-- for exact search (optional)
-import time
-from qdrant_client.http.models import SearchParams
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+import asyncio
+import json
+import logging
 
+import numpy as np
 
+from .rag.batcher import EmbedBatcher
+from .rag.cache import CacheHit, SemanticCache, cache_params
+from .rag.compress import COMPRESS_FIELDS, compress as compress_hits
+from .rag.embcache import embedding_cache, model_key
+from .rag.jobs import JobRunner, JobStore, jobs_root
+from .rag.lexical import BM25Index, index_path as lexical_path, rrf_fuse
+from .rag.llm import OllamaClient, eval_stats
+from .rag import metrics as prom
+from .rag.packing import Packed, pack_prompt
+from .rag.prompts import build_followup_prompt
+from .rag.scheduler import GenerationScheduler, Priority, Rejected
+from .rag.sessions import ChatSession, SessionStore
+from .rag.singleflight import Broadcast, SingleFlight, WaitTimeout, normalize_query
+from .rag.sidecar import SidecarClient, socket_path
+from .rag.tokens import TokenCounter, loaded_counter, token_counter
+from .rag.utils import COLLECTION_NAME
+from .rag.vector import backend, collection_version
 from .settings import settings
 
-# -----------------------------------------------------------------------------
-# App + CORS
-# -----------------------------------------------------------------------------
-app = FastAPI(title="AI Support Bot — RAG API")
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # tighten in prod
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+if TYPE_CHECKING:  # torch / transformers load on first use, not at import
+    from sentence_transformers import SentenceTransformer
+
+log = logging.getLogger("api")
 
 # -----------------------------------------------------------------------------
 # Lazy singletons
 # -----------------------------------------------------------------------------
-_qdrant: Optional[QdrantClient] = None
-_llm: Optional[_Ollama] = None
+_llm: Optional[OllamaClient] = None
 _embed: Optional[SentenceTransformer] = None
+_embed_pool: Optional[ThreadPoolExecutor] = None
+_batcher: Optional[EmbedBatcher] = None
+_sidecar: Optional[SidecarClient] = None
+_embed_key: Optional[str] = None
+_answer_cache: Optional[SemanticCache] = None
+_gen_scheduler: Optional[GenerationScheduler] = None
+_flights: Optional[SingleFlight] = None
+_sessions: Optional[SessionStore] = None
+_jobs: Optional[JobRunner] = None
+_lexical: Dict[str, BM25Index] = {}
+_lexical_target: Optional[tuple[str, str]] = None  # (collection version, collection the alias resolved to)
+_collection_ready = False
 
 
-def qdrant() -> QdrantClient:
-    global _qdrant
-    if _qdrant is None:
-        _qdrant = QdrantClient(url=settings.QDRANT_URL)
-    return _qdrant
-
-
-def llm() -> _Ollama:
+def llm() -> OllamaClient:
     global _llm
     if _llm is None:
-        _llm = _Ollama(
+        _llm = OllamaClient(
             base_url=settings.OLLAMA_URL,
             model=settings.OLLAMA_MODEL,
             temperature=0.2,
-            num_ctx=4096)
+            num_ctx=settings.OLLAMA_NUM_CTX,
+            timeout=settings.OLLAMA_TIMEOUT,
+            max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+            keep_alive=settings.OLLAMA_KEEP_ALIVE,
+            num_predict=settings.ANSWER_RESERVE_TOKENS,
+        )
     return _llm
 
 
 def embedder() -> SentenceTransformer:
     global _embed
     if _embed is None:
-        _embed = SentenceTransformer(settings.EMB_PATH)
+        from .rag.embed import create_embedder, set_torch_threads
+        set_torch_threads(settings.EMBED_TORCH_THREADS)
+        _embed = create_embedder(settings.EMB_PATH, settings.EMB_BACKEND, settings.EMB_MODEL_FILE)
     return _embed
 
+
+def embed_key() -> str:
+    """Embedding-cache key of the configured model (what create_embedder stamps on it)."""
+    global _embed_key
+    if _embed_key is None:
+        _embed_key = model_key(settings.EMB_PATH, settings.EMB_BACKEND, settings.EMB_MODEL_FILE)
+    return _embed_key
+
+
+def sidecar() -> SidecarClient:
+    """Client for the shared embedding process (EMBED_MODE=sidecar); no torch in this worker."""
+    global _sidecar
+    if _sidecar is None:
+        _sidecar = SidecarClient(socket_path(), connections=settings.EMBED_SIDECAR_CONNECTIONS)
+    return _sidecar
+
+
+def embed_pool() -> ThreadPoolExecutor:
+    """Dedicated executor for CPU-bound encode() calls, so they never run on the event loop."""
+    global _embed_pool
+    if _embed_pool is None:
+        _embed_pool = ThreadPoolExecutor(max_workers=settings.EMBED_WORKERS, thread_name_prefix="embed")
+    return _embed_pool
+
+
+def batcher() -> EmbedBatcher:
+    """Micro-batches concurrent single-query embeds into one encode() call."""
+    global _batcher
+    if _batcher is None:
+        _batcher = EmbedBatcher(
+            lambda texts: aembed_array(texts, lookup=False),  # query_vector() already looked them up
+            max_batch=settings.EMBED_BATCH_MAX,
+            max_wait_ms=settings.EMBED_BATCH_WAIT_MS,
+        )
+    return _batcher
+
+def answer_cache() -> Optional[SemanticCache]:
+    """Semantic answer cache (None when disabled via SEMANTIC_CACHE_ENABLED)."""
+    global _answer_cache
+    if not settings.SEMANTIC_CACHE_ENABLED:
+        return None
+    if _answer_cache is None:
+        _answer_cache = SemanticCache(
+            dim=settings.EMB_DIM,
+            threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+            ttl_s=settings.SEMANTIC_CACHE_TTL_S,
+            max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+            max_bytes=int(settings.SEMANTIC_CACHE_MAX_MB * 1024 * 1024),
+        )
+    return _answer_cache
+
+def gen_scheduler() -> GenerationScheduler:
+    """Admission control + priority queue in front of Ollama."""
+    global _gen_scheduler
+    if _gen_scheduler is None:
+        _gen_scheduler = GenerationScheduler(
+            max_concurrency=settings.GEN_MAX_CONCURRENCY,
+            max_queue=settings.GEN_MAX_QUEUE,
+        )
+    return _gen_scheduler
+
+def flights() -> SingleFlight:
+    """In-flight /ask and /ask/stream executions, keyed by normalized question + params."""
+    global _flights
+    if _flights is None:
+        _flights = SingleFlight()
+    return _flights
+
+def sessions() -> SessionStore:
+    """/chat conversations (per worker: route a conversation to one worker, e.g. sticky sessions)."""
+    global _sessions
+    if _sessions is None:
+        _sessions = SessionStore(max_sessions=settings.CHAT_MAX_SESSIONS, ttl_s=settings.CHAT_SESSION_TTL_S)
+    return _sessions
+
+def ingest_jobs() -> JobRunner:
+    """Background ingest jobs: records under DATA_DIR/ingest_jobs, each run in its own niced process."""
+    global _jobs
+    if _jobs is None:
+        _jobs = JobRunner(JobStore(jobs_root()), workers=settings.INGEST_JOB_WORKERS,
+                          nice=settings.INGEST_JOB_NICE, torch_threads=settings.INGEST_JOB_TORCH_THREADS)
+    return _jobs
+
+# -----------------------------------------------------------------------------
+# Prometheus metrics (served at /metrics)
+# -----------------------------------------------------------------------------
+STAGE_SECONDS = prom.HistogramMetric(
+    "rag_stage_duration_seconds", "Time spent per RAG stage.", ["endpoint", "stage"])
+ANSWERS = prom.Counter(
+    "rag_answers_total", "Answers by outcome: generated, cached, or empty (no context passed the threshold).",
+    ["endpoint", "outcome"])
+ERRORS = prom.Counter("rag_errors_total", "Requests answered with ok=false.", ["endpoint", "error"])
+COALESCED = prom.Counter("rag_coalesced_total", "Requests served by another identical in-flight request.",
+                         ["endpoint"])
+SHED = prom.Counter("rag_generation_rejected_total", "Generations shed with 429/503 + Retry-After.",
+                    ["endpoint", "reason"])
+PROMPT_TOKENS = prom.HistogramMetric(
+    "rag_prompt_tokens", "Prompt tokens evaluated by the LLM (counted locally when Ollama doesn't say).", ["endpoint"],
+    buckets=(64, 128, 256, 512, 1024, 1536, 2048, 3072, 4096, 8192))
+prom.HistogramMetric(
+    "rag_embed_batch_size", "Queries folded into one encode() by the micro-batcher.",
+    buckets=(), source=lambda: _batcher.batch_sizes if _batcher is not None else None)
+prom.Gauge("rag_embed_queue_depth", "Queries waiting for the embedding micro-batcher.",
+              fn=lambda: _batcher.stats()["queued"] if _batcher is not None else 0)
+prom.Gauge("rag_generation_queue_depth", "Generations waiting for an Ollama slot.",
+           fn=lambda: _gen_scheduler.depth() if _gen_scheduler is not None else 0)
+prom.Gauge("rag_generation_running", "Generations currently running on Ollama.",
+           fn=lambda: _gen_scheduler.running if _gen_scheduler is not None else 0)
+prom.Gauge("rag_ready", "1 once warmup finished (see /ready).", fn=lambda: float(_ready_at is not None))
+prom.Gauge("rag_chat_sessions", "Live /chat conversations.",
+           fn=lambda: _sessions.stats()["sessions"] if _sessions is not None else 0)
+prom.Gauge("rag_answer_cache_entries", "Entries in the semantic answer cache.",
+              fn=lambda: _answer_cache.stats()["entries"] if _answer_cache is not None else 0)
+
+# timings_ms key -> stage label
+STAGES = {
+    "embed_ms": "embed",
+    "search_ms": "search",
+    "curation_ms": "curation",
+    "prompt_ms": "prompt",
+    "queue_ms": "queue",
+    "generation_ms": "generation",
+    "server_total_ms": "total",
+}
+
+
+def observe(endpoint: str, outcome: str, response_metrics: dict) -> None:
+    """Feed one finished answer's timings into the Prometheus metrics."""
+    ANSWERS.inc(endpoint=endpoint, outcome=outcome)
+    for key, ms in response_metrics["timings_ms"].items():
+        stage = STAGES.get(key)
+        if stage is None or (outcome != "generated" and stage in ("prompt", "queue", "generation")):
+            continue
+        STAGE_SECONDS.observe(ms / 1000, endpoint=endpoint, stage=stage)
+    if outcome == "generated":
+        PROMPT_TOKENS.observe(response_metrics["prompt_tokens"], endpoint=endpoint)
+
+
+def failure(endpoint: str, e: Exception) -> dict:
+    """Count + log the error, then build the usual {"ok": False} body."""
+    ERRORS.inc(endpoint=endpoint, error=type(e).__name__)
+    log.warning("%s failed: %s: %s", endpoint, type(e).__name__, e)
+    return {"ok": False, "error": str(e)}
+
+
+def shed_body(endpoint: str, e: Rejected) -> dict:
+    SHED.inc(endpoint=endpoint, reason=e.reason)
+    return {**e.body(), "status": e.status}
+
+
+def shed(endpoint: str, e: Rejected) -> JSONResponse:
+    """429 (queue full) / 503 (deadline) with Retry-After, so clients back off instead of timing out."""
+    return JSONResponse(shed_body(endpoint, e), status_code=e.status,
+                        headers={"Retry-After": str(e.retry_after_s)})
+
 # -----------------------------------------------------------------------------
 # Helpers
 # -----------------------------------------------------------------------------
-def ensure_collection() -> None:
-    """Create the collection if missing (assumes EMB_DIM is correct)."""
-    client = qdrant()
-    existing = {c.name for c in client.get_collections().collections}
-    if settings.QDRANT_COLLECTION in existing:
+async def ensure_collection() -> None:
+    """Create the collection if missing (assumes EMB_DIM is correct). Checked once, then cached."""
+    global _collection_ready
+    if _collection_ready:
         return
-    client.create_collection(
-        collection_name=settings.QDRANT_COLLECTION,
-        vectors_config=VectorParams(size=settings.EMB_DIM, distance=Distance.COSINE),
-    )
+    await backend().aensure_collection(settings.QDRANT_COLLECTION, settings.EMB_DIM)
+    _collection_ready = True
+
+
+def encode_array(texts: List[str]) -> np.ndarray:
+    return embedder().encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32, copy=False)
+
+
+def embed_array(texts: List[str], lookup: bool = True) -> np.ndarray:
+    """encode_array() through the embedding cache; lookup=False encodes everything and only stores."""
+    cache = embedding_cache()
+    if cache is None:
+        return encode_array(texts)
+    if lookup:
+        return cache.encode(embed_key(), texts, encode_array, settings.EMB_DIM)
+    vecs = encode_array(texts)
+    cache.store(embed_key(), texts, vecs)
+    return vecs
 
 
 def embed_texts(texts: List[str]) -> List[List[float]]:
-    return embedder().encode(texts, normalize_embeddings=True).tolist()
+    return embed_array(texts).tolist()
+
+
+async def aembed_array(texts: List[str], lookup: bool = True) -> np.ndarray:
+    if settings.EMBED_MODE == "sidecar":
+        return await sidecar().encode(texts)  # the sidecar has its own handle on the embedding cache
+    if settings.EMBED_MODE != "inprocess":
+        raise ValueError(f"Unknown EMBED_MODE: {settings.EMBED_MODE!r} (use 'inprocess' or 'sidecar')")
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(embed_pool(), embed_array, texts, lookup)
+
+
+async def embed_query(query: str) -> np.ndarray:
+    return await batcher().embed(query)
+
+
+async def query_vector(query: str) -> tuple[np.ndarray, Optional[dict]]:
+    """
+    Query embedding plus its embedding-cache metrics: source "memory" (LRU, no I/O),
+    "disk" (SQLite, off the event loop) or "model" (micro-batched encode, then stored).
+    """
+    cache = embedding_cache()
+    if cache is None:
+        return await embed_query(query), None
+    vec, source = cache.peek(embed_key(), query), "memory"
+    if vec is None:
+        found, _ = await asyncio.to_thread(cache.lookup, embed_key(), [query])
+        vec, source = found[0], "disk"
+    if vec is None:
+        vec, source = await embed_query(query), "model"
+    return vec, {"source": source, "hit_rate": cache.hit_rate()}
+
+
+def prompt_budget() -> int:
+    """Prompt tokens we may send: the context window minus the answer reserve (or PROMPT_MAX_TOKENS if smaller)."""
+    budget = settings.OLLAMA_NUM_CTX - settings.ANSWER_RESERVE_TOKENS
+    return min(budget, settings.PROMPT_MAX_TOKENS) if settings.PROMPT_MAX_TOKENS > 0 else budget
+
+
+async def prompt_counter() -> TokenCounter:
+    """The shared token counter; its first load (maybe a hub download) runs off the event loop."""
+    return loaded_counter() or await asyncio.to_thread(token_counter)
+
+
+def pack(ret: dict, query: str, counter: TokenCounter) -> tuple[Packed, float]:
+    """
+    Step 4: (optionally compress, then) pack the curated chunks into the prompt budget;
+    ret keeps only the chunks that were sent.
+    """
+    t_prompt = time.perf_counter()
+    packed = pack_prompt(ret["curated"], query, counter, prompt_budget())
+    if ret["compress"]:
+        texts, stats = compress_hits(ret["curated"], ret["qvec"], settings.COMPRESS_TOP_SENTENCES,
+                                     settings.COMPRESS_NEIGHBORS)
+        full, packed = packed, pack_prompt(ret["curated"], query, counter, prompt_budget(), texts)
+        before, after = full.info["context_tokens"], packed.info["context_tokens"]
+        ret["compression"] = {
+            **stats,
+            "context_tokens_before": before,
+            "context_tokens_after": after,
+            "ratio": round(after / before, 4) if before else 1.0,
+        }
+    if not packed.hits:
+        raise ValueError(f"Prompt budget of {prompt_budget()} tokens leaves no room for context "
+                         "(raise OLLAMA_NUM_CTX or PROMPT_MAX_TOKENS, or lower ANSWER_RESERVE_TOKENS)")
+    ret["curated"], ret["contexts"] = packed.hits, packed.contexts
+    return packed, round((time.perf_counter() - t_prompt) * 1000, 3)
+
+# -----------------------------------------------------------------------------
+# App + CORS
+# -----------------------------------------------------------------------------
+# -----------------------------------------------------------------------------
+# Warmup: load the embedder, the Ollama model and the collection before /ready
+# turns green, so the first user request doesn't pay for any of them.
+# -----------------------------------------------------------------------------
+_warm: Dict[str, dict] = {}  # step -> {"ok", "ms", "error"?}
+_ready_at: Optional[float] = None
+
+
+async def _warm_embedder() -> None:
+    await aembed_array(["warmup"], lookup=False)  # loads torch + the model (or reaches the sidecar), then runs one encode
+
+
+async def _warm_ollama() -> None:
+    await llm().load(settings.OLLAMA_KEEP_ALIVE)
 
 
-def chunk_text(text: str) -> List[str]:
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800, chunk_overlap=120, separators=["\n\n", "\n", " ", ""]
+async def _warm_tokenizer() -> None:
+    (await prompt_counter()).count("warmup")
+
+
+WARMUP_STEPS = {"embedder": _warm_embedder, "ollama": _warm_ollama, "collection": ensure_collection,
+                "tokenizer": _warm_tokenizer}
+
+
+async def warmup(t_start: float) -> None:
+    """Run every warmup step concurrently; retry the failed ones until all succeed."""
+    global _ready_at
+    pending = dict(WARMUP_STEPS)
+
+    async def step(name: str, fn) -> None:
+        t = time.perf_counter()
+        try:
+            await fn()
+        except Exception as e:  # dependency not up yet: keep serving /health, retry later
+            _warm[name] = {"ok": False, "ms": round((time.perf_counter() - t) * 1000, 1), "error": str(e)}
+            log.warning("Warmup %s failed (retrying in %gs): %s", name, settings.WARMUP_RETRY_S, e)
+            return
+        _warm[name] = {"ok": True, "ms": round((time.perf_counter() - t) * 1000, 1)}
+        pending.pop(name)
+
+    while pending:
+        await asyncio.gather(*(step(n, fn) for n, fn in list(pending.items())))
+        if pending:
+            await asyncio.sleep(settings.WARMUP_RETRY_S)
+    _ready_at = time.perf_counter()
+    log.info(
+        "Ready: %.0f ms after import started, warmup took %.0f ms (%s)",
+        (_ready_at - _T_IMPORT) * 1000,
+        (_ready_at - t_start) * 1000,
+        ", ".join(f"{n} {s['ms']:.0f} ms" for n, s in _warm.items()),
     )
-    return splitter.split_text(text)
 
 
-def estimate_tokens(s: str) -> int:
-    return max(1, len(s.split()))
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    t_start = time.perf_counter()
+    log.info("Cold start: api.main imported in %.0f ms", (_T_IMPORT_END - _T_IMPORT) * 1000)
+    # without warmup, still load the prompt tokenizer (maybe a hub download) in the background, off the loop
+    task = asyncio.create_task(warmup(t_start) if settings.WARMUP_ENABLED else prompt_counter())
+    if settings.INGEST_JOBS_ENABLED:
+        resumed = await asyncio.to_thread(ingest_jobs().resume_pending)
+        if resumed:
+            log.info("Resuming %d ingest job(s) from their last checkpoint: %s", len(resumed), ", ".join(resumed))
+    yield
+    if _jobs is not None:
+        _jobs.shutdown()
+    task.cancel()
+    if _batcher is not None:
+        await _batcher.aclose()
+    if _llm is not None:
+        await _llm.aclose()
+    if _sidecar is not None:
+        await _sidecar.aclose()
+    await backend().aclose()
+    if _embed_pool is not None:
+        _embed_pool.shutdown(wait=False)
+
+
+app = FastAPI(title="AI Support Bot — RAG API", lifespan=lifespan)
+app.add_middleware(prom.MetricsMiddleware)
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # tighten in prod
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
 # -----------------------------------------------------------------------------
 # Basics
 # -----------------------------------------------------------------------------
 @app.get("/")
-def root():
+async def root():
     return {
         "ok": True,
         "msg": "AI Support Bot is running.",
@@ -134,11 +477,20 @@ def root():
     }
 
 @app.get("/health")
-def health():
+async def health():
     return {"ok": True}
 
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 503 until every warmup step succeeded (or WARMUP_ENABLED=false)."""
+    is_ready = _ready_at is not None or not settings.WARMUP_ENABLED
+    body = {"ok": is_ready, "ready": is_ready, "steps": _warm}
+    if _ready_at is not None:
+        body["time_to_ready_ms"] = round((_ready_at - _T_IMPORT) * 1000, 1)
+    return JSONResponse(body, status_code=200 if is_ready else 503)
+
 @app.get("/config")
-def config():
+async def config():
     return {
         "qdrant": settings.QDRANT_URL,
         "collection": settings.QDRANT_COLLECTION,
@@ -149,161 +501,1054 @@ def config():
 
 # --- light ops (optional) ----------------------------------------------------
 @app.get("/ping/qdrant")
-def ping_qdrant():
+async def ping_qdrant():
     try:
-        resp = qdrant().get_collections()
-        return {"ok": True, "collections": [c.name for c in resp.collections]}
+        return {"ok": True, "backend": backend().name, **(await backend().ping())}
     except Exception as e:
-        return {"ok": False, "error": str(e)}
+        return failure("/ping/qdrant", e)
 
 @app.get("/ping/ollama")
-def ping_ollama():
+async def ping_ollama():
     """
     Cheap liveness check: list local Ollama models (no text generation).
     Fast and reliable for a status light.
     """
     try:
-        r = requests.get(f"{settings.OLLAMA_URL}/api/tags", timeout=3)
-        r.raise_for_status()
-        data = r.json()
+        data = await llm().tags()
         models = [m.get("name") or m.get("model") for m in data.get("models", [])]
         return {"ok": True, "models": models}
     except Exception as e:
-        return {"ok": False, "error": str(e)}
+        return failure("/ping/ollama", e)
 
 @app.get("/ping/embeddings")
-def ping_embeddings():
+async def ping_embeddings():
     try:
-        vec = embedder().encode(["hello world"])[0]
+        vec = await embed_query("hello world")
         return {"ok": True, "dim": len(vec)}
     except Exception as e:
-        return {"ok": False, "error": str(e)}
+        return failure("/ping/embeddings", e)
 
 @app.get("/stats")
-def stats():
-    """Exact point count + vector config of the active collection."""
-    info = qdrant().get_collection(settings.QDRANT_COLLECTION)
-    count = qdrant().count(collection_name=settings.QDRANT_COLLECTION, exact=True).count
+async def stats():
+    """Exact point count + vector config of the active collection (+ its BM25 index, if built)."""
+    info, count, lex = await asyncio.gather(
+        backend().describe(settings.QDRANT_COLLECTION),
+        backend().count(settings.QDRANT_COLLECTION),
+        lexical_index(),
+    )
     return {
         "collection": settings.QDRANT_COLLECTION,
+        "backend": backend().name,
         "points": count,
-        "vector_size": info.config.params.vectors.size,
-        "distance": info.config.params.vectors.distance,
+        **info,
+        "lexical": lex.stats() if lex is not None else None,
     }
 
+@app.get("/stats/embedder")
+async def stats_embedder():
+    """Query-embedding micro-batcher histograms (+ the sidecar's own) and this worker's embedding cache."""
+    cache = embedding_cache()
+    out = {"mode": settings.EMBED_MODE, **batcher().stats(),
+           "cache": await asyncio.to_thread(cache.stats) if cache is not None else {"enabled": False}}
+    if settings.EMBED_MODE == "sidecar":
+        try:
+            out["sidecar"] = await sidecar().stats()
+        except Exception as e:
+            out["sidecar"] = {"ok": False, "error": str(e)}
+    return out
+
+@app.get("/stats/cache")
+async def stats_cache():
+    """Semantic answer cache: size, hit rate, evictions and the collection version it serves."""
+    cache = answer_cache()
+    return cache.stats() if cache is not None else {"enabled": False}
+
+@app.get("/stats/generation")
+async def stats_generation():
+    """Generation scheduler (running, queued per priority, service-time EWMA, admitted/rejected) + coalescing counts."""
+    return {**gen_scheduler().stats(), "single_flight": flights().stats()}
+
+@app.get("/stats/sessions")
+async def stats_sessions():
+    """/chat conversations: live count, tokens held, created / expired / evicted."""
+    return sessions().stats()
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape target: stage latencies, answer/error counters, HTTP and process gauges."""
+    return Response(prom.render(), media_type=prom.CONTENT_TYPE)
+
 # -----------------------------------------------------------------------------
 # Retrieval & Generation (public for UI) — with timings
 # -----------------------------------------------------------------------------
+EMPTY_ANSWER = "I don’t know from the knowledge base."
+
+
+PHASE1_FIELDS = ["doc_id", "chunk_id"]  # enough to curate; text is fetched for survivors only
+
+
+def payload_bytes(payloads) -> int:
+    """JSON size of payloads as shipped by the vector store (what we pay to transfer + decode)."""
+    return sum(len(json.dumps(p, ensure_ascii=False, separators=(",", ":"))) for p in payloads)
+
+
+def curate(search, top_k: int, score_threshold: float, max_per_doc: int,
+           keep: Optional[Callable] = None) -> tuple[list, List[float]]:
+    """
+    Sort high→low, threshold, de-duplicate and diversify. Returns (curated, raw_scores).
+    `keep` replaces the score threshold (hybrid: fused scores aren't cosines).
+    """
+    # sort high→low and collect raw scores
+    search = sorted(search, key=lambda h: float(h.score), reverse=True)
+    raw_scores = [float(h.score) for h in search]
+
+    # threshold + dedupe + diversify
+    strong = [h for h in search if (keep(h) if keep else float(h.score) >= float(score_threshold))]
+
+    seen_pairs = set()
+    per_doc = {}
+    curated = []
+    for h in strong:
+        doc = h.payload.get("doc_id")
+        chk = h.payload.get("chunk_id")
+        key = (doc, chk)
+        if key in seen_pairs:
+            continue
+        per_doc[doc] = per_doc.get(doc, 0) + 1
+        if per_doc[doc] > int(max_per_doc):
+            continue
+        seen_pairs.add(key)
+        curated.append(h)
+
+    return curated[:top_k], raw_scores
+
+
+async def lexical_index() -> Optional[BM25Index]:
+    """
+    BM25 index ingest built for the collection behind QDRANT_COLLECTION (the alias is
+    re-resolved whenever the collection version changes); None if there is none.
+    """
+    global _lexical_target
+    version = collection_version(settings.QDRANT_COLLECTION)
+    if _lexical_target is None or _lexical_target[0] != version:
+        _lexical_target = (version, await backend().aresolve_alias(settings.QDRANT_COLLECTION))
+    name = _lexical_target[1]
+    idx = _lexical.get(name)
+    if idx is None:
+        idx = _lexical[name] = BM25Index(lexical_path(name)).load()
+    else:
+        idx.refresh()
+    return idx if idx.exists else None
+
+
+def lexical_search(idx: BM25Index, queries: List[str], limit: int,
+                   doc_ids: Optional[List[str]]) -> tuple[List[list], float]:
+    """BM25 hits per query plus the time taken (runs in a worker thread, alongside the vector search)."""
+    t0 = time.perf_counter()
+    hits = [idx.search(q, limit, doc_ids) for q in queries]
+    return hits, round((time.perf_counter() - t0) * 1000, 2)
+
+
+def candidate_limit(top_k: int, hybrid: bool) -> int:
+    """Dense candidates to fetch; with BM25 catching exact terms the wide over-fetch isn't needed."""
+    return max(10, top_k * 2) if hybrid else max(20, top_k * 5)
+
+
+def hybrid_keep(score_threshold: float) -> Callable:
+    """
+    Hybrid threshold: a hit the vector search found needs the cosine threshold, as without BM25;
+    a BM25-only hit needs LEXICAL_MIN_MATCH (one shared common word is not enough).
+    """
+    def keep(h) -> bool:
+        if "dense_score" in h.payload:
+            return h.payload["dense_score"] >= score_threshold
+        return h.payload.get("lexical_match", 0.0) >= settings.LEXICAL_MIN_MATCH
+    return keep
+
+
+def fuse(search: list, lexical: Optional[list], lexical_ms: float, io: dict) -> list:
+    """RRF-fuse the dense and BM25 candidates (dense only when there is no lexical index) and note it in io."""
+    if lexical is None:
+        io["retrieval"] = "dense"
+        return search
+    fused = rrf_fuse(search, lexical, settings.RRF_K)
+    io.update(retrieval="hybrid", lexical_candidates=len(lexical), lexical_ms=lexical_ms, fused_candidates=len(fused))
+    return fused
+
+
+def lookup_cache(qvec: np.ndarray, params: tuple) -> tuple[str, Optional[CacheHit]]:
+    """Returns (collection version, hit or None); the version is kept to guard the later put."""
+    cache = answer_cache()
+    if cache is None:
+        return "", None
+    version = collection_version(settings.QDRANT_COLLECTION)
+    cache.sync(version)
+    return version, cache.lookup(qvec, params)
+
+
+async def attach_texts(curated: list, compress: bool = False) -> dict:
+    """
+    Second phase: fetch `text` (+ its ingest-time `n_tokens` and `tokenizer`, and sentence data when
+    compressing) by point id for the curated hits only (one round trip).
+    """
+    if not curated:
+        return {}
+    t_fetch = time.perf_counter()
+    ids = list(dict.fromkeys(str(h.id) for h in curated))
+    fields = ["text", "n_tokens", "tokenizer"] + (COMPRESS_FIELDS if compress else [])
+    texts = await backend().fetch_payloads(settings.QDRANT_COLLECTION, ids, fields)
+    for h in curated:
+        h.payload.update(texts.get(str(h.id), {}))
+    return {
+        "fetch_ms": round((time.perf_counter() - t_fetch) * 1000, 2),
+        "fetch_payload_bytes": payload_bytes(texts.values()),
+    }
+
+
+def retrieval_result(qvec, params, version, search, curated, raw_scores, io, stage_ms, t_ret_start,
+                     compress: bool = False) -> dict:
+    io["payload_bytes"] = io["search_payload_bytes"] + io.get("fetch_payload_bytes", 0)
+    stage_ms["search_ms"] = round(io["search_ms"] + io.get("fetch_ms", 0.0), 2)  # both phases
+    return {
+        "cached": None,
+        "qvec": qvec,
+        "params": params,
+        "compress": compress,
+        "version": version,
+        "curated": curated,
+        "contexts": [h.payload.get("text", "") for h in curated],
+        "raw_scores": raw_scores,
+        "retrieval_ms": round((time.perf_counter() - t_ret_start) * 1000, 2),
+        "stage_ms": stage_ms,
+        "io": io,
+    }
+
+
+async def retrieve(query: str, top_k: int, score_threshold: float, exact_search: bool, max_per_doc: int,
+                   doc_ids: Optional[List[str]] = None, two_phase: bool = True, compress: bool = False,
+                   use_cache: bool = True, hybrid: bool = False) -> dict:
+    """
+    Steps 1–3 of the RAG flow, shared by /ask and /ask/stream:
+      1) Embed query (then try the semantic answer cache)
+      2) Retrieve candidates from the vector backend (optionally exact search / doc_id filter)
+      3) Sort, threshold, de-duplicate, diversify
+    With two_phase, step 2 returns only doc_id/chunk_id and the text of the
+    curated chunks is fetched by id afterwards. `compress` also fetches their sentence
+    vectors for the compression step in pack(). use_cache=False skips the answer cache (/chat).
+    `hybrid` also runs a BM25 query (from the start, in parallel with embedding and the
+    vector search) and fuses both candidate lists with reciprocal rank fusion.
+    """
+    await ensure_collection()
+
+    # 1) Embed + 2) Retrieve (time this block)
+    t_ret_start = time.perf_counter()
+    lex = await lexical_index() if hybrid else None
+    lex_task = asyncio.create_task(asyncio.to_thread(lexical_search, lex, [query], top_k, doc_ids)) if lex else None
+    qvec, emb_cache = await query_vector(query)
+    embed_ms = round((time.perf_counter() - t_ret_start) * 1000, 2)
+
+    params = cache_params(top_k, score_threshold, exact_search, max_per_doc, doc_ids, compress, hybrid)
+    version, hit = lookup_cache(qvec, params) if use_cache else ("", None)
+    if hit is not None:
+        if lex_task:
+            lex_task.cancel()
+        return {
+            "cached": hit,
+            "retrieval_ms": round((time.perf_counter() - t_ret_start) * 1000, 2),
+            "embedding_cache": emb_cache,
+        }
+
+    t_search = time.perf_counter()
+    search = await backend().search(
+        settings.QDRANT_COLLECTION,
+        qvec,
+        limit=candidate_limit(top_k, lex is not None),  # overfetch; we'll curate later
+        exact=exact_search,
+        doc_ids=doc_ids,
+        fields=PHASE1_FIELDS if two_phase else None,
+    )
+    lexical, lexical_ms = await lex_task if lex_task else (None, 0.0)
+    t_search_end = time.perf_counter()
+
+    io = {
+        "mode": "two_phase" if two_phase else "single",
+        "candidates": len(search),
+        "search_ms": round((t_search_end - t_search) * 1000, 2),
+        "search_payload_bytes": payload_bytes(h.payload for h in search),
+    }
+
+    # 3) (fuse +) threshold + dedupe + diversify
+    search = fuse(search, lexical[0] if lexical else None, lexical_ms, io)
+    curated, raw_scores = curate(search, top_k, score_threshold, max_per_doc,
+                                 hybrid_keep(score_threshold) if lexical else None)
+    curation_ms = round((time.perf_counter() - t_search_end) * 1000, 2)
+
+    if two_phase:
+        io.update(await attach_texts(curated, compress))
+    elif lexical:  # BM25-only hits carry just doc_id/chunk_id
+        io.update(await attach_texts([h for h in curated if "text" not in h.payload], compress))
+    stage_ms = {"embed_ms": embed_ms, "curation_ms": curation_ms}
+    ret = retrieval_result(qvec, params, version, search, curated, raw_scores, io, stage_ms, t_ret_start, compress)
+    ret["embedding_cache"] = emb_cache
+    return ret
+
+
+async def retrieve_batch(queries: List[str], top_k: int, score_threshold: float, exact_search: bool,
+                         max_per_doc: int, doc_ids: Optional[List[str]] = None,
+                         two_phase: bool = True, compress: bool = False, hybrid: bool = False) -> List[dict]:
+    """
+    retrieve() for many queries at once: one encode() for all of them, one batched
+    search for the cache misses (plus their BM25 queries, alongside), one text fetch
+    for every curated hit.
+    """
+    await ensure_collection()
+    lex = await lexical_index() if hybrid else None
+
+    t_ret_start = time.perf_counter()
+    qvecs = await aembed_array(list(queries))
+    embed_ms = round((time.perf_counter() - t_ret_start) * 1000, 2)
+
+    params = cache_params(top_k, score_threshold, exact_search, max_per_doc, doc_ids, compress, hybrid)
+    rets: List[Optional[dict]] = [None] * len(queries)
+    misses: List[tuple[int, str]] = []
+    for i, qvec in enumerate(qvecs):
+        version, hit = lookup_cache(qvec, params)
+        if hit is not None:
+            rets[i] = {"cached": hit, "retrieval_ms": round((time.perf_counter() - t_ret_start) * 1000, 2)}
+        else:
+            misses.append((i, version))
+
+    t_search = time.perf_counter()
+    lex_task = asyncio.create_task(asyncio.to_thread(
+        lexical_search, lex, [queries[i] for i, _ in misses], top_k, doc_ids)) if lex and misses else None
+    searches = await backend().search_batch(
+        settings.QDRANT_COLLECTION,
+        [qvecs[i] for i, _ in misses],
+        limit=candidate_limit(top_k, lex is not None),
+        exact=exact_search,
+        doc_ids=doc_ids,
+        fields=PHASE1_FIELDS if two_phase else None,
+    )
+    lexical, lexical_ms = await lex_task if lex_task else (None, 0.0)
+    search_ms = round((time.perf_counter() - t_search) * 1000, 2)
+
+    t_curate = time.perf_counter()
+    ios, curated_all = [], []
+    for j, search in enumerate(searches):
+        io = {
+            "mode": "two_phase" if two_phase else "single",
+            "candidates": len(search),
+            "search_ms": search_ms,  # shared batch request
+            "search_payload_bytes": payload_bytes(h.payload for h in search),
+        }
+        fused = fuse(search, lexical[j] if lexical else None, lexical_ms, io)
+        ios.append(io)
+        curated_all.append(curate(fused, top_k, score_threshold, max_per_doc,
+                                  hybrid_keep(score_threshold) if lexical else None))
+    curation_ms = round((time.perf_counter() - t_curate) * 1000, 2)
+    curated_hits = [h for curated, _ in curated_all for h in curated]
+    if not two_phase and lexical:  # BM25-only hits carry just doc_id/chunk_id
+        curated_hits = [h for h in curated_hits if "text" not in h.payload]
+    fetch_io = await attach_texts(curated_hits, compress) if two_phase or lexical else {}
+
+    for (i, version), search, io, (curated, raw_scores) in zip(misses, searches, ios, curated_all):
+        io.update(fetch_io)  # shared fetch across the batch
+        stage_ms = {"embed_ms": embed_ms, "curation_ms": curation_ms}  # whole batch
+        rets[i] = retrieval_result(qvecs[i], params, version, search, curated, raw_scores, io, stage_ms, t_ret_start,
+                                   compress)
+    return rets
+
+
+def citations_of(curated) -> List[dict]:
+    return [
+        {"doc_id": h.payload.get("doc_id"), "chunk": h.payload.get("chunk_id"), "score": float(h.score)}
+        for h in curated
+    ]
+
+
+def retrieved_of(curated) -> List[dict]:
+    return [
+        {
+            "doc_id": h.payload.get("doc_id"),
+            "chunk": h.payload.get("chunk_id"),
+            "score": float(h.score),
+            "text": h.payload.get("text"),
+            **{k: h.payload[k] for k in ("dense_score", "lexical_score") if k in h.payload},  # hybrid only
+        }
+        for h in curated
+    ]
+
+
+def remember(ret: dict, response: dict) -> None:
+    """Store a generated answer unless the collection changed while we were generating."""
+    cache = answer_cache()
+    if cache is None or cache.version != ret["version"]:
+        return
+    cache.put(ret["qvec"], ret["params"], {
+        "answer": response["answer"],
+        "sources": response["sources"],
+        "retrieved": response["retrieved"],
+        "retrieval_avg_score": response["metrics"]["retrieval_avg_score"],
+    })
+
+
+def cached_response(ret: dict, t0: float) -> dict:
+    hit: CacheHit = ret["cached"]
+    return {
+        "ok": True,
+        "answer": hit.value["answer"],
+        "sources": hit.value["sources"],
+        "metrics": {
+            "retrieval_avg_score": hit.value["retrieval_avg_score"],
+            "context_tokens": 0,
+            "prompt_tokens": 0,
+            "cache_hit": True,
+            "cache_similarity": hit.similarity,
+            "cache_age_s": hit.age_s,
+            "embedding_cache": ret.get("embedding_cache"),
+            "timings_ms": {
+                "retrieval_ms": ret["retrieval_ms"],
+                "generation_ms": 0.0,
+                "server_total_ms": round((time.perf_counter() - t0) * 1000, 2),
+            },
+        },
+        "retrieved": hit.value["retrieved"],
+    }
+
+
+def empty_metrics(ret: dict, t0: float) -> dict:
+    raw_scores = ret["raw_scores"]
+    return {
+        "retrieval_avg_score": round(sum(raw_scores) / len(raw_scores), 4) if raw_scores else 0.0,
+        "cache_hit": False,
+        "embedding_cache": ret.get("embedding_cache"),
+        "retrieval_io": ret["io"],
+        "context_tokens": 0,
+        "prompt_tokens": 0,
+        "timings_ms": {
+            "retrieval_ms": ret["retrieval_ms"],
+            **ret["stage_ms"],
+            "generation_ms": 0.0,
+            "server_total_ms": round((time.perf_counter() - t0) * 1000, 2),
+        },
+    }
+
+
+def answer_metrics(ret: dict, packed: Packed, prompt_ms: float, t0: float, t_gen_start: float, t_gen_end: float,
+                   queue: dict, gen: dict) -> dict:
+    """`gen` is Ollama's final chunk: prompt_eval_count is the exact prompt size (absent when fully KV-cached)."""
+    curated = ret["curated"]
+    metrics = {
+        "retrieval_avg_score": round(sum(float(h.score) for h in curated) / len(curated), 4) if curated else 0.0,
+        "cache_hit": False,
+        "embedding_cache": ret.get("embedding_cache"),
+        "retrieval_io": ret["io"],
+        "queue": queue,
+        "ollama": eval_stats(gen),
+        "context_tokens": packed.info["context_tokens"],
+        "prompt_tokens": gen.get("prompt_eval_count") or packed.info["prompt_tokens_counted"],
+        "packing": packed.info,
+        "timings_ms": {
+            "retrieval_ms": ret["retrieval_ms"],
+            **ret["stage_ms"],
+            "prompt_ms": prompt_ms,
+            "queue_ms": queue["wait_ms"],
+            "generation_ms": round((t_gen_end - t_gen_start) * 1000, 2),
+            "server_total_ms": round((time.perf_counter() - t0) * 1000, 2),
+        },
+    }
+    compression = ret.get("compression")
+    if compression is not None:
+        # what the dropped tokens would have cost at this call's prompt-eval rate
+        per_token_ms = (gen.get("prompt_eval_duration") or 0) / 1e6 / (gen.get("prompt_eval_count") or 1)
+        saved = compression["context_tokens_before"] - compression["context_tokens_after"]
+        metrics["compression"] = {**compression,
+                                  "generation_ms_saved_est": round(saved * per_token_ms, 2) if per_token_ms else None}
+    return metrics
+
+
+async def answer(ret: dict, query: str, t0: float, endpoint: str = "/ask",
+                 priority: Priority = "interactive", deadline: Optional[float] = None) -> dict:
+    """
+    Steps 4–5 for one retrieved query: prompt, generate, build the /ask response.
+    Generation waits for a scheduler slot; raises Rejected if it can't start in time.
+    """
+    if ret["cached"] is not None:
+        response = cached_response(ret, t0)
+        observe(endpoint, "cached", response["metrics"])
+        return response
+
+    if not ret["contexts"]:
+        response = {
+            "ok": True,
+            "answer": EMPTY_ANSWER,
+            "sources": [],
+            "metrics": empty_metrics(ret, t0),
+            "retrieved": [],
+        }
+        observe(endpoint, "empty", response["metrics"])
+        return response
+
+    # 4) Prompt: best chunks packed into the token budget (via packing.py)
+    packed, prompt_ms = pack(ret, query, await prompt_counter())
+
+    # 5) Generate (time it) once the scheduler hands us an Ollama slot
+    if deadline is None:
+        deadline = t0 + settings.GEN_DEADLINE_S
+    async with gen_scheduler().slot(priority, deadline) as queue:
+        t_gen_start = time.perf_counter()
+        gen = await llm().generate(packed.prompt)
+        t_gen_end = time.perf_counter()
+    text = gen.get("response", "").strip()
+
+    curated = ret["curated"]
+    response = {
+        "ok": True,
+        "answer": text,
+        "sources": citations_of(curated),
+        "metrics": answer_metrics(ret, packed, prompt_ms, t0, t_gen_start, t_gen_end, queue, gen),
+        "retrieved": retrieved_of(curated),
+    }
+    remember(ret, response)
+    observe(endpoint, "generated", response["metrics"])
+    return response
+
+
+def sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(frames) -> StreamingResponse:
+    return StreamingResponse(
+        frames,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.post("/ask")
-def ask(
+async def ask(
     query: str = Body(..., embed=True, description="User question"),
     top_k: int = Body(4, embed=True, description="Number of chunks to return"),
     score_threshold: float = Body(0.50, embed=True, description="Min cosine score to keep"),
     exact_search: bool = Body(False, embed=True, description="Use exhaustive search while KB is small"),
     max_per_doc: int = Body(2, embed=True, description="Limit chunks per document"),
+    doc_ids: Optional[List[str]] = Body(None, embed=True, description="Only search these documents"),
+    two_phase: bool = Body(True, embed=True, description="Fetch chunk text only for curated hits"),
+    compress: Optional[bool] = Body(None, embed=True, description="Keep only query-relevant sentences (default COMPRESS_CONTEXT)"),
+    hybrid: Optional[bool] = Body(None, embed=True, description="Fuse BM25 + vector search with RRF (default HYBRID_RETRIEVAL)"),
+    priority: Priority = Body("interactive", embed=True, description="Scheduler class: interactive | batch"),
+    deadline_s: Optional[float] = Body(None, embed=True, description="Answer within this many seconds or get 503"),
 ):
     """
     RAG flow with timing metrics:
-      1) Embed query
-      2) Retrieve candidates from Qdrant (optionally exact search)
+      1) Embed query (a close enough, already answered query short-circuits here)
+      2) Retrieve candidates from the vector backend (optionally exact search; BM25 + RRF with `hybrid`)
       3) Sort, threshold, de-duplicate, diversify
-      4) Prompt LLM with clean context
+      4) Prompt LLM with clean context (only the query-relevant sentences with `compress`)
       5) Return answer, citations, metrics (incl. timings), and retrieved snippets
+    Under load, generation is shed with 429/503 + Retry-After (see /stats/generation).
+    Identical concurrent questions (normalized text + retrieval params + priority) run once;
+    the others get the same response with "coalesced": true in metrics, or 503 once their
+    own deadline passes.
     """
+    compress = settings.COMPRESS_CONTEXT if compress is None else compress
+    hybrid = settings.HYBRID_RETRIEVAL if hybrid is None else hybrid
+
+    async def run() -> dict:
+        t0 = time.perf_counter()
+        deadline = t0 + (deadline_s or settings.GEN_DEADLINE_S)
+        ret = await retrieve(query, top_k, score_threshold, exact_search, max_per_doc, doc_ids, two_phase, compress,
+                             hybrid=hybrid)
+        response = await answer(ret, query, t0, "/ask", priority, deadline)
+        response["metrics"]["coalesced"] = False
+        return response
+
     try:
+        if not settings.COALESCE_ENABLED:
+            return await run()
+        key = ("ask", normalize_query(query),
+               cache_params(top_k, score_threshold, exact_search, max_per_doc, doc_ids, compress, hybrid), two_phase,
+               priority)
+        budget = deadline_s or settings.GEN_DEADLINE_S
+        try:
+            response, shared = await flights().do(key, run, timeout=budget)
+        except WaitTimeout:  # joined a run with a later deadline; shed like a request of our own would be
+            raise Rejected("deadline", 503, gen_scheduler().estimate_wait_s(priority),
+                           f"No answer within the {budget:.0f}s deadline") from None
+        if shared:
+            COALESCED.inc(endpoint="/ask")
+            response = {**response, "metrics": {**response["metrics"], "coalesced": True}}
+        return response
+
+    except Rejected as e:
+        return shed("/ask", e)
+    except Exception as e:
+        return failure("/ask", e)
+
+
+@app.post("/ask/stream")
+async def ask_stream(
+    query: str = Body(..., embed=True, description="User question"),
+    top_k: int = Body(4, embed=True, description="Number of chunks to return"),
+    score_threshold: float = Body(0.50, embed=True, description="Min cosine score to keep"),
+    exact_search: bool = Body(False, embed=True, description="Use exhaustive search while KB is small"),
+    max_per_doc: int = Body(2, embed=True, description="Limit chunks per document"),
+    doc_ids: Optional[List[str]] = Body(None, embed=True, description="Only search these documents"),
+    two_phase: bool = Body(True, embed=True, description="Fetch chunk text only for curated hits"),
+    compress: Optional[bool] = Body(None, embed=True, description="Keep only query-relevant sentences (default COMPRESS_CONTEXT)"),
+    hybrid: Optional[bool] = Body(None, embed=True, description="Fuse BM25 + vector search with RRF (default HYBRID_RETRIEVAL)"),
+    priority: Priority = Body("interactive", embed=True, description="Scheduler class: interactive | batch"),
+    deadline_s: Optional[float] = Body(None, embed=True, description="Answer within this many seconds or get 503"),
+):
+    """
+    Same RAG flow as /ask, streamed as Server-Sent Events:
+      event: retrieval  -> {"sources": [...], "retrieved": [...]}
+      event: token      -> {"text": "..."}   (one per Ollama chunk)
+      event: metrics    -> {"ok": true, "answer": "...", "metrics": {...}}
+      event: error      -> {"ok": false, "error": "..."}
+    Retrieval runs before the stream opens, so an overloaded generator is answered with
+    a plain 429/503 + Retry-After instead of a 200 stream that ends in an error.
+    Identical concurrent questions (same priority and deadline_s too) share one execution:
+    late joiners replay the events so far, then follow live; their metrics carry "coalesced": true.
+    """
+    compress = settings.COMPRESS_CONTEXT if compress is None else compress
+    hybrid = settings.HYBRID_RETRIEVAL if hybrid is None else hybrid
+
+    async def produce(bc: Broadcast) -> None:
         t0 = time.perf_counter()
-        ensure_collection()
-
-        # 1) Embed + 2) Retrieve (time this block)
-        t_ret_start = time.perf_counter()
-        qvec = embed_texts([query])[0]
-        search = qdrant().search(
-            collection_name=settings.QDRANT_COLLECTION,
-            query_vector=qvec,
-            limit=max(20, top_k * 5),  # overfetch; we'll curate later
-            with_payload=True,
-            search_params=SearchParams(exact=exact_search) if exact_search else None,
-        )
-        t_ret_end = time.perf_counter()
-
-        # sort high→low and collect raw scores
-        search = sorted(search, key=lambda h: float(h.score), reverse=True)
-        raw_scores = [float(h.score) for h in search]
-
-        # 3) threshold + dedupe + diversify
-        strong = [h for h in search if float(h.score) >= float(score_threshold)]
-
-        seen_pairs = set()
-        per_doc = {}
-        curated = []
-        for h in strong:
-            doc = h.payload.get("doc_id")
-            chk = h.payload.get("chunk_id")
-            key = (doc, chk)
-            if key in seen_pairs:
-                continue
-            per_doc[doc] = per_doc.get(doc, 0) + 1
-            if per_doc[doc] > int(max_per_doc):
-                continue
-            seen_pairs.add(key)
-            curated.append(h)
-
-        curated = curated[:top_k]
-        contexts = [h.payload["text"] for h in curated]
-
-        if not contexts:
-            t_empty = time.perf_counter()
-            return {
-                "ok": True,
-                "answer": "I don’t know from the knowledge base.",
-                "sources": [],
-                "metrics": {
-                    "retrieval_avg_score": round(sum(raw_scores) / len(raw_scores), 4) if raw_scores else 0.0,
-                    "context_tokens_est": 0,
-                    "prompt_tokens_est": 0,
-                    "timings_ms": {
-                        "retrieval_ms": round((t_ret_end - t_ret_start) * 1000, 2),
-                        "generation_ms": 0.0,
-                        "server_total_ms": round((t_empty - t0) * 1000, 2),
-                    },
-                },
-                "retrieved": [],
-            }
-
-        # 4) Prompt (via prompts.py)
-        prompt = build_prompt(contexts, query)
-
-        # 5) Generate (time it)
-        t_gen_start = time.perf_counter()
-        answer = llm().invoke(prompt).strip()
-        t_gen_end = time.perf_counter()
-        t1 = time.perf_counter()
-
-        citations = [
-            {"doc_id": h.payload.get("doc_id"), "chunk": h.payload.get("chunk_id"), "score": float(h.score)}
-            for h in curated
-        ]
-        retrieved = [
-            {
-                "doc_id": h.payload.get("doc_id"),
-                "chunk": h.payload.get("chunk_id"),
-                "score": float(h.score),
-                "text": h.payload.get("text"),
-            }
-            for h in curated
-        ]
-        metrics = {
-            "retrieval_avg_score": round(sum(float(h.score) for h in curated) / len(curated), 4),
-            "context_tokens_est": sum(estimate_tokens(c) for c in contexts),
-            "prompt_tokens_est": estimate_tokens(prompt),
-            "timings_ms": {
-                "retrieval_ms": round((t_ret_end - t_ret_start) * 1000, 2),
-                "generation_ms": round((t_gen_end - t_gen_start) * 1000, 2),
-                "server_total_ms": round((t1 - t0) * 1000, 2),
-            },
-        }
+        deadline = t0 + (deadline_s or settings.GEN_DEADLINE_S)
+        try:
+            ret = await retrieve(query, top_k, score_threshold, exact_search, max_per_doc, doc_ids, two_phase, compress,
+                                 hybrid=hybrid)
+            if ret["cached"] is None and ret["contexts"]:
+                packed, prompt_ms = pack(ret, query, await prompt_counter())  # before "retrieval", so sources = what the LLM sees
+                gen_scheduler().check(priority, deadline)
+        except Exception as e:
+            bc.fail(e)
+            return
+        bc.open()
+
+        try:
+            if ret["cached"] is not None:
+                cached = cached_response(ret, t0)
+                cached["metrics"]["time_to_first_token_ms"] = cached["metrics"]["timings_ms"]["server_total_ms"]
+                cached["metrics"]["coalesced"] = False
+                observe("/ask/stream", "cached", cached["metrics"])
+                bc.publish("retrieval", {"sources": cached["sources"], "retrieved": cached["retrieved"]})
+                bc.publish("token", {"text": cached["answer"]})
+                bc.publish("metrics", {"ok": True, "answer": cached["answer"], "metrics": cached["metrics"]})
+                return
+
+            curated = ret["curated"]
+            sources, retrieved = citations_of(curated), retrieved_of(curated)
+            bc.publish("retrieval", {"sources": sources, "retrieved": retrieved})
+
+            if not ret["contexts"]:
+                bc.publish("token", {"text": EMPTY_ANSWER})
+                metrics = empty_metrics(ret, t0)
+                metrics["time_to_first_token_ms"] = metrics["timings_ms"]["server_total_ms"]
+                metrics["coalesced"] = False
+                observe("/ask/stream", "empty", metrics)
+                bc.publish("metrics", {"ok": True, "answer": EMPTY_ANSWER, "metrics": metrics})
+                return
+
+            t_first = None
+            parts: List[str] = []
+            final: dict = {}
+            async with gen_scheduler().slot(priority, deadline) as queue:
+                t_gen_start = time.perf_counter()
+                async for chunk in llm().stream(packed.prompt):
+                    if chunk.get("done"):
+                        final = chunk
+                    piece = chunk.get("response", "")
+                    if not piece:
+                        continue
+                    if t_first is None:
+                        t_first = time.perf_counter()
+                    parts.append(piece)
+                    bc.publish("token", {"text": piece})
+                t_gen_end = time.perf_counter()
 
-        return {"ok": True, "answer": answer, "sources": citations, "metrics": metrics, "retrieved": retrieved}
+            metrics = answer_metrics(ret, packed, prompt_ms, t0, t_gen_start, t_gen_end, queue, final)
+            metrics["time_to_first_token_ms"] = round(((t_first or t_gen_end) - t0) * 1000, 2)
+            metrics["coalesced"] = False
+            text = "".join(parts).strip()
+            remember(ret, {"answer": text, "sources": sources, "retrieved": retrieved, "metrics": metrics})
+            observe("/ask/stream", "generated", metrics)
+            bc.publish("metrics", {"ok": True, "answer": text, "metrics": metrics})
 
+        except Rejected as e:  # queue grew while we were retrieving
+            bc.publish("error", shed_body("/ask/stream", e))
+        except Exception as e:
+            bc.publish("error", failure("/ask/stream", e))
+
+    # a follower can't give up mid-stream with a 503, so the deadline is part of the key
+    key = ("stream", normalize_query(query),
+           cache_params(top_k, score_threshold, exact_search, max_per_doc, doc_ids, compress, hybrid), two_phase,
+           priority, deadline_s)
+    bc, shared = flights().stream(key if settings.COALESCE_ENABLED else object(), produce)
+    if shared:
+        COALESCED.inc(endpoint="/ask/stream")
+
+    try:
+        await asyncio.shield(bc.opened)
+    except Rejected as e:
+        return shed("/ask/stream", e)
     except Exception as e:
-        return {"ok": False, "error": str(e)}
+        return sse_response(iter([sse("error", failure("/ask/stream", e))]))
+
+    async def events():
+        async for event, data in bc.subscribe():
+            if event == "metrics" and shared:
+                data = {**data, "metrics": {**data["metrics"], "coalesced": True}}
+            yield sse(event, data)
+
+    return sse_response(events())
+
+
+@app.post("/ask/batch")
+async def ask_batch(
+    queries: List[str] = Body(..., embed=True, description="Questions to answer"),
+    top_k: int = Body(4, embed=True, description="Number of chunks to return"),
+    score_threshold: float = Body(0.50, embed=True, description="Min cosine score to keep"),
+    exact_search: bool = Body(False, embed=True, description="Use exhaustive search while KB is small"),
+    max_per_doc: int = Body(2, embed=True, description="Limit chunks per document"),
+    doc_ids: Optional[List[str]] = Body(None, embed=True, description="Only search these documents"),
+    two_phase: bool = Body(True, embed=True, description="Fetch chunk text only for curated hits"),
+    compress: Optional[bool] = Body(None, embed=True, description="Keep only query-relevant sentences (default COMPRESS_CONTEXT)"),
+    hybrid: Optional[bool] = Body(None, embed=True, description="Fuse BM25 + vector search with RRF (default HYBRID_RETRIEVAL)"),
+    concurrency: int = Body(settings.BATCH_GEN_CONCURRENCY, embed=True, description="Max generations in flight"),
+    priority: Priority = Body("batch", embed=True, description="Scheduler class: interactive | batch"),
+    deadline_s: Optional[float] = Body(None, embed=True, description="Per-job deadline (default GEN_BATCH_DEADLINE_S)"),
+):
+    """
+    Bulk variant of /ask for offline jobs (e.g. pre-generating ticket replies).
+    All questions are embedded in one encode() call and searched in one batch request;
+    generation runs with at most `concurrency` calls in flight, queued behind interactive
+    traffic. Answers stream back as NDJSON in completion order, one line per question:
+    {"index": i, "query": ..., <same fields as /ask>}; shed questions carry "status" and "retry_after_s".
+    """
+    compress = settings.COMPRESS_CONTEXT if compress is None else compress
+    hybrid = settings.HYBRID_RETRIEVAL if hybrid is None else hybrid
+
+    async def lines():
+        t0 = time.perf_counter()
+        deadline = t0 + (deadline_s or settings.GEN_BATCH_DEADLINE_S)
+        try:
+            rets = await retrieve_batch(queries, top_k, score_threshold, exact_search, max_per_doc, doc_ids, two_phase,
+                                        compress, hybrid)
+        except Exception as e:
+            yield json.dumps(failure("/ask/batch", e)) + "\n"
+            return
+
+        gate = asyncio.Semaphore(max(1, int(concurrency)))
+
+        async def one(i: int, ret: dict) -> dict:
+            try:
+                async with gate:
+                    resp = await answer(ret, queries[i], t0, "/ask/batch", priority, deadline)
+            except Rejected as e:
+                resp = shed_body("/ask/batch", e)
+            except Exception as e:
+                resp = failure("/ask/batch", e)
+            return {"index": i, "query": queries[i], **resp}
+
+        tasks = [asyncio.create_task(one(i, ret)) for i, ret in enumerate(rets)]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield json.dumps(await done, ensure_ascii=False) + "\n"
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+# -----------------------------------------------------------------------------
+# Conversations: server-side sessions that continue from Ollama's returned
+# context, so a follow-up only sends (and Ollama only evaluates) what is new.
+# -----------------------------------------------------------------------------
+def chunk_key(h) -> tuple:
+    return h.payload.get("doc_id"), h.payload.get("chunk_id")
+
+
+def plan_turn(session: ChatSession, ret: dict, query: str, counter: TokenCounter) -> tuple[Packed, float, dict]:
+    """
+    Prompt for the next turn. Follow-ups carry only chunks the conversation hasn't seen
+    yet, behind the session's context; once they no longer fit the window the session
+    starts over with a full prompt. Sets ret["curated"] to the chunks this answer can cite.
+    """
+    t_prompt = time.perf_counter()
+    budget = prompt_budget()
+    curated = ret["curated"]
+    fresh = [h for h in curated if chunk_key(h) not in session.seen]
+    reused, reset, packed = len(session.context), False, None
+    if reused:
+        left = budget - reused
+        packed = pack_prompt(fresh, query, counter, left, build=build_followup_prompt)
+        if (fresh and not packed.hits) or packed.info["prompt_tokens_counted"] > left:
+            session.reset()
+            reset, reused, packed = True, 0, None
+    if packed is None:
+        packed = pack_prompt(curated, query, counter, budget)
+    sent = {chunk_key(h) for h in packed.hits} | session.seen
+    ret["curated"] = [h for h in curated if chunk_key(h) in sent]
+    turn = {
+        "turn": session.turns + 1,
+        "reset": reset,
+        "reused_context_tokens": reused,
+        "new_chunks": len(packed.hits),
+        "already_seen_chunks": len(curated) - len(fresh) if not reset else 0,
+    }
+    return packed, round((time.perf_counter() - t_prompt) * 1000, 3), turn
+
+
+def chat_producer(session: ChatSession, query: str, knobs: dict, priority: Priority,
+                  deadline_s: Optional[float], endpoint: str):
+    """One conversation turn as a Broadcast producer (see /ask/stream); turns of a session run one at a time."""
+    async def produce(bc: Broadcast) -> None:
+        async with session.lock:
+            t0 = time.perf_counter()
+            deadline = t0 + (deadline_s or settings.GEN_DEADLINE_S)
+            try:
+                ret = await retrieve(query, **knobs, use_cache=False)
+                if ret["contexts"] or len(session.context):
+                    packed, prompt_ms, turn = plan_turn(session, ret, query, await prompt_counter())
+                    gen_scheduler().check(priority, deadline)
+            except Exception as e:
+                bc.fail(e)
+                return
+            bc.open()
+
+            try:
+                curated = ret["curated"]
+                bc.publish("retrieval", {"session_id": session.id, "sources": citations_of(curated),
+                                         "retrieved": retrieved_of(curated)})
+
+                if not ret["contexts"] and not len(session.context):
+                    bc.publish("token", {"text": EMPTY_ANSWER})
+                    metrics = empty_metrics(ret, t0)
+                    metrics["time_to_first_token_ms"] = metrics["timings_ms"]["server_total_ms"]
+                    observe(endpoint, "empty", metrics)
+                    bc.publish("metrics", {"ok": True, "session_id": session.id, "answer": EMPTY_ANSWER,
+                                           "metrics": metrics})
+                    return
+
+                t_first = None
+                parts: List[str] = []
+                final: dict = {}
+                async with gen_scheduler().slot(priority, deadline) as queue:
+                    t_gen_start = time.perf_counter()
+                    async for chunk in llm().stream(packed.prompt, context=session.context.tolist()):
+                        if chunk.get("done"):
+                            final = chunk
+                        piece = chunk.get("response", "")
+                        if not piece:
+                            continue
+                        if t_first is None:
+                            t_first = time.perf_counter()
+                        parts.append(piece)
+                        bc.publish("token", {"text": piece})
+                    t_gen_end = time.perf_counter()
+
+                if final.get("context"):
+                    session.context = np.asarray(final["context"], dtype=np.int32)
+                    session.seen.update(chunk_key(h) for h in packed.hits)
+                else:  # nothing to continue from: next turn sends everything again
+                    session.reset()
+                session.turns += 1
+
+                metrics = answer_metrics(ret, packed, prompt_ms, t0, t_gen_start, t_gen_end, queue, final)
+                metrics["session"] = turn
+                metrics["time_to_first_token_ms"] = round(((t_first or t_gen_end) - t0) * 1000, 2)
+                observe(endpoint, "generated", metrics)
+                bc.publish("metrics", {"ok": True, "session_id": session.id, "answer": "".join(parts).strip(),
+                                       "metrics": metrics})
+
+            except Rejected as e:
+                bc.publish("error", shed_body(endpoint, e))
+            except Exception as e:
+                bc.publish("error", failure(endpoint, e))
+
+    return produce
+
+
+def start_turn(session_id: Optional[str], query: str, knobs: dict, priority: Priority,
+               deadline_s: Optional[float], endpoint: str) -> Broadcast:
+    session, _ = sessions().get_or_create(session_id)
+    key = ("chat", session.id, normalize_query(query))  # a double-submitted question runs once
+    bc, shared = flights().stream(key if settings.COALESCE_ENABLED else object(),
+                                  chat_producer(session, query, knobs, priority, deadline_s, endpoint))
+    if shared:
+        COALESCED.inc(endpoint=endpoint)
+    return bc
+
+
+@app.post("/chat")
+async def chat(
+    query: str = Body(..., embed=True, description="User message"),
+    session_id: Optional[str] = Body(None, embed=True, description="From the previous turn; omit to start"),
+    top_k: int = Body(4, embed=True, description="Number of chunks to retrieve"),
+    score_threshold: float = Body(0.50, embed=True, description="Min cosine score to keep"),
+    exact_search: bool = Body(False, embed=True, description="Use exhaustive search while KB is small"),
+    max_per_doc: int = Body(2, embed=True, description="Limit chunks per document"),
+    doc_ids: Optional[List[str]] = Body(None, embed=True, description="Only search these documents"),
+    hybrid: Optional[bool] = Body(None, embed=True, description="Fuse BM25 + vector search with RRF (default HYBRID_RETRIEVAL)"),
+    priority: Priority = Body("interactive", embed=True, description="Scheduler class: interactive | batch"),
+    deadline_s: Optional[float] = Body(None, embed=True, description="Answer within this many seconds or get 503"),
+):
+    """
+    One turn of a conversation. The first turn sends SYSTEM + context like /ask; later
+    turns send only newly retrieved chunks + the question and pass back the `context`
+    Ollama returned, so the conversation so far is not re-evaluated. Returns the /ask
+    fields plus "session_id" (send it with the next turn) and metrics.session /
+    metrics.ollama (prompt-eval vs eval time). Unknown or expired ids start a new session.
+    """
+    knobs = dict(top_k=top_k, score_threshold=score_threshold, exact_search=exact_search,
+                 max_per_doc=max_per_doc, doc_ids=doc_ids,
+                 hybrid=settings.HYBRID_RETRIEVAL if hybrid is None else hybrid)
+    bc = start_turn(session_id, query, knobs, priority, deadline_s, "/chat")
+    try:
+        await asyncio.shield(bc.opened)
+    except Rejected as e:
+        return shed("/chat", e)
+    except Exception as e:
+        return failure("/chat", e)
+
+    response: dict = {"ok": False, "error": "Turn ended without an answer"}
+    retrieval: dict = {}
+    async for event, data in bc.subscribe():
+        if event == "retrieval":
+            retrieval = data
+        elif event == "metrics":
+            response = {**data, "sources": retrieval.get("sources", []), "retrieved": retrieval.get("retrieved", [])}
+        elif event == "error":
+            response = data
+    return response
+
+
+@app.post("/chat/stream")
+async def chat_stream(
+    query: str = Body(..., embed=True, description="User message"),
+    session_id: Optional[str] = Body(None, embed=True, description="From the previous turn; omit to start"),
+    top_k: int = Body(4, embed=True, description="Number of chunks to retrieve"),
+    score_threshold: float = Body(0.50, embed=True, description="Min cosine score to keep"),
+    exact_search: bool = Body(False, embed=True, description="Use exhaustive search while KB is small"),
+    max_per_doc: int = Body(2, embed=True, description="Limit chunks per document"),
+    doc_ids: Optional[List[str]] = Body(None, embed=True, description="Only search these documents"),
+    hybrid: Optional[bool] = Body(None, embed=True, description="Fuse BM25 + vector search with RRF (default HYBRID_RETRIEVAL)"),
+    priority: Priority = Body("interactive", embed=True, description="Scheduler class: interactive | batch"),
+    deadline_s: Optional[float] = Body(None, embed=True, description="Answer within this many seconds or get 503"),
+):
+    """/chat as Server-Sent Events (retrieval → token… → metrics, like /ask/stream); both carry "session_id"."""
+    knobs = dict(top_k=top_k, score_threshold=score_threshold, exact_search=exact_search,
+                 max_per_doc=max_per_doc, doc_ids=doc_ids,
+                 hybrid=settings.HYBRID_RETRIEVAL if hybrid is None else hybrid)
+    bc = start_turn(session_id, query, knobs, priority, deadline_s, "/chat/stream")
+    try:
+        await asyncio.shield(bc.opened)
+    except Rejected as e:
+        return shed("/chat/stream", e)
+    except Exception as e:
+        return sse_response(iter([sse("error", failure("/chat/stream", e))]))
+
+    async def events():
+        async for event, data in bc.subscribe():
+            yield sse(event, data)
+
+    return sse_response(events())
+
+
+@app.delete("/chat/{session_id}")
+async def end_chat(session_id: str):
+    """Forget a conversation (the UI's "Clear chat")."""
+    return {"ok": True, "deleted": sessions().drop(session_id)}
+
+# -----------------------------------------------------------------------------
+# Ingestion: background jobs. The work runs in separate niced processes
+# (api/rag/jobs.py), so a big ingest never competes with /ask on this event loop.
+# -----------------------------------------------------------------------------
+def ingest_dir(path: str) -> Path:
+    """A directory under INGEST_ROOT (relative paths are taken from there)."""
+    root = Path(settings.INGEST_ROOT).resolve()
+    p = (root / path).resolve()
+    if p != root and root not in p.parents:
+        raise ValueError(f"{path} is outside INGEST_ROOT ({root})")
+    if not p.is_dir():
+        raise ValueError(f"{path} is not a directory")
+    return p
+
+
+@app.post("/ingest/jobs", status_code=202)
+async def create_ingest_job(
+    path: Optional[str] = Body(None, embed=True, description="Directory to ingest, under INGEST_ROOT"),
+    files: Optional[List[dict]] = Body(None, embed=True, description='Uploaded files: [{"name": "faq.md", "content": "..."}]'),
+    collection: str = Body(settings.QDRANT_COLLECTION, embed=True, pattern=COLLECTION_NAME,
+                           description="Collection (or alias) to write"),
+    exts: List[str] = Body([".md", ".txt"], embed=True, description="Extensions to include"),
+    full: bool = Body(False, embed=True, description="Ignore the manifest and re-embed every file"),
+    prune: Optional[bool] = Body(None, embed=True, description="Delete documents gone from the directory (default: yes for a path, no for uploads)"),
+    workers: int = Body(1, embed=True, description="Read+chunk processes inside the job"),
+):
+    """
+    Queue an ingest of a server directory (`path`) or of uploaded `files`, and return at
+    once with the job (202). Uploaded names are relative paths and become doc_ids, so
+    re-uploading faq.md replaces the earlier faq.md. Poll GET /ingest/jobs/{id} for
+    progress. Jobs use the incremental, checkpointed ingest of `ingest_kb load`.
+    """
+    if not settings.INGEST_JOBS_ENABLED:
+        return JSONResponse({"ok": False, "error": "ingest jobs are disabled (INGEST_JOBS_ENABLED)"}, status_code=404)
+    try:
+        if (path is None) == (files is None):
+            raise ValueError("send either path or files")
+        exts_tuple = tuple(e.strip().lower() for e in exts if e.strip())
+        runner = ingest_jobs()
+        job_id = runner.store.new_id()
+        if files is not None:
+            if not files:
+                raise ValueError("files is empty")
+            kb_dir = await asyncio.to_thread(runner.store.save_uploads, job_id, files, exts_tuple)
+            source = {"type": "upload", "files": len(files)}
+        else:
+            kb_dir = ingest_dir(path)
+            source = {"type": "directory", "path": str(kb_dir)}
+    except ValueError as e:
+        return JSONResponse(failure("/ingest/jobs", e), status_code=400)
+    params = {"kb_dir": str(kb_dir), "collection": collection, "exts": list(exts_tuple), "full": full,
+              "prune": (files is None) if prune is None else prune, "workers": max(1, workers)}
+    job = await asyncio.to_thread(runner.store.create, source, params, job_id)
+    runner.submit(job_id)
+    return {"ok": True, "job": job}
+
+
+@app.get("/ingest/jobs")
+async def list_ingest_jobs(limit: int = 50):
+    """Recent jobs, newest first, plus what this worker is running."""
+    runner = ingest_jobs()
+    return {"jobs": await asyncio.to_thread(runner.store.list, limit), "runner": runner.stats()}
+
+
+@app.get("/ingest/jobs/{job_id}")
+async def get_ingest_job(job_id: str):
+    """
+    One job: status (queued / running / done / failed), progress (phase, files and bytes
+    done of total, chunks written, chunks_per_s, eta_s, checkpoints) and, once done, the
+    result (counts, per-stage throughput, embedding-cache hit rate, peak RSS).
+    """
+    job = await asyncio.to_thread(ingest_jobs().store.get, job_id)
+    if job is None:
+        return JSONResponse({"ok": False, "error": f"unknown job {job_id}"}, status_code=404)
+    return {"ok": True, "job": job}
+
+
+@app.post("/ingest/jobs/{job_id}/resume")
+async def resume_ingest_job(job_id: str):
+    """Queue a failed or interrupted job again; it continues from its last checkpoint."""
+    job = await asyncio.to_thread(ingest_jobs().resume, job_id)
+    if job is None:
+        return JSONResponse({"ok": False, "error": f"unknown job {job_id}"}, status_code=404)
+    return {"ok": True, "job": job}
+
+_T_IMPORT_END = time.perf_counter()  # keep last: cold-start import time is logged at startup
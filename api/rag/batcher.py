@@ -0,0 +1,119 @@
+# api/rag/batcher.py
+from __future__ import annotations
+import asyncio
+import bisect
+import time
+from typing import Awaitable, Callable, List, Optional, Sequence
+
+import numpy as np
+
+EncodeFn = Callable[[List[str]], Awaitable[np.ndarray]]
+
+
+class Histogram:
+    """Tiny fixed-bucket histogram (Prometheus-style upper bounds, last bucket is +Inf)."""
+
+    def __init__(self, buckets: Sequence[float]):
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        buckets, running = {}, 0
+        for bound, count in zip(self.bounds + [float("inf")], self.counts):
+            running += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = running
+        return {
+            "count": self.total,
+            "avg": round(self.sum / self.total, 3) if self.total else 0.0,
+            "buckets": buckets,  # cumulative, le=<bound>
+        }
+
+
+class EmbedBatcher:
+    """
+    Collects single-text embed requests that arrive within `max_wait_ms` of each other
+    (up to `max_batch`) and runs them through one encode() call, then fans the
+    normalized vectors back to the waiting callers.
+    """
+
+    def __init__(self, encode: EncodeFn, max_batch: int = 32, max_wait_ms: float = 3.0):
+        self._encode = encode
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._queue: "asyncio.Queue[tuple[str, asyncio.Future, float]]" = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64])
+        self.wait_ms = Histogram([0.5, 1, 2, 3, 5, 10, 25, 50, 100])
+        self.encode_ms = Histogram([2, 5, 10, 25, 50, 100, 250, 500])
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed one text; resolves once the batch containing it has been encoded."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        fut = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, fut, time.perf_counter()))
+        return await fut
+
+    async def _next_batch(self) -> list:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            t_dispatch = time.perf_counter()
+            self.batch_sizes.observe(len(batch))
+            for _, _, t_enq in batch:
+                self.wait_ms.observe((t_dispatch - t_enq) * 1000)
+
+            try:
+                vecs = await self._encode([text for text, _, _ in batch])
+            except Exception as e:
+                for _, fut, _ in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self.encode_ms.observe((time.perf_counter() - t_dispatch) * 1000)
+
+            for (_, fut, _), vec in zip(batch, vecs):
+                if not fut.done():  # caller may have been cancelled
+                    fut.set_result(vec)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "queued": self._queue.qsize(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "wait_ms": self.wait_ms.snapshot(),
+            "encode_ms": self.encode_ms.snapshot(),
+        }
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
@@ -0,0 +1,142 @@
+# api/rag/cache.py
+from __future__ import annotations
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+@dataclass
+class CacheHit:
+    value: Dict[str, Any]
+    similarity: float
+    age_s: float
+
+
+@dataclass
+class _Entry:
+    slot: int
+    params: Hashable
+    value: Dict[str, Any]
+    created: float
+    nbytes: int
+
+
+class SemanticCache:
+    """
+    In-process answer cache keyed by (normalized) query embedding.
+
+    Keys live in one preallocated float32 matrix, so a lookup is a single
+    matrix-vector product over every slot. Entries are evicted LRU once
+    `max_entries` or `max_bytes` is exceeded, and expire after `ttl_s`.
+    A hit also requires identical retrieval parameters (`params`).
+    Call `sync(version)` before lookups: a new collection version drops everything.
+    """
+
+    def __init__(self, dim: int, threshold: float = 0.95, ttl_s: float = 3600.0,
+                 max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.threshold = float(threshold)
+        self.ttl_s = float(ttl_s)
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = int(max_bytes)
+
+        self._keys = np.zeros((self.max_entries, dim), dtype=np.float32)
+        self._active = np.zeros(self.max_entries, dtype=bool)
+        self._param_ids = np.full(self.max_entries, -1, dtype=np.int32)
+        self._param_index: Dict[Hashable, int] = {}
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()  # slot -> entry, LRU order
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        self._bytes = 0
+
+        self.version = ""
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # --- invalidation --------------------------------------------------------
+    def sync(self, version: str) -> None:
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+    def clear(self) -> None:
+        self._active[:] = False
+        self._param_ids[:] = -1
+        self._param_index.clear()
+        self._entries.clear()
+        self._free = list(range(self.max_entries - 1, -1, -1))
+        self._bytes = 0
+
+    # --- lookup / insert -----------------------------------------------------
+    def lookup(self, qvec: np.ndarray, params: Hashable) -> Optional[CacheHit]:
+        pid = self._param_index.get(params)
+        if pid is None or not self._entries:
+            self.misses += 1
+            return None
+
+        scores = self._keys @ np.asarray(qvec, dtype=np.float32)
+        scores[~self._active | (self._param_ids != pid)] = -np.inf
+        slot = int(np.argmax(scores))
+        best = float(scores[slot])
+        if best < self.threshold:
+            self.misses += 1
+            return None
+
+        entry = self._entries[slot]
+        age = time.monotonic() - entry.created
+        if age > self.ttl_s:
+            self._evict(slot)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(slot)
+        self.hits += 1
+        return CacheHit(value=entry.value, similarity=round(best, 4), age_s=round(age, 1))
+
+    def put(self, qvec: np.ndarray, params: Hashable, value: Dict[str, Any]) -> None:
+        nbytes = self._keys.shape[1] * 4 + len(json.dumps(value, ensure_ascii=False, default=str))
+        if nbytes > self.max_bytes:
+            return
+        while self._entries and (not self._free or self._bytes + nbytes > self.max_bytes):
+            self._evict(next(iter(self._entries)))  # least recently used
+
+        pid = self._param_index.setdefault(params, len(self._param_index))
+        slot = self._free.pop()
+        self._keys[slot] = qvec
+        self._active[slot] = True
+        self._param_ids[slot] = pid
+        self._entries[slot] = _Entry(slot, params, value, time.monotonic(), nbytes)
+        self._bytes += nbytes
+
+    def _evict(self, slot: int) -> None:
+        entry = self._entries.pop(slot)
+        self._active[slot] = False
+        self._param_ids[slot] = -1
+        self._bytes -= entry.nbytes
+        self._free.append(slot)
+        self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "threshold": self.threshold,
+            "ttl_s": self.ttl_s,
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+def cache_params(top_k: int, score_threshold: float, exact_search: bool, max_per_doc: int,
+                 doc_ids: Optional[Sequence[str]] = None, compress: bool = False, hybrid: bool = False) -> Tuple:
+    return (int(top_k), round(float(score_threshold), 4), bool(exact_search), int(max_per_doc),
+            tuple(sorted(doc_ids or ())), bool(compress), bool(hybrid))
@@ -1,10 +1,225 @@
 # api/rag/chunker.py
+"""
+Structure-aware markdown chunker.
+
+A document is read once, line by line, and cut into blocks: headings, paragraphs
+(runs of non-blank lines) and fenced code. Blocks are packed into chunks of about
+`target_tokens`; a heading always starts a new chunk, and a block larger than the
+target is split at sentence ends (then at word boundaries), never re-split as a whole.
+Each chunk carries the heading path above it and the byte span it came from:
+
+    Chunk(text="## Pricing\n\nPlans start at ...", headings=["Overview", "Pricing"],
+          start=1042, end=1688, n_tokens=143)
+
+`text` is the source span with runs of blank lines folded to one; `start`/`end` are
+UTF-8 byte offsets into the document as given (open files with newline="" to keep CRLF).
+"""
 from __future__ import annotations
-from typing import List
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import re
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from api.rag.packing import sentences
+from api.rag.tokens import TokenCounter, token_counter
+from api.settings import settings
+
+_HEADING = re.compile(r"^ {0,3}(#{1,6})[ \t]+(.*?)(?:[ \t]+#+)?[ \t]*$")
+_FENCE = re.compile(r"^ {0,3}(```|~~~)")
+_RULE = re.compile(r"^ {0,3}([-*_])(?:[ \t]*\1){2,}[ \t]*$")
+_WORD = re.compile(r"\S+\s*")
+BLOCK_BATCH = 64  # blocks token-counted per encode_batch call
+
+
+@dataclass
+class Chunk:
+    text: str
+    headings: List[str] = field(default_factory=list)
+    start: int = 0
+    end: int = 0
+    n_tokens: int = 0
+
+    def payload(self) -> dict:
+        """Location fields stored with the point next to text / n_tokens."""
+        return {"headings": self.headings, "byte_start": self.start, "byte_end": self.end}
+
+
+@dataclass
+class _Block:
+    text: str
+    start: int  # byte offsets, `end` excluding trailing whitespace
+    end: int
+    heading: int = 0  # 1-6 for a heading line
+    n_tokens: int = 0
+    sentences: List[Tuple[str, int]] = field(default_factory=list)  # (sentence, n_tokens), oversized blocks only
+
+
+def _blocks(lines: Iterable[str]) -> Iterator[_Block]:
+    """Headings, paragraphs and fenced code blocks of a markdown line stream, with byte spans."""
+    pos = 0
+    buf: List[str] = []
+    buf_start = buf_end = 0
+    fence = ""
+
+    def flush() -> Optional[_Block]:
+        text = "".join(buf).rstrip()
+        buf.clear()
+        if not text or _RULE.match(text):
+            return None
+        return _Block(text, buf_start, buf_end)
+
+    for line in lines:
+        size = len(line.encode("utf-8"))
+        stripped = line.rstrip()
+        if fence:
+            buf.append(line)
+            buf_end = pos + len(stripped.encode("utf-8"))
+            if stripped.lstrip().startswith(fence):
+                fence = ""
+        elif not stripped:
+            block = flush()
+            if block:
+                yield block
+        else:
+            m = _HEADING.match(stripped) if stripped.lstrip().startswith("#") else None
+            if m:
+                block = flush()
+                if block:
+                    yield block
+                yield _Block(stripped.strip(), pos + len(line) - len(line.lstrip()),
+                             pos + len(stripped.encode("utf-8")), heading=len(m.group(1)))
+            else:
+                if not buf:
+                    buf_start = pos
+                f = _FENCE.match(stripped)
+                if f:
+                    fence = f.group(1)
+                buf.append(line)
+                buf_end = pos + len(stripped.encode("utf-8"))
+        pos += size
+    block = flush()
+    if block:
+        yield block
+
+
+def _counted(blocks: Iterator[_Block], target: int, counter: TokenCounter) -> Iterator[_Block]:
+    """
+    Token-count blocks BLOCK_BATCH at a time, sentence by sentence in one Rust-side
+    encode_batch per window: a block's count is the sum of its sentences', and blocks
+    over `target` keep the per-sentence counts so splitting them tokenizes nothing again.
+    """
+    while True:
+        window = list(islice(blocks, BLOCK_BATCH))
+        if not window:
+            return
+        pieces = [sentences(b.text) for b in window]
+        counts = iter(counter.count_batch([s for p in pieces for s in p]))
+        for b, p in zip(window, pieces):
+            sent = [(s, next(counts)) for s in p]
+            b.n_tokens = sum(n for _, n in sent)
+            if b.n_tokens > target:
+                b.sentences = sent
+            yield b
+
+
+def _split(block: _Block, target: int, counter: TokenCounter) -> List[_Block]:
+    """Pieces of an oversized block: sentences, and word runs of sentences still over `target`."""
+    out: List[_Block] = []
+    pos = block.start
+    for piece, n in block.sentences:
+        size = len(piece.encode("utf-8"))
+        if n <= target:
+            out.append(_Block(piece, pos, pos + len(piece.rstrip().encode("utf-8")), n_tokens=n))
+        else:
+            words = [m.group() for m in _WORD.finditer(piece)]
+            lead = len(piece) - len(piece.lstrip())
+            wpos = pos + len(piece[:lead].encode("utf-8"))
+            run: List[str] = []
+            run_start = wpos
+            used = 0
+            for w, wn in zip(words, counter.count_batch(words)):
+                if run and used + wn > target:
+                    text = "".join(run)
+                    out.append(_Block(text, run_start, run_start + len(text.rstrip().encode("utf-8")), n_tokens=used))
+                    run, run_start, used = [], wpos, 0
+                run.append(w)
+                used += wn
+                wpos += len(w.encode("utf-8"))
+            if run:
+                text = "".join(run)
+                out.append(_Block(text, run_start, run_start + len(text.rstrip().encode("utf-8")), n_tokens=used))
+        pos += size
+    return out
+
+
+def iter_chunks(lines: Iterable[str], target_tokens: Optional[int] = None, min_tokens: Optional[int] = None,
+                counter: Optional[TokenCounter] = None) -> Iterator[Chunk]:
+    """
+    Stream chunks out of markdown `lines` (a file object works). Text is tokenized
+    once; a chunk's n_tokens is the sum of its sentences plus block separators.
+    A subsection heading joins the current chunk while that is under `min_tokens`,
+    so runs of tiny sections don't become tiny chunks; `headings` is then the parent's.
+    """
+    counter = counter or token_counter()
+    target = max(1, int(target_tokens or settings.CHUNK_TARGET_TOKENS))
+    floor = settings.CHUNK_MIN_TOKENS if min_tokens is None else int(min_tokens)
+    sep_tokens = counter.count("\n\n")
+    path: List[Tuple[int, str]] = []
+    parts: List[Tuple[_Block, bool]] = []  # (block, continues the previous block)
+    headings: List[str] = []  # path of the current chunk's first heading
+    level = 0  # its level (0 = no heading yet)
+    used = 0
+    body = False  # the chunk holds more than headings
+
+    def emit() -> Chunk:
+        out: List[str] = []
+        for b, cont in parts:
+            if cont:
+                out.append(b.text)
+            else:
+                if out:
+                    out[-1] = out[-1].rstrip()
+                    out.append("\n\n")
+                out.append(b.text.lstrip())
+        text = "".join(out).strip()
+        return Chunk(text=text, headings=headings, start=parts[0][0].start, end=parts[-1][0].end, n_tokens=used)
+
+    def add(b: _Block, cont: bool) -> None:
+        nonlocal used, headings, level
+        if not body or not level:  # a chunk is labelled by its first heading
+            headings, level = [title for _, title in path], (path[-1][0] if path else 0)
+        used += b.n_tokens + (sep_tokens if parts and not cont else 0)
+        parts.append((b, cont))
+
+    for block in _counted(_blocks(lines), target, counter):
+        if block.heading:
+            if body and (used >= floor or block.heading <= level or used + block.n_tokens > target):
+                yield emit()
+                parts.clear()
+                used, body = 0, False
+            while path and path[-1][0] >= block.heading:
+                path.pop()
+            path.append((block.heading, block.text.lstrip("#").strip().strip("*_").strip()))
+            add(block, False)
+            continue
+        pieces = [block] if block.n_tokens <= target else _split(block, target, counter)
+        for i, piece in enumerate(pieces):
+            if body and used + piece.n_tokens > target:
+                yield emit()
+                parts.clear()
+                used, body = 0, False
+                add(piece, False)
+            else:
+                add(piece, i > 0)
+            body = True
+    if parts:
+        yield emit()
+
+
+def chunk_markdown(text: str, target_tokens: Optional[int] = None, min_tokens: Optional[int] = None,
+                   counter: Optional[TokenCounter] = None) -> List[Chunk]:
+    return list(iter_chunks(text.splitlines(keepends=True), target_tokens, min_tokens, counter))
+
 
 def chunk_text(text: str) -> List[str]:
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800, chunk_overlap=120, separators=["\n\n", "\n", " ", ""]
-    )
-    return splitter.split_text(text)
+    return [c.text for c in chunk_markdown(text)]
@@ -0,0 +1,102 @@
+# api/rag/compress.py
+"""
+Extractive context compression: keep only the sentences of each curated chunk that
+are closest to the query (plus their neighbours), so the LLM evaluates a shorter prompt.
+
+Sentence vectors are computed at ingest and stored in the chunk payload:
+  sent_ends    char offset just past each sentence (text[prev:end] is one sentence)
+  sent_tokens  token count of each sentence (packing stays a sum)
+  sent_vecs    base64 float16 matrix, one normalized row per sentence
+Chunks with a single sentence carry none of these and are always kept whole.
+"""
+from __future__ import annotations
+import base64
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from api.rag.packing import sentences
+
+COMPRESS_FIELDS = ["sent_ends", "sent_tokens", "sent_vecs"]
+GAP = " … "  # marks sentences left out between two kept runs
+
+
+def sentence_payload(pieces: Sequence[str], n_tokens: Sequence[int]) -> dict:
+    """Offsets + token counts for one chunk's sentences (vectors are added by the embed stage)."""
+    ends, pos = [], 0
+    for p in pieces:
+        pos += len(p)
+        ends.append(pos)
+    return {"sent_ends": ends, "sent_tokens": list(n_tokens)}
+
+
+def split_for_compression(chunks: Sequence[str]) -> List[List[str]]:
+    """Sentences of each chunk, or [] where there is nothing to compress (one sentence)."""
+    out = []
+    for chunk in chunks:
+        pieces = sentences(chunk)
+        out.append(pieces if len(pieces) > 1 else [])
+    return out
+
+
+def sentence_texts(text: str, ends: Sequence[int]) -> List[str]:
+    return [text[start:end] for start, end in zip([0, *ends[:-1]], ends)]
+
+
+def encode_vectors(vecs: np.ndarray) -> str:
+    return base64.b64encode(np.asarray(vecs, dtype=np.float16).tobytes()).decode("ascii")
+
+
+def decode_vectors(data: str, dim: int) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=np.float16).reshape(-1, dim)
+
+
+def compress(hits: list, qvec: np.ndarray, top: int = 2,
+             neighbors: int = 1) -> Tuple[List[Optional[Tuple[str, int]]], dict]:
+    """
+    Per hit, (compressed text, n_tokens) or None to keep it whole, plus summary stats.
+    Every sentence of every hit is scored in one matrix-vector product.
+    """
+    qvec = np.asarray(qvec, dtype=np.float32)
+    owners, mats = [], []
+    for i, h in enumerate(hits):
+        p = h.payload
+        if p.get("sent_vecs") and len(p.get("sent_ends") or ()) > 1:
+            m = decode_vectors(p["sent_vecs"], qvec.shape[0])
+            if len(m) == len(p["sent_ends"]):
+                owners.append(i)
+                mats.append(m)
+
+    out: List[Optional[Tuple[str, int]]] = [None] * len(hits)
+    total = kept_total = 0
+    if mats:
+        scores = np.concatenate(mats).astype(np.float32) @ qvec
+        offset = 0
+        for i, m in zip(owners, mats):
+            n = len(m)
+            s = scores[offset:offset + n]
+            offset += n
+            best = np.argsort(-s, kind="stable")[:max(1, top)]
+            keep = sorted({j + d for j in best.tolist() for d in range(-neighbors, neighbors + 1) if 0 <= j + d < n})
+            total += n
+            kept_total += len(keep)
+            if len(keep) == n:
+                continue
+            out[i] = _extract(hits[i].payload, keep)
+
+    return out, {"sentences_total": total, "sentences_kept": kept_total}
+
+
+def _extract(payload: dict, keep: List[int]) -> Tuple[str, int]:
+    pieces, counts = sentence_texts(payload.get("text") or "", payload["sent_ends"]), payload["sent_tokens"]
+    runs: List[str] = []
+    prev = None
+    for j in keep:
+        piece = pieces[j]
+        if prev is not None and j == prev + 1:
+            runs[-1] += piece
+        else:
+            runs.append(piece)
+        prev = j
+    # GAP costs about a token per gap; counted with the kept sentences
+    return GAP.join(r.strip() for r in runs), sum(counts[j] for j in keep) + len(runs) - 1
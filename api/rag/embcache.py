@@ -0,0 +1,223 @@
+# api/rag/embcache.py
+"""
+Persistent embedding cache shared by ingest, the API workers and the sidecar.
+
+Vectors are keyed by (model key, sha256(text)) and stored as float32 blobs in one
+SQLite file (WAL mode, so several processes can read and write it at once). A
+bounded in-memory LRU sits in front for hot queries. When the file's live pages
+exceed `max_mb`, the least recently used rows are deleted.
+
+The model key covers EMB_PATH, EMB_BACKEND, EMB_MODEL_FILE and, for a local model
+folder, the size/mtime of its files, for a hub name the commit of the cached snapshot:
+a different or updated model never reads another model's vectors; its old rows simply
+age out.
+"""
+from __future__ import annotations
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from api.rag.utils import hf_cached_file
+from api.settings import settings
+
+_WEIGHT_SUFFIXES = {".safetensors", ".bin", ".onnx", ".xml", ".pt", ".json"}
+_SQL_VARS = 500  # hashes per SELECT ... IN (...)
+
+
+def model_key(model_or_path: str, backend: str = "torch", model_file: str = "") -> str:
+    parts = [model_or_path, backend, model_file]
+    p = Path(model_or_path).expanduser()
+    if p.is_dir():
+        for f in sorted(p.rglob("*")):
+            if f.is_file() and f.suffix in _WEIGHT_SUFFIXES:
+                st = f.stat()
+                parts.append(f"{f.relative_to(p).as_posix()}:{st.st_size}:{st.st_mtime_ns}")
+    else:
+        # hub name: snapshots/<commit>/config.json, the revision SentenceTransformer loads
+        cached = hf_cached_file(model_or_path, "config.json")
+        if cached is not None:
+            parts.append(f"revision:{cached.parent.name}")
+    return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """
+    encode(model, texts, fn, dim) returns the (len(texts), dim) vectors for `texts`, calling
+    fn() only for the ones not cached yet (and caching what it returns). Thread-safe.
+    """
+
+    def __init__(self, path: Path, memory_entries: int = 4096, max_mb: float = 1024.0):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.memory_entries = max(0, int(memory_entries))
+        self.max_bytes = int(max_mb * 2**20)
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[Tuple[str, bytes], np.ndarray]" = OrderedDict()
+        self._db = sqlite3.connect(str(self.path), timeout=30.0, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")  # a crash may lose the last writes: it's a cache
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS vectors (model TEXT NOT NULL, hash BLOB NOT NULL, vec BLOB NOT NULL,"
+            " used REAL NOT NULL, PRIMARY KEY (model, hash)) WITHOUT ROWID"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS vectors_used ON vectors (used)")
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    # --- lookups -------------------------------------------------------------
+    def peek(self, model: str, text: str) -> Optional[np.ndarray]:
+        """The in-memory entry only (no I/O, safe on the event loop)."""
+        key = (model, text_hash(text))
+        with self._lock:
+            vec = self._memory.get(key)
+            if vec is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return vec
+
+    def lookup(self, model: str, texts: Sequence[str]) -> Tuple[List[Optional[np.ndarray]], List[str]]:
+        """Cached vector per text (None if absent) and where each came from: "memory" / "disk" / ""."""
+        hashes = [text_hash(t) for t in texts]
+        found: List[Optional[np.ndarray]] = [None] * len(texts)
+        source = [""] * len(texts)
+        with self._lock:
+            wanted: Dict[bytes, List[int]] = {}
+            for i, h in enumerate(hashes):
+                vec = self._memory.get((model, h))
+                if vec is not None:
+                    self._memory.move_to_end((model, h))
+                    found[i], source[i] = vec, "memory"
+                    self.memory_hits += 1
+                else:
+                    wanted.setdefault(h, []).append(i)
+            if not wanted:
+                return found, source
+            rows = []
+            keys = list(wanted)
+            for start in range(0, len(keys), _SQL_VARS):
+                part = keys[start:start + _SQL_VARS]
+                rows.extend(self._db.execute(
+                    f"SELECT hash, vec FROM vectors WHERE model = ? AND hash IN ({','.join('?' * len(part))})",
+                    [model, *part],
+                ).fetchall())
+            if rows:
+                self._db.executemany("UPDATE vectors SET used = ? WHERE model = ? AND hash = ?",
+                                     [(time.time(), model, h) for h, _ in rows])
+            for h, blob in rows:
+                vec = np.frombuffer(blob, dtype=np.float32)
+                self._remember((model, h), vec)
+                for i in wanted.pop(h):
+                    found[i], source[i] = vec, "disk"
+                    self.disk_hits += 1
+            self.misses += sum(len(v) for v in wanted.values())
+        return found, source
+
+    # --- writes --------------------------------------------------------------
+    def store(self, model: str, texts: Sequence[str], vecs: np.ndarray) -> None:
+        vecs = np.asarray(vecs, dtype=np.float32)
+        now = time.time()
+        rows = []
+        with self._lock:
+            for t, v in zip(texts, vecs):
+                h = text_hash(t)
+                v = np.array(v, dtype=np.float32)  # own copy, not a view of the whole batch
+                self._remember((model, h), v)
+                rows.append((model, h, v.tobytes(), now))
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO vectors (model, hash, vec, used) VALUES (?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+            self._trim()
+
+    def encode(self, model: str, texts: Sequence[str],
+               fn: Callable[[List[str]], np.ndarray], dim: int) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, dim), dtype=np.float32)
+        found, _ = self.lookup(model, texts)
+        missing = [i for i, v in enumerate(found) if v is None]
+        if missing:
+            todo = list(dict.fromkeys(texts[i] for i in missing))  # each distinct text encoded once
+            fresh = np.asarray(fn(todo), dtype=np.float32)
+            self.store(model, todo, fresh)
+            by_text = dict(zip(todo, fresh))
+            for i in missing:
+                found[i] = by_text[texts[i]]
+        return np.stack(found).astype(np.float32, copy=False)
+
+    def _remember(self, key: Tuple[str, bytes], vec: np.ndarray) -> None:
+        if not self.memory_entries:
+            return
+        self._memory[key] = vec
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _trim(self) -> None:
+        """Delete least recently used rows until the live pages fit in max_bytes (freed pages get reused)."""
+        used = self._bytes()
+        if used <= self.max_bytes:
+            return
+        count = self._db.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        if not count:
+            return
+        # down to 90% so a full cache doesn't trim on every write
+        drop = min(count, int(count * (used - 0.9 * self.max_bytes) / used) + 1)
+        self._db.execute("DELETE FROM vectors WHERE (model, hash) IN "
+                         "(SELECT model, hash FROM vectors ORDER BY used LIMIT ?)", (drop,))
+        self.evicted += drop
+
+    def _bytes(self) -> int:
+        pages = self._db.execute("PRAGMA page_count").fetchone()[0]
+        free = self._db.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pages - free) * self._db.execute("PRAGMA page_size").fetchone()[0]
+
+    # --- reporting -----------------------------------------------------------
+    def hit_rate(self) -> float:
+        total = self.memory_hits + self.disk_hits + self.misses
+        return round((self.memory_hits + self.disk_hits) / total, 4) if total else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "path": str(self.path),
+                "memory_entries": len(self._memory),
+                "memory_max_entries": self.memory_entries,
+                "disk_mb": round(self._bytes() / 2**20, 2),
+                "disk_max_mb": round(self.max_bytes / 2**20, 2),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hit_rate(),
+                "evicted": self.evicted,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def embedding_cache() -> Optional[EmbeddingCache]:
+    """Process-wide cache on EMB_CACHE_PATH (None when EMB_CACHE_ENABLED is off)."""
+    global _cache
+    if not settings.EMB_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            path = Path(settings.EMB_CACHE_PATH or Path(settings.DATA_DIR) / "embeddings.sqlite")
+            _cache = EmbeddingCache(path, settings.EMB_CACHE_MEMORY_ENTRIES, settings.EMB_CACHE_MAX_MB)
+    return _cache
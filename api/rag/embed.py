@@ -1,17 +1,77 @@
 # api/rag/embed.py
 from __future__ import annotations
 from typing import List
+import numpy as np
 from sentence_transformers import SentenceTransformer
 
+from api.rag.embcache import embedding_cache, model_key
+
+EMB_BACKENDS = ("torch", "torch-int8", "onnx", "openvino")
+
 _embed: SentenceTransformer | None = None
 
+def create_embedder(model_or_path: str, backend: str = "torch", model_file: str = "") -> SentenceTransformer:
+    """
+    New SentenceTransformer on the given inference backend (settings.EMB_BACKEND):
+      torch       full-precision PyTorch (default)
+      torch-int8  Linear layers dynamically quantized to int8 (no extra dependencies)
+      onnx        ONNX Runtime, openvino: OpenVINO (pip install "sentence-transformers[onnx]" / "[openvino]");
+                  model_file picks an exported file, e.g. "onnx/model_qint8_avx512_vnni.onnx"
+    All of them keep encode(..., normalize_embeddings=True) as the output contract.
+    The model is stamped with its embedding-cache key (`cache_key`).
+    """
+    if backend not in EMB_BACKENDS:
+        raise ValueError(f"Unknown EMB_BACKEND: {backend!r} (use one of {', '.join(EMB_BACKENDS)})")
+    if backend in ("onnx", "openvino"):
+        kwargs = {"file_name": model_file} if model_file else None
+        model = SentenceTransformer(model_or_path, backend=backend, model_kwargs=kwargs)
+        model.cache_key = model_key(model_or_path, backend, model_file)
+        return model
+    model = SentenceTransformer(model_or_path)
+    if backend == "torch-int8":
+        import warnings
+        import torch
+        from torch.ao.quantization import quantize_dynamic
+        with warnings.catch_warnings():  # eager-mode quantization is deprecated in favour of torchao, still works
+            warnings.simplefilter("ignore")
+            model = quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.cache_key = model_key(model_or_path, backend, model_file)
+    return model
+
 def load_embedder(model_or_path: str) -> SentenceTransformer:
-    """Create or reuse a single SentenceTransformer instance."""
+    """Create or reuse a single SentenceTransformer instance (on settings.EMB_BACKEND)."""
     global _embed
     if _embed is None:
-        _embed = SentenceTransformer(model_or_path)
+        from api.settings import settings
+        _embed = create_embedder(model_or_path, settings.EMB_BACKEND, settings.EMB_MODEL_FILE)
     return _embed
 
+def set_torch_threads(threads: int) -> None:
+    """Pin torch's intra-op pool (0 = torch default); several processes oversubscribe cores otherwise."""
+    if threads <= 0:
+        return
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:  # only allowed before the first parallel op
+        pass
+
+def embedding_dim(model: SentenceTransformer) -> int:
+    """Output dimension (get_embedding_dimension on newer sentence-transformers)."""
+    get = getattr(model, "get_embedding_dimension", None) or model.get_sentence_embedding_dimension
+    return int(get())
+
+def _encode(model: SentenceTransformer, texts: List[str]) -> np.ndarray:
+    return model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32, copy=False)
+
+def embed_array(model: SentenceTransformer, texts: List[str]) -> np.ndarray:
+    """Encode texts -> normalized float32 vectors, one row per text; cached ones skip the model."""
+    cache, key = embedding_cache(), getattr(model, "cache_key", "")
+    if cache is None or not key:
+        return _encode(model, texts)
+    return cache.encode(key, texts, lambda todo: _encode(model, todo), embedding_dim(model))
+
 def embed_texts(model: SentenceTransformer, texts: List[str]) -> List[List[float]]:
     """Encode texts -> normalized vectors (as Python lists)."""
-    return model.encode(texts, normalize_embeddings=True).tolist()
+    return embed_array(model, texts).tolist()
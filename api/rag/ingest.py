@@ -0,0 +1,585 @@
+# api/rag/ingest.py
+"""
+The ingest engine behind `ingest_kb load` and POST /ingest/jobs.
+
+    report = ingest(Path("kb"), "kb_en", progress=print)
+
+Walk a folder → read changed text files → chunk → embed new chunks → upsert, as a
+pipeline: a process pool reads and chunks files, the calling thread embeds full
+cross-file batches, and a thread pool upserts with wait=False behind it.
+
+Checkpoints: every `checkpoint_s` the pipeline is drained (barrier), points of
+replaced chunks are deleted, and the BM25 index and the manifest are saved. A run
+that dies resumes from there: finished files are skipped by the manifest, and a
+file cut short is recorded with the chunks already committed, which are not
+embedded again. Runs on one collection take a file lock, so a CLI load and a job
+never interleave.
+"""
+from __future__ import annotations
+import fcntl
+import hashlib
+import os
+import resource
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Deque, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from api.settings import settings
+from api.rag.chunker import iter_chunks
+from api.rag.compress import encode_vectors, sentence_payload, sentence_texts, split_for_compression
+from api.rag.embcache import embedding_cache
+from api.rag.embed import load_embedder, embed_array
+from api.rag.lexical import BM25Index, index_path
+from api.rag.manifest import Manifest, content_hash
+from api.rag.tokens import token_counter
+from api.rag.vector import ensure_collection, upsert_chunks, delete_points, fetch_vectors, point_id, barrier
+from api.rag.vector import resolve_alias
+
+PROGRESS_EVERY_S = 1.0  # at most one progress callback per second between phase changes / checkpoints
+
+
+def iter_files(root: Path, exts: Sequence[str]) -> Iterable[Path]:
+    for p in root.rglob("*"):
+        if p.is_file() and p.suffix.lower() in exts:
+            yield p
+
+
+def _read_lines(p: Path) -> Iterator[str]:
+    """The file line by line; newline="" keeps CRLF so byte offsets match the file."""
+    with p.open(encoding="utf-8", errors="ignore", newline="") as f:
+        yield from f
+
+
+def _file_hash(p: Path) -> str:
+    """content_hash() of the whole file, computed one line at a time."""
+    h = hashlib.sha256()
+    for line in _read_lines(p):
+        h.update(line.encode("utf-8"))
+    return h.hexdigest()
+
+
+class _Reader:
+    """
+    One file streamed through the chunker as chunk records (text, hash, n_tokens,
+    location, sentences), RECORD_WINDOW at a time. `sha256` is set once the records
+    are exhausted; `chunks` / `busy_s` / `bytes` count the work done (read+chunk stage).
+    """
+
+    RECORD_WINDOW = 64
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.sha256 = ""
+        self.chunks = 0
+        self.busy_s = 0.0
+        self.bytes = 0
+
+    def _lines(self) -> Iterator[str]:
+        h = hashlib.sha256()
+        for line in _read_lines(self.path):
+            data = line.encode("utf-8")
+            h.update(data)
+            self.bytes += len(data)
+            yield line
+        self.sha256 = h.hexdigest()
+
+    def __iter__(self) -> Iterator[dict]:
+        chunks = iter_chunks(self._lines())
+        while True:
+            t0 = time.perf_counter()
+            window = list(islice(chunks, self.RECORD_WINDOW))
+            if not window:
+                return
+            texts = [c.text for c in window]
+            sentences = split_for_compression(texts)
+            counter = token_counter()
+            counts = iter(counter.count_batch([s for pieces in sentences for s in pieces]))
+            records = [{
+                "text": c.text,
+                "hash": content_hash(c.text),
+                "n_tokens": c.n_tokens,  # stored so the API packs prompts without re-tokenizing
+                "tokenizer": counter.name,  # what n_tokens was counted with, in this process
+                "location": c.payload(),
+                "sentences": sentence_payload(pieces, [next(counts) for _ in pieces]) if pieces else None,
+            } for c, pieces in zip(window, sentences)]
+            self.chunks += len(records)
+            self.busy_s += time.perf_counter() - t0
+            yield from records
+
+
+def _prepare(path: str, doc_id: str, known_sha: str) -> dict:
+    """Process-pool stage for files under stream_file_mb: hash, then chunk one file unless unchanged."""
+    t0 = time.perf_counter()
+    p = Path(path)
+    if known_sha and _file_hash(p) == known_sha:
+        return {"doc_id": doc_id, "sha256": known_sha, "chunks": [], "busy_s": time.perf_counter() - t0}
+    reader = _Reader(p)
+    chunks = list(reader)
+    return {"doc_id": doc_id, "sha256": reader.sha256, "chunks": chunks, "busy_s": time.perf_counter() - t0}
+
+
+def _windows(items: Iterable, size: int) -> Iterator[list]:
+    it = iter(items)
+    while True:
+        window = list(islice(it, size))
+        if not window:
+            return
+        yield window
+
+
+def peak_rss_mb() -> Tuple[float, float]:
+    """Peak RSS of this process and of its largest finished child, e.g. a read worker (Linux reports KiB)."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, children
+
+
+class Stage:
+    """Items processed and busy time of one pipeline stage (thread-safe)."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_s = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, items: int, seconds: float) -> None:
+        with self._lock:
+            self.items += items
+            self.busy_s += seconds
+
+    @property
+    def rate(self) -> float:
+        return self.items / self.busy_s if self.busy_s else 0.0
+
+    def line(self) -> str:
+        return f"  {self.name:<10} {self.items:>7} chunks in {self.busy_s:7.2f}s busy → {self.rate:9.1f} chunks/s"
+
+
+class _Upserter:
+    """Upsert stage: up to `concurrency` wait=False batches in flight; drain() waits for all of them (barrier)."""
+
+    def __init__(self, collection: str, concurrency: int, stage: Stage):
+        self.collection = collection
+        self.concurrency = max(1, concurrency)
+        self.stage = stage
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="upsert")
+        self._inflight: Set[Future] = set()
+        self._last: List[dict] = []
+
+    def _run(self, points: List[dict]) -> None:
+        t0 = time.perf_counter()
+        upsert_chunks(collection_name=self.collection, points=points, wait=False)
+        self.stage.add(len(points), time.perf_counter() - t0)
+
+    def submit(self, points: List[dict]) -> None:
+        while len(self._inflight) >= self.concurrency:
+            done, self._inflight = wait(self._inflight, return_when=FIRST_COMPLETED)
+            for fut in done:
+                fut.result()  # surface upsert errors
+        self._inflight.add(self._pool.submit(self._run, points))
+        self._last = points
+
+    def drain(self) -> None:
+        inflight, self._inflight = self._inflight, set()
+        for fut in inflight:
+            fut.result()
+        t0 = time.perf_counter()
+        barrier(self.collection, self._last)
+        self.stage.add(0, time.perf_counter() - t0)
+
+    def close(self) -> None:
+        try:
+            self.drain()
+        finally:
+            self._pool.shutdown(wait=True)
+
+
+@contextmanager
+def _collection_lock(collection: str, on_wait: Callable[[], None]) -> Iterator[None]:
+    """Exclusive flock next to the collection's manifest: one ingest run per collection at a time."""
+    p = Manifest.path_for(collection).with_suffix(".lock")
+    p.parent.mkdir(parents=True, exist_ok=True)
+    with p.open("w") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            on_wait()
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+@dataclass
+class IngestReport:
+    files: int = 0
+    changed: int = 0
+    removed: int = 0
+    embedded: int = 0
+    reused: int = 0
+    deleted: int = 0
+    resumed: int = 0  # files picked up half-written from a previous run's checkpoint
+    checkpoints: int = 0
+    lexical_rows: Optional[int] = None
+    wall_s: float = 0.0
+    stages: List[Stage] = field(default_factory=list)
+    cache: Optional[dict] = None  # embedding-cache hits/misses of this process
+    peak_rss_mb: float = 0.0
+    workers_rss_mb: Optional[float] = None  # read workers, when a pool was used
+
+    def summary(self) -> dict:
+        """JSON-friendly form (what a job records as its result)."""
+        written = self.embedded + self.reused
+        return {
+            "files": self.files, "changed": self.changed, "removed": self.removed,
+            "embedded": self.embedded, "reused": self.reused, "deleted": self.deleted,
+            "resumed": self.resumed, "checkpoints": self.checkpoints, "lexical_rows": self.lexical_rows,
+            "wall_s": round(self.wall_s, 3),
+            "chunks_per_s": round(written / self.wall_s, 1) if self.wall_s else 0.0,
+            "stages": {s.name: {"chunks": s.items, "busy_s": round(s.busy_s, 3), "chunks_per_s": round(s.rate, 1)}
+                       for s in self.stages},
+            "embedding_cache": self.cache,
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "workers_rss_mb": round(self.workers_rss_mb, 1) if self.workers_rss_mb is not None else None,
+        }
+
+
+def ingest(
+    kb_dir: Path,
+    collection: str,
+    exts: Sequence[str] = (".md", ".txt"),
+    batch_size: int = 128,
+    embed_batch_size: int = 64,
+    workers: int = 1,
+    upsert_concurrency: int = 4,
+    full: bool = False,
+    sentence_vectors: bool = True,
+    lexical: Optional[bool] = None,
+    read_ahead_mb: Optional[float] = None,
+    stream_file_mb: Optional[float] = None,
+    prune: bool = True,
+    checkpoint_s: Optional[float] = None,
+    progress: Optional[Callable[[dict], None]] = None,
+) -> IngestReport:
+    """
+    Bring `collection` in line with the `exts` files under `kb_dir`.
+
+    Incremental: the manifest (DATA_DIR/manifests/<collection>.json) remembers each file's
+    size/mtime/sha256 and chunk hashes. Unchanged files are skipped without being read,
+    only new chunks are embedded, and points of removed chunks are deleted, as are those
+    of files gone from kb_dir unless `prune` is off (uploads add to a collection). A reset
+    (`full`, or a new embedding model or tokenizer) rebuilds from kb_dir alone: once the
+    run completes, every point the old manifest listed and this run did not rewrite is
+    deleted, whatever `prune` says.
+
+    Memory-bounded: read workers hold at most `read_ahead_mb` of files, files of
+    `stream_file_mb` or more are streamed window by window, and between stages there is
+    one embed batch and `upsert_concurrency` upsert batches.
+
+    `progress` gets a dict (phase, files/bytes done and total, chunks written, chunks/s,
+    ETA, checkpoints) about once a second and at every phase change and checkpoint.
+    """
+    t_start = time.perf_counter()
+    exts = tuple(exts)
+    lexical = settings.LEXICAL_INDEX if lexical is None else lexical
+    read_ahead_mb = settings.INGEST_READ_AHEAD_MB if read_ahead_mb is None else read_ahead_mb
+    stream_file_mb = settings.INGEST_STREAM_FILE_MB if stream_file_mb is None else stream_file_mb
+    checkpoint_s = settings.INGEST_CHECKPOINT_S if checkpoint_s is None else checkpoint_s
+    report = IngestReport()
+    state = {"phase": "starting", "files_total": 0, "files_done": 0, "bytes_total": 0, "bytes_done": 0}
+    last_progress = 0.0
+
+    def emit(phase: Optional[str] = None, force: bool = False) -> None:
+        nonlocal last_progress
+        if progress is None:
+            return
+        now = time.perf_counter()
+        if phase is not None and phase != state["phase"]:
+            state["phase"], force = phase, True
+        if not force and now - last_progress < PROGRESS_EVERY_S:
+            return
+        last_progress = now
+        elapsed = now - t_start
+        written = report.embedded + report.reused
+        done, total = state["bytes_done"], state["bytes_total"]
+        eta = elapsed * (total - done) / done if done and state["phase"] == "ingesting" else None
+        progress({**state, "chunks_written": written, "chunks_embedded": report.embedded,
+                  "chunks_reused": report.reused, "checkpoints": report.checkpoints,
+                  "elapsed_s": round(elapsed, 1), "chunks_per_s": round(written / elapsed, 1) if elapsed else 0.0,
+                  "eta_s": round(eta, 1) if eta is not None else None})
+
+    emit(force=True)
+    # 1) make sure collection exists (dim must match current EMB_DIM)
+    created = ensure_collection(collection_name=collection, dim=settings.EMB_DIM)
+    physical = resolve_alias(collection)  # manifests + BM25 index follow the physical collection, not the alias
+    with _collection_lock(physical, lambda: emit("waiting")):
+        emit("scanning")
+        manifest = Manifest.load(physical)
+        counter = token_counter()
+        tokenizer = counter.name  # chunk boundaries and stored n_tokens depend on it
+        if counter.estimated and manifest.tokenizer and manifest.tokenizer != tokenizer:
+            # most likely offline for a moment: rebuilding with the estimate would re-chunk everything
+            raise RuntimeError(f"Tokenizer {settings.PROMPT_TOKENIZER or settings.EMB_PATH!r} could not be loaded; "
+                               f"{physical} was chunked with {manifest.tokenizer!r}, not rebuilding it with the "
+                               f"{tokenizer}")
+        reset = created or full or manifest.emb_path != settings.EMB_PATH or manifest.tokenizer != tokenizer
+        if reset:
+            manifest.reset(settings.EMB_PATH, tokenizer, keep_orphans=not created)
+        lex = BM25Index(index_path(physical)).load() if lexical else None
+        if lex is not None and reset:
+            lex.reset()
+        lex_rebuild = lex is not None and not lex.exists and bool(manifest.files)
+        lex_rows: List[Tuple[str, str, int, str]] = []  # (point id, doc_id, chunk_id, text) to (re)index
+        lex_remove: List[str] = []
+
+        # 2) directory scan: only files whose size/mtime moved go to the pipeline
+        seen: Set[str] = set()
+        todo: List[Tuple[Path, str, os.stat_result]] = []
+        for f in iter_files(kb_dir, exts):
+            report.files += 1
+            doc_id = f.relative_to(kb_dir).as_posix()
+            seen.add(doc_id)
+            st = f.stat()
+            entry = manifest.files.get(doc_id)
+            if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns and not lex_rebuild:
+                continue
+            if entry and entry.get("partial"):
+                report.resumed += 1
+            todo.append((f, doc_id, st))
+        state["files_total"] = len(todo)
+        state["bytes_total"] = sum(st.st_size for _, _, st in todo)
+
+        read_stage, embed_stage, upsert_stage = Stage("read+chunk"), Stage("embed"), Stage("upsert")
+        report.stages = [read_stage, embed_stage, upsert_stage]
+        upserter = _Upserter(collection, upsert_concurrency, upsert_stage)
+
+        embedder = None  # loaded only if something actually needs embedding
+        stale_ids: List[str] = []
+        to_embed: List[Tuple[dict, List[str]]] = []  # (point, its sentences); points without "vector" also need one
+        ready: List[dict] = []                 # points with vectors, waiting for a full upsert batch
+        last_checkpoint = time.perf_counter()
+
+        def flush_upserts(force: bool = False) -> None:
+            while len(ready) >= batch_size or (force and ready):
+                upserter.submit(ready[:batch_size])  # blocks while upsert_concurrency batches are in flight
+                del ready[:batch_size]
+
+        def flush_embeds(force: bool = False) -> None:
+            nonlocal embedder
+            while len(to_embed) >= embed_batch_size or (force and to_embed):
+                batch = to_embed[:embed_batch_size]
+                del to_embed[:embed_batch_size]
+                embedder = embedder or load_embedder(settings.EMB_PATH)
+                texts: List[str] = []
+                for point, pieces in batch:  # chunks and their sentences share one encode()
+                    if "vector" not in point:
+                        texts.append(point["payload"]["text"])
+                    texts.extend(pieces)
+                t0 = time.perf_counter()
+                vecs = embed_array(embedder, texts)  # float32 rows; turned into lists only when upserted
+                embed_stage.add(len(batch), time.perf_counter() - t0)
+                pos = 0
+                for point, pieces in batch:
+                    if "vector" not in point:
+                        point["vector"] = vecs[pos]
+                        pos += 1
+                        report.embedded += 1
+                    if pieces:
+                        point["payload"]["sent_vecs"] = encode_vectors(vecs[pos:pos + len(pieces)])
+                        pos += len(pieces)
+                    ready.append(point)
+                flush_upserts()
+
+        def commit() -> None:
+            """Drain the pipeline, then delete replaced points and save BM25 + manifest: a resume starts here."""
+            nonlocal last_checkpoint
+            flush_embeds(force=True)
+            flush_upserts(force=True)
+            upserter.drain()
+            # delete only after the replacements are in, so readers never see a gap
+            for i in range(0, len(stale_ids), batch_size):
+                delete_points(collection_name=collection, ids=stale_ids[i:i + batch_size])
+            report.deleted += len(stale_ids)
+            lex_remove.extend(stale_ids)
+            stale_ids.clear()
+            if lex is not None and not lex_rebuild and (lex_rows or lex_remove):  # a rebuild is only saved whole
+                lex.update(add=lex_rows, remove=lex_remove)
+                lex.save()
+                lex_rows.clear()
+                lex_remove.clear()
+            manifest.save()
+            last_checkpoint = time.perf_counter()
+
+        def checkpoint() -> None:
+            report.checkpoints += 1
+            commit()
+            emit(force=True)
+
+        def due() -> bool:
+            return checkpoint_s > 0 and time.perf_counter() - last_checkpoint >= checkpoint_s
+
+        def touched(doc_id: str, st: os.stat_result, records: Iterable[dict]) -> None:
+            """Content unchanged: refresh size/mtime (and feed a BM25 rebuild)."""
+            entry = manifest.files[doc_id]
+            entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+            if lex_rebuild:
+                lex_rows.extend((c["id"], doc_id, i, r["text"]) for i, (c, r) in enumerate(zip(entry["chunks"], records)))
+
+        def changed(doc_id: str, st: os.stat_result, records: Iterable[dict], digest: Callable[[], str],
+                    reader: Optional[_Reader] = None) -> None:
+            """Write one changed file's chunks, a window at a time, so a huge file never sits in memory whole."""
+            report.changed += 1
+            entry = manifest.files.get(doc_id)
+            old = {c["id"]: c["hash"] for c in (entry["chunks"] if entry else [])}
+            old_by_hash = {h: pid for pid, h in old.items()}
+            kept: List[dict] = []
+            for window in _windows(enumerate(records), embed_batch_size):
+                ids = [point_id(doc_id, i, r["hash"]) for i, r in window]
+                kept.extend({"id": pid, "hash": r["hash"]} for pid, (_, r) in zip(ids, window))
+                fresh = [(pid, i, r) for pid, (i, r) in zip(ids, window) if pid not in old]
+                if lex is not None:
+                    lex_rows.extend((pid, doc_id, i, r["text"]) for pid, (i, r) in zip(ids, window)
+                                    if lex_rebuild or pid not in old)
+
+                # chunks that only moved (same text, new position) keep their stored vector
+                stored = fetch_vectors(collection, [old_by_hash[r["hash"]] for _, _, r in fresh if r["hash"] in old_by_hash])
+                for pid, i, r in fresh:
+                    sent = r["sentences"] if sentence_vectors else None
+                    point = {"id": pid, "payload": {"doc_id": doc_id, "chunk_id": i, "text": r["text"],
+                                                    "n_tokens": r["n_tokens"], "tokenizer": r["tokenizer"],
+                                                    **r["location"], **(sent or {})}}
+                    pieces = sentence_texts(r["text"], sent["sent_ends"]) if sent else []
+                    vec = stored.get(old_by_hash.get(r["hash"], ""))
+                    if vec is not None:
+                        point["vector"] = vec
+                        report.reused += 1
+                        if not pieces:
+                            ready.append(point)
+                            continue
+                    to_embed.append((point, pieces))
+                flush_embeds()
+                flush_upserts()
+                if reader is not None:
+                    state["bytes_done"] = bytes_before + reader.bytes
+                if due():
+                    # the file so far: its committed chunks (skipped on resume) plus the previous
+                    # version's, which stay referenced until the file completes and they go stale
+                    done = {c["id"] for c in kept}
+                    manifest.files[doc_id] = {"size": -1, "mtime_ns": -1, "sha256": "", "partial": True,
+                                              "chunks": kept + [{"id": pid, "hash": h} for pid, h in old.items()
+                                                                if pid not in done]}
+                    checkpoint()
+                else:
+                    emit()
+
+            new_ids = {c["id"] for c in kept}
+            stale_ids.extend(pid for pid in old if pid not in new_ids)
+            manifest.files[doc_id] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest(), "chunks": kept}
+
+        # 3) read stage. Files under stream_file_mb go to the process pool, but only while
+        # fewer than read_ahead_mb of them wait to be embedded; larger files are streamed
+        # through the chunker in this process. Together with the bounded embed batch and
+        # upsert window, that caps memory no matter how big a file or the corpus is.
+        stream_bytes = max(1, int(stream_file_mb * 2**20))
+        ahead_bytes = max(1, int(read_ahead_mb * 2**20))
+        queue = deque(todo)
+        pending: Deque[Tuple[Path, str, os.stat_result, Optional[Future]]] = deque()
+        ahead = 0  # bytes of files submitted to the pool and not consumed yet
+        bytes_before = 0  # bytes_done before the file being streamed
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(todo) > 1 else None
+
+        def known_sha(doc_id: str) -> str:
+            return (manifest.files.get(doc_id) or {}).get("sha256", "")
+
+        def refill() -> None:
+            nonlocal ahead
+            while queue and (not pending or ahead < ahead_bytes):
+                f, doc_id, st = queue.popleft()
+                fut = None
+                if pool and st.st_size < stream_bytes:
+                    fut = pool.submit(_prepare, str(f), doc_id, "" if lex_rebuild else known_sha(doc_id))
+                    ahead += st.st_size
+                pending.append((f, doc_id, st, fut))
+
+        emit("ingesting")
+        try:
+            refill()
+            while pending:
+                f, doc_id, st, fut = pending.popleft()
+                bytes_before = state["bytes_done"]
+                if fut is not None or st.st_size < stream_bytes:
+                    if fut is not None:
+                        prepared = fut.result()
+                        ahead -= st.st_size
+                        refill()
+                    else:
+                        prepared = _prepare(str(f), doc_id, "" if lex_rebuild else known_sha(doc_id))
+                    read_stage.add(len(prepared["chunks"]), prepared["busy_s"])
+                    if known_sha(doc_id) == prepared["sha256"]:  # touched, not changed
+                        touched(doc_id, st, prepared["chunks"])
+                    else:
+                        changed(doc_id, st, prepared["chunks"], lambda: prepared["sha256"])
+                else:
+                    sha, same = known_sha(doc_id), False
+                    if sha:  # hash first (one cheap pass) so an unchanged file isn't chunked
+                        t0 = time.perf_counter()
+                        same = _file_hash(f) == sha
+                        read_stage.add(0, time.perf_counter() - t0)
+                    reader = _Reader(f)
+                    if same:
+                        touched(doc_id, st, reader if lex_rebuild else ())
+                    else:
+                        changed(doc_id, st, reader, lambda: reader.sha256, reader)
+                    read_stage.add(reader.chunks, reader.busy_s)
+                state["files_done"] += 1
+                state["bytes_done"] = bytes_before + st.st_size
+                if due():
+                    checkpoint()
+                else:
+                    emit()
+                refill()
+
+            # drain the pipeline, then wait for Qdrant to apply every queued batch
+            emit("finishing")
+            flush_embeds(force=True)
+            flush_upserts(force=True)
+        finally:
+            if pool:
+                pool.shutdown(cancel_futures=True)
+            upserter.close()
+
+        # files that disappeared from kb_dir (only those this run's exts would have picked up)
+        removed = [d for d in manifest.files if d not in seen and Path(d).suffix.lower() in exts] if prune else []
+        for doc_id in removed:
+            stale_ids.extend(manifest.point_ids(doc_id))
+            del manifest.files[doc_id]
+        report.removed = len(removed)
+        # points a reset forgot, except those this run (or the one it resumes) wrote again
+        if manifest.orphans:
+            live = {c["id"] for entry in manifest.files.values() for c in entry["chunks"]}
+            stale_ids.extend(pid for pid in manifest.orphans if pid not in live)
+            manifest.orphans = []
+
+        lex_rebuild = False  # everything is in lex_rows now: apply it like any other update
+        commit()
+        if lex is not None and not lex.exists:
+            lex.save()
+
+    cache = embedding_cache()
+    if cache is not None and (cache.memory_hits or cache.disk_hits or cache.misses):
+        report.cache = {"hits": cache.memory_hits + cache.disk_hits, "disk_hits": cache.disk_hits,
+                        "misses": cache.misses, "hit_rate": cache.hit_rate()}
+    report.lexical_rows = len(lex) if lex is not None else None
+    report.wall_s = time.perf_counter() - t_start
+    own, children = peak_rss_mb()
+    report.peak_rss_mb, report.workers_rss_mb = own, (children if pool else None)
+    emit("done")
+    return report
@@ -0,0 +1,262 @@
+# api/rag/jobs.py
+"""
+Background ingestion jobs behind POST /ingest/jobs.
+
+A job is one JSON file, DATA_DIR/ingest_jobs/<id>.json:
+
+    {"id", "status": "queued" | "running" | "done" | "failed", "source", "params",
+     "progress", "result", "error", "attempts", "checkpointed", "created", "started", "finished"}
+
+`params` are api.rag.ingest.ingest() arguments. The API process writes the request and
+reads the file back; the ingest itself runs in a worker process (spawned fresh per job,
+niced by INGEST_JOB_NICE) that writes its progress there, so chunking and embedding never
+share the event loop, the GIL or torch's threads with /ask. Jobs still queued or running
+when the API stopped are resubmitted on the next start (by whichever worker claims them
+first) and resume from the last ingest checkpoint; a failed job can be resubmitted the
+same way. Uploaded files are kept under ingest_jobs/uploads/<id>/: they are the source
+the manifest and the chunks' byte offsets refer to.
+"""
+from __future__ import annotations
+import fcntl
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Optional, Sequence
+
+from api.settings import settings
+
+log = logging.getLogger("rag.jobs")
+
+ACTIVE = ("queued", "running")
+
+
+def jobs_root() -> Path:
+    return Path(settings.DATA_DIR) / "ingest_jobs"
+
+
+class JobStore:
+    """Job records as JSON files (written atomically), plus each job's uploaded files."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def path(self, job_id: str) -> Path:
+        return self.root / f"{job_id}.json"
+
+    def upload_dir(self, job_id: str) -> Path:
+        return self.root / "uploads" / job_id
+
+    @staticmethod
+    def new_id() -> str:
+        return f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"  # sorts by creation time
+
+    def create(self, source: dict, params: dict, job_id: str = "") -> dict:
+        job_id = job_id or self.new_id()
+        job = {"id": job_id, "status": "queued", "source": source, "params": params, "progress": {},
+               "result": None, "error": None, "attempts": 0, "checkpointed": False,
+               "created": time.time(), "started": None, "finished": None}
+        self._write(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        if not job_id or "/" in job_id or job_id.startswith("."):
+            return None
+        try:
+            return json.loads(self.path(job_id).read_text(encoding="utf-8"))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def update(self, job_id: str, **fields) -> dict:
+        with self._lock:
+            job = self.get(job_id) or {"id": job_id}
+            job.update(fields)
+            self._write(job)
+            return job
+
+    def list(self, limit: int = 50) -> List[dict]:
+        names = sorted((p.stem for p in self.root.glob("*.json")), reverse=True)[:max(0, limit)]
+        return [job for job in (self.get(n) for n in names) if job is not None]
+
+    def _write(self, job: dict) -> None:
+        tmp = self.root / f".{job['id']}.{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp.write_text(json.dumps(job), encoding="utf-8")
+        os.replace(tmp, self.path(job["id"]))
+
+    def save_uploads(self, job_id: str, files: Sequence[dict], exts: Sequence[str]) -> Path:
+        """Write [{"name", "content"}] under the job's upload dir; names are relative paths and become doc_ids."""
+        root = self.upload_dir(job_id)
+        written = []
+        for f in files:
+            name = PurePosixPath(str(f.get("name", "")).replace("\\", "/"))
+            if not name.parts or name.is_absolute() or any(p in ("", ".", "..") for p in name.parts):
+                raise ValueError(f"invalid file name: {f.get('name')!r}")
+            if name.suffix.lower() not in exts:
+                raise ValueError(f"{name}: extension not in {', '.join(exts)}")
+            written.append((root / Path(*name.parts), str(f.get("content", ""))))
+        for target, content in written:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_text(content, encoding="utf-8", newline="")
+        return root
+
+
+# --- worker process -------------------------------------------------------------
+def run_job(root: str, job_id: str, nice: int = 0, torch_threads: int = 0) -> str:
+    """Worker-process entry point: run one job's ingest, recording progress and the outcome. Returns the status."""
+    if nice:
+        os.nice(nice)
+    from api.rag.embed import set_torch_threads
+    from api.rag.ingest import ingest
+    set_torch_threads(torch_threads)
+
+    store = JobStore(Path(root))
+    claim = (store.root / f".{job_id}.lock").open("w")  # held until this process exits
+    try:
+        fcntl.flock(claim, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:  # another API worker resumed it first
+        return "running"
+    job = store.get(job_id)
+    if job is None or job["status"] not in ACTIVE:
+        return job["status"] if job else "missing"
+    params = dict(job["params"])
+    if job.get("checkpointed"):
+        params["full"] = False  # a full rebuild already under way: keep what it committed
+    store.update(job_id, status="running", attempts=job.get("attempts", 0) + 1, started=time.time(), error=None)
+    checkpoints = 0
+
+    def progress(p: dict) -> None:
+        nonlocal checkpoints
+        fields = {"progress": p}
+        if p["checkpoints"] > checkpoints:
+            checkpoints = p["checkpoints"]
+            fields["checkpointed"] = True
+        store.update(job_id, **fields)
+
+    kb_dir = Path(params.pop("kb_dir"))
+    try:
+        report = ingest(kb_dir, progress=progress, **params)
+    except Exception as e:
+        log.exception("Ingest job %s failed", job_id)
+        store.update(job_id, status="failed", error=f"{type(e).__name__}: {e}", finished=time.time())
+        return "failed"
+    store.update(job_id, status="done", result=report.summary(), finished=time.time())
+    return "done"
+
+
+class JobRunner:
+    """
+    Runs queued jobs on `workers` dispatcher threads, each starting one spawned process
+    per job (so the embedder it loads is released afterwards) and waiting for it. Jobs
+    on the same collection still run one at a time: ingest() holds a per-collection lock.
+    """
+
+    def __init__(self, store: JobStore, workers: int = 1, nice: int = 10, torch_threads: int = 0):
+        self.store = store
+        self.workers = max(1, workers)
+        self.nice = nice
+        self.torch_threads = torch_threads
+        self._ctx = multiprocessing.get_context("spawn")
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._queued: set = set()
+        self._running: Dict[str, multiprocessing.process.BaseProcess] = {}
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def submit(self, job_id: str) -> None:
+        with self._lock:
+            if job_id in self._queued or job_id in self._running:
+                return
+            self._queued.add(job_id)
+            if len(self._threads) < self.workers:
+                t = threading.Thread(target=self._dispatch, name=f"ingest-jobs-{len(self._threads)}", daemon=True)
+                self._threads.append(t)
+                t.start()
+        self._queue.put(job_id)
+
+    def _dispatch(self) -> None:
+        while True:
+            job_id = self._queue.get()
+            with self._lock:
+                self._queued.discard(job_id)
+                if self._stopping:
+                    return
+            try:
+                self._run(job_id)
+            except Exception as e:  # one bad job must not take the dispatcher (and every later job) down
+                log.exception("Ingest job %s: dispatch failed", job_id)
+                self._fail(job_id, f"{type(e).__name__}: {e}")
+
+    def _run(self, job_id: str) -> None:
+        with self._lock:
+            if self._stopping:
+                return
+            # not a daemon: the job may start its own read-worker pool
+            proc = self._ctx.Process(target=run_job, name=f"ingest-{job_id}",
+                                     args=(str(self.store.root), job_id, self.nice, self.torch_threads))
+            try:
+                proc.start()
+            except Exception as e:  # spawn error, EAGAIN, out of fds
+                log.warning("Ingest job %s: could not start its worker: %s", job_id, e)
+                self._fail(job_id, f"could not start worker: {type(e).__name__}: {e}")
+                return
+            self._running[job_id] = proc
+        try:
+            proc.join()
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+                stopping = self._stopping
+        job = self.store.get(job_id)
+        if proc.exitcode and not stopping and job is not None and job["status"] in ACTIVE:
+            # the worker died (OOM kill, segfault): the job stays resumable from its checkpoint
+            log.warning("Ingest job %s: worker exited with code %s", job_id, proc.exitcode)
+            self._fail(job_id, f"worker exited with code {proc.exitcode}")
+
+    def _fail(self, job_id: str, error: str) -> None:
+        try:
+            self.store.update(job_id, status="failed", error=error, finished=time.time())
+        except Exception:  # e.g. disk full: keep the dispatcher alive regardless
+            log.exception("Ingest job %s: could not record the failure", job_id)
+
+    def resume(self, job_id: str) -> Optional[dict]:
+        """Queue a failed (or interrupted) job again; it continues from its last checkpoint."""
+        job = self.store.get(job_id)
+        if job is None:
+            return None
+        if job["status"] == "failed" or (job["status"] in ACTIVE and not self.active(job_id)):
+            job = self.store.update(job_id, status="queued", error=None, finished=None)
+            self.submit(job_id)
+        return job
+
+    def resume_pending(self) -> List[str]:
+        """Resubmit jobs left queued/running by a previous API process."""
+        ids = [job["id"] for job in reversed(self.store.list(limit=1000)) if job["status"] in ACTIVE]
+        for job_id in ids:
+            self.submit(job_id)
+        return ids
+
+    def active(self, job_id: str) -> bool:
+        with self._lock:
+            return job_id in self._queued or job_id in self._running
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "queued": len(self._queued), "running": sorted(self._running)}
+
+    def shutdown(self) -> None:
+        """Stop taking jobs and terminate running ones; they stay "running" and resume at the next start."""
+        with self._lock:
+            self._stopping = True
+            procs = list(self._running.values())
+        for proc in procs:
+            proc.terminate()
+        for _ in self._threads:
+            self._queue.put("")  # wake idle dispatchers so they exit
@@ -0,0 +1,261 @@
+# api/rag/lexical.py
+from __future__ import annotations
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from api.rag.local_index import Hit
+from api.rag.utils import contained
+from api.settings import settings
+
+_TOKEN = re.compile(r"[^\W_]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it its me my of on or our so that the their "
+    "there this to us was we what when where which who why will with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cased alphanumeric runs minus stop words ("SKU-42 Power BI" → sku, 42, power, bi)."""
+    return [t for t in _TOKEN.findall(text.casefold()) if t not in STOPWORDS]
+
+
+def _idf(n: int, df: int) -> float:
+    return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+
+def index_path(collection_name: str) -> Path:
+    return contained(Path(settings.DATA_DIR) / "lexical", collection_name)
+
+
+def drop_index(collection_name: str) -> None:
+    shutil.rmtree(index_path(collection_name), ignore_errors=True)
+
+
+class BM25Index:
+    """
+    Array-backed inverted index over chunk texts, scored with BM25.
+
+    Postings are stored CSR-style: the postings of term t are docs[offsets[t]:offsets[t+1]]
+    (row numbers, ascending) with their term frequencies in tfs. Rows map to point ids,
+    so hits line up with the vector store's. On disk (one directory per collection):
+      CURRENT                   -> name of the live generation
+      gen-<stamp>/postings.npz  -> offsets, docs, tfs, doc_len
+      gen-<stamp>/rows.json     -> terms, and per row its point id, doc_id and chunk_id
+    Writers build a new generation and flip CURRENT, like LocalIndex.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    KEEP_GENERATIONS = 2
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.generation = ""
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._set([], np.zeros(1, np.int64), np.zeros(0, np.int32), np.zeros(0, np.uint16), [], [],
+                  np.zeros(0, np.int32))
+
+    # --- loading -------------------------------------------------------------
+    @property
+    def exists(self) -> bool:
+        return (self.root / "CURRENT").exists()
+
+    def current_generation(self) -> str:
+        try:
+            return (self.root / "CURRENT").read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            return ""
+
+    def load(self) -> "BM25Index":
+        with self._lock:
+            gen = self.current_generation()
+            if not gen:
+                self.reset()
+                self.generation, self._dirty = "", False
+                return self
+            gdir = self.root / gen
+            arrays = np.load(gdir / "postings.npz")
+            rows = json.loads((gdir / "rows.json").read_text(encoding="utf-8"))
+            self._set(rows["terms"], arrays["offsets"], arrays["docs"], arrays["tfs"], rows["ids"],
+                      [tuple(k) for k in rows["keys"]], arrays["doc_len"])
+            self.generation, self._dirty = gen, False
+            return self
+
+    def refresh(self) -> None:
+        """Pick up a generation written by ingest (one small file read)."""
+        if self.current_generation() != self.generation and not self._dirty:
+            self.load()
+
+    def _set(self, terms: List[str], offsets: np.ndarray, docs: np.ndarray, tfs: np.ndarray,
+             ids: List[str], keys: List[Tuple[str, int]], doc_len: np.ndarray) -> None:
+        self._terms = terms
+        self._term_ids: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+        self._offsets, self._docs, self._tfs, self._doc_len = offsets, docs, tfs, doc_len
+        self._ids, self._keys = ids, keys
+        avg = float(doc_len.mean()) if len(doc_len) else 1.0
+        # per-row BM25 length normalization, so a query only multiplies and divides
+        self._norm = (self.K1 * (1 - self.B + self.B * doc_len / max(avg, 1e-9))).astype(np.float32)
+        self._doc_index: Dict[str, int] = {}
+        self._doc_codes = np.fromiter((self._doc_index.setdefault(k[0], len(self._doc_index)) for k in keys),
+                                      dtype=np.int32, count=len(keys))
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # --- writes (ingest) -----------------------------------------------------
+    def reset(self) -> None:
+        with self._lock:
+            self._set([], np.zeros(1, np.int64), np.zeros(0, np.int32), np.zeros(0, np.uint16), [], [],
+                      np.zeros(0, np.int32))
+            self._dirty = True
+
+    def update(self, add: Sequence[Tuple[str, str, int, str]] = (), remove: Iterable[str] = ()) -> None:
+        """
+        Apply one ingest run: drop `remove` point ids, then add (point_id, doc_id, chunk_id, text)
+        rows (re-adding an existing id replaces it). Rebuilds the CSR arrays in one sort.
+        """
+        with self._lock:
+            gone = {str(pid) for pid in remove} | {str(a[0]) for a in add}
+            keep = np.fromiter((pid not in gone for pid in self._ids), dtype=bool, count=len(self._ids))
+            row_map = np.cumsum(keep) - 1
+
+            # existing postings as (term, row, tf), minus dropped rows
+            term_of = np.repeat(np.arange(len(self._terms), dtype=np.int32), np.diff(self._offsets))
+            alive = keep[self._docs]
+            t_parts = [term_of[alive]]
+            d_parts = [row_map[self._docs[alive]].astype(np.int32)]
+            f_parts = [self._tfs[alive]]
+
+            terms = list(self._terms)
+            term_ids = dict(self._term_ids)
+            ids = [pid for pid, k in zip(self._ids, keep) if k]
+            keys = [key for key, k in zip(self._keys, keep) if k]
+            lens = [self._doc_len[keep]]
+            new_t: List[int] = []
+            new_d: List[int] = []
+            new_f: List[int] = []
+            new_lens: List[int] = []
+            for pid, doc_id, chunk_id, text in add:
+                row = len(ids)
+                counts = Counter(tokenize(text))
+                for term, tf in counts.items():
+                    tid = term_ids.get(term)
+                    if tid is None:
+                        tid = term_ids[term] = len(terms)
+                        terms.append(term)
+                    new_t.append(tid)
+                    new_d.append(row)
+                    new_f.append(min(tf, 65535))
+                ids.append(str(pid))
+                keys.append((doc_id, int(chunk_id)))
+                new_lens.append(sum(counts.values()))
+            t_parts.append(np.asarray(new_t, np.int32))
+            d_parts.append(np.asarray(new_d, np.int32))
+            f_parts.append(np.asarray(new_f, np.uint16))
+            lens.append(np.asarray(new_lens, np.int32))
+
+            t, d, f = np.concatenate(t_parts), np.concatenate(d_parts), np.concatenate(f_parts)
+            order = np.lexsort((d, t))
+            t, d, f = t[order], d[order], f[order]
+            # terms that lost all their postings drop out; the survivors are renumbered in order
+            df = np.bincount(t, minlength=len(terms))
+            used = np.flatnonzero(df)
+            offsets = np.zeros(len(used) + 1, np.int64)
+            np.cumsum(df[used], out=offsets[1:])
+            self._set([terms[i] for i in used], offsets, d, f, ids, keys, np.concatenate(lens).astype(np.int32))
+            self._dirty = True
+
+    def save(self) -> None:
+        """Write a new generation and flip CURRENT atomically."""
+        with self._lock:
+            if not self._dirty and self.exists:
+                return
+            gen = f"gen-{time.time_ns()}"
+            gdir = self.root / gen
+            gdir.mkdir(parents=True, exist_ok=True)
+            np.savez(gdir / "postings.npz", offsets=self._offsets, docs=self._docs, tfs=self._tfs,
+                     doc_len=self._doc_len)
+            (gdir / "rows.json").write_text(
+                json.dumps({"terms": self._terms, "ids": self._ids, "keys": self._keys}, ensure_ascii=False),
+                encoding="utf-8",
+            )
+            tmp = self.root / "CURRENT.tmp"
+            tmp.write_text(gen, encoding="utf-8")
+            os.replace(tmp, self.root / "CURRENT")
+            self.generation, self._dirty = gen, False
+            for old in sorted(p for p in self.root.glob("gen-*") if p.is_dir())[:-self.KEEP_GENERATIONS]:
+                shutil.rmtree(old, ignore_errors=True)
+
+    # --- reads ---------------------------------------------------------------
+    def search(self, query: str, limit: int, doc_ids: Optional[Sequence[str]] = None) -> List[Hit]:
+        """
+        Top-`limit` rows by BM25; payload carries doc_id/chunk_id (the API's phase-1 fields) and
+        `lexical_match`: the score over the most any row could get for this query, counting query
+        terms no row contains (so sharing one common word with a long query stays near 0).
+        """
+        with self._lock:
+            offsets, docs, tfs, norm = self._offsets, self._docs, self._tfs, self._norm
+            term_ids, ids, keys, codes, doc_index = self._term_ids, self._ids, self._keys, self._doc_codes, self._doc_index
+        n = len(ids)
+        terms = list(dict.fromkeys(tokenize(query)))
+        tids = [term_ids[t] for t in terms if t in term_ids]
+        if not n or not tids or limit <= 0:
+            return []
+        idfs = [_idf(n, int(offsets[tid + 1] - offsets[tid])) for tid in tids]
+        best = (self.K1 + 1) * (sum(idfs) + _idf(n, 0) * (len(terms) - len(tids)))  # each term at tf → ∞
+
+        rows, weights = [], []
+        for tid, idf in zip(tids, idfs):
+            lo, hi = offsets[tid], offsets[tid + 1]
+            d, tf = docs[lo:hi], tfs[lo:hi].astype(np.float32)
+            rows.append(d)
+            weights.append(idf * tf * (self.K1 + 1) / (tf + norm[d]))
+        cand, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(weights))
+        if doc_ids:
+            wanted = [doc_index[x] for x in doc_ids if x in doc_index]
+            mask = np.isin(codes[cand], wanted)
+            cand, scores = cand[mask], scores[mask]
+        k = min(int(limit), len(cand))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(cand) else np.arange(len(cand))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [Hit(id=ids[cand[i]], score=float(scores[i]),
+                    payload={"doc_id": keys[cand[i]][0], "chunk_id": keys[cand[i]][1],
+                             "lexical_match": round(float(scores[i]) / best, 4)}) for i in top]
+
+    def stats(self) -> dict:
+        with self._lock:
+            nbytes = self._offsets.nbytes + self._docs.nbytes + self._tfs.nbytes + self._doc_len.nbytes
+            return {"rows": len(self._ids), "terms": len(self._terms), "postings": int(len(self._docs)),
+                    "array_bytes": int(nbytes), "generation": self.generation}
+
+
+def rrf_fuse(dense: list, lexical: list, k: int = 60) -> List[Hit]:
+    """
+    Reciprocal rank fusion: score = Σ 1/(k + rank) over the lists a chunk appears in.
+    Returned hits carry the fused score plus `dense_score` / `lexical_score` in the payload
+    (absent for the list that missed the chunk).
+    """
+    fused: Dict[str, Hit] = {}
+    for name, hits in (("dense_score", dense), ("lexical_score", lexical)):
+        for rank, h in enumerate(sorted(hits, key=lambda h: float(h.score), reverse=True), start=1):
+            pid = str(h.id)
+            hit = fused.get(pid)
+            if hit is None:
+                hit = fused[pid] = Hit(id=pid, score=0.0, payload=dict(h.payload))
+            hit.score += 1.0 / (k + rank)
+            hit.payload[name] = round(float(h.score), 4)
+    return sorted(fused.values(), key=lambda h: h.score, reverse=True)
@@ -0,0 +1,107 @@
+# api/rag/llm.py
+from __future__ import annotations
+import json
+from typing import AsyncIterator, Sequence
+
+import httpx
+
+
+class OllamaClient:
+    """
+    Minimal async client for Ollama's HTTP API.
+    One pooled httpx.AsyncClient is reused for every call, so connections stay alive
+    between requests instead of paying a TCP handshake per question.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        temperature: float = 0.2,
+        num_ctx: int = 4096,
+        timeout: float = 120.0,
+        max_connections: int = 16,
+        keep_alive: str | None = None,
+        num_predict: int | None = None,
+    ):
+        self.model = model
+        self.options = {"temperature": temperature, "num_ctx": num_ctx}
+        if num_predict is not None:
+            self.options["num_predict"] = num_predict
+        self.keep_alive = keep_alive
+        self._http = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout, connect=5.0),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=60.0,
+            ),
+        )
+
+    def _body(self, prompt: str, stream: bool, context: Sequence[int] | None = None) -> dict:
+        body = {"model": self.model, "prompt": prompt, "stream": stream, "options": self.options}
+        if self.keep_alive is not None:
+            body["keep_alive"] = self.keep_alive
+        if context:
+            body["context"] = [int(t) for t in context]  # continue a conversation from its token ids
+        return body
+
+    async def load(self, keep_alive: str | None = None) -> None:
+        """Load the model into memory without generating (an empty prompt only loads it)."""
+        body = {"model": self.model, "keep_alive": keep_alive or self.keep_alive or "5m"}
+        r = await self._http.post("/api/generate", json=body)
+        r.raise_for_status()
+        data = r.json()
+        if data.get("error"):
+            raise RuntimeError(data["error"])
+
+    async def generate(self, prompt: str, context: Sequence[int] | None = None) -> dict:
+        """
+        Non-streaming generation. Returns Ollama's final JSON (response + eval stats, e.g. prompt_eval_count,
+        and `context`: the conversation's token ids, to pass back on the next turn).
+        """
+        r = await self._http.post("/api/generate", json=self._body(prompt, stream=False, context=context))
+        r.raise_for_status()
+        data = r.json()
+        if data.get("error"):
+            raise RuntimeError(data["error"])
+        return data
+
+    async def stream(self, prompt: str, context: Sequence[int] | None = None) -> AsyncIterator[dict]:
+        """Yield Ollama's NDJSON chunks as they arrive; the last one has done=True, the eval stats and `context`."""
+        async with self._http.stream("POST", "/api/generate", json=self._body(prompt, stream=True, context=context)) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("error"):
+                    raise RuntimeError(chunk["error"])
+                yield chunk
+                if chunk.get("done"):
+                    return
+
+    async def tags(self) -> dict:
+        """List local models (cheap liveness check, no generation)."""
+        r = await self._http.get("/api/tags", timeout=3.0)
+        r.raise_for_status()
+        return r.json()
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+def eval_stats(final: dict) -> dict:
+    """Ollama's counters from a final chunk: prompt evaluation vs generation (durations in ms)."""
+    def ms(key: str) -> float:
+        return round((final.get(key) or 0) / 1e6, 2)
+
+    return {
+        "prompt_eval_count": final.get("prompt_eval_count", 0),  # 0/absent: the prompt came from the KV cache
+        "prompt_eval_ms": ms("prompt_eval_duration"),
+        "eval_count": final.get("eval_count", 0),
+        "eval_ms": ms("eval_duration"),
+        "load_ms": ms("load_duration"),
+        "total_ms": ms("total_duration"),
+    }
@@ -0,0 +1,220 @@
+# api/rag/local_index.py
+from __future__ import annotations
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+
+@dataclass
+class Hit:
+    """Same shape the API reads from Qdrant's ScoredPoint."""
+    id: str
+    score: float
+    payload: dict = field(default_factory=dict)
+
+
+class LocalIndex:
+    """
+    Exact in-process vector index for small KBs.
+
+    On disk (one directory per collection):
+      CURRENT                 -> name of the live generation
+      gen-<stamp>/vectors.npy -> normalized float32 matrix, opened as a memmap
+      gen-<stamp>/points.jsonl-> one {"id", "payload"} per row, same order
+    Writers build a new generation and flip CURRENT, so readers never see a half-written index.
+    In memory, upserts append to an over-allocated copy of the matrix (capacity doubles when
+    full), so a bulk load of N points costs O(N) copying, not O(N²).
+    Search is one matrix-vector product plus argpartition; doc_id filters are a mask over an int code array.
+    """
+
+    KEEP_GENERATIONS = 2
+
+    def __init__(self, root: Path, dim: int):
+        self.root = Path(root)
+        self.dim = dim
+        self.generation = ""
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._set_rows(np.zeros((0, dim), dtype=np.float32), [], [])
+
+    # --- loading -------------------------------------------------------------
+    @property
+    def exists(self) -> bool:
+        return (self.root / "CURRENT").exists()
+
+    def current_generation(self) -> str:
+        try:
+            return (self.root / "CURRENT").read_text(encoding="utf-8").strip()
+        except FileNotFoundError:
+            return ""
+
+    def load(self) -> "LocalIndex":
+        """(Re)load the live generation; vectors stay memory-mapped until the first write."""
+        with self._lock:
+            gen = self.current_generation()
+            if not gen:
+                self._set_rows(np.zeros((0, self.dim), dtype=np.float32), [], [])
+                self.generation = ""
+                return self
+            gdir = self.root / gen
+            vecs = np.load(gdir / "vectors.npy", mmap_mode="r")
+            ids, payloads = [], []
+            with open(gdir / "points.jsonl", encoding="utf-8") as fh:
+                for line in fh:
+                    rec = json.loads(line)
+                    ids.append(rec["id"])
+                    payloads.append(rec["payload"])
+            self._set_rows(vecs, ids, payloads)
+            self.generation = gen
+            self._dirty = False
+            return self
+
+    def refresh(self) -> None:
+        """Pick up a generation written by another process (cheap: one small file read)."""
+        if self.current_generation() != self.generation and not self._dirty:
+            self.load()
+
+    def _set_rows(self, vecs: np.ndarray, ids: List[str], payloads: List[dict]) -> None:
+        self._vecs = vecs  # may be the read-only memmap; upsert() moves it into _buf
+        self._ids = ids
+        self._payloads = payloads
+        self._pos: Dict[str, int] = {pid: i for i, pid in enumerate(ids)}
+        self._doc_index: Dict[str, int] = {}
+        self._doc_codes = np.fromiter(
+            (self._doc_index.setdefault(p.get("doc_id"), len(self._doc_index)) for p in payloads),
+            dtype=np.int32, count=len(payloads),
+        )
+        self._buf: Optional[np.ndarray] = None  # rows [:len(self)] are _vecs, the rest spare capacity
+        self._codes_buf: Optional[np.ndarray] = None
+
+    def _reserve(self, extra: int) -> None:
+        """Make room for `extra` appended rows, growing the owned buffers geometrically."""
+        n = len(self._ids)
+        if self._buf is not None and len(self._buf) >= n + extra:
+            return
+        cap = max(n + extra, 2 * (len(self._buf) if self._buf is not None else n), 64)
+        buf = np.empty((cap, self.dim), dtype=np.float32)
+        buf[:n] = self._vecs  # also detaches from the memmap
+        codes = np.empty(cap, dtype=np.int32)
+        codes[:n] = self._doc_codes
+        self._buf, self._codes_buf = buf, codes
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # --- writes (ingest) -----------------------------------------------------
+    def upsert(self, ids: Sequence[str], vectors: Sequence[Sequence[float]], payloads: Sequence[dict]) -> None:
+        """Add or replace points in place; only save() writes them out."""
+        with self._lock:
+            vecs = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+            self._reserve(len(vecs))
+            rows, codes = [], []
+            for pid, payload in zip(ids, payloads):
+                pid = str(pid)
+                row = self._pos.get(pid)
+                if row is None:
+                    row = self._pos[pid] = len(self._ids)
+                    self._ids.append(pid)
+                    self._payloads.append(payload)
+                else:
+                    self._payloads[row] = payload
+                rows.append(row)
+                codes.append(self._doc_index.setdefault(payload.get("doc_id"), len(self._doc_index)))
+            self._buf[rows] = vecs[:len(rows)]  # a repeated id keeps its last vector
+            self._codes_buf[rows] = codes
+            n = len(self._ids)
+            self._vecs, self._doc_codes = self._buf[:n], self._codes_buf[:n]
+            self._dirty = True
+
+    def delete(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            drop = {self._pos[str(pid)] for pid in ids if str(pid) in self._pos}
+            if not drop:
+                return
+            keep = np.array([i for i in range(len(self._ids)) if i not in drop], dtype=np.int64)
+            self._set_rows(
+                np.array(self._vecs[keep], dtype=np.float32).reshape(-1, self.dim),
+                [self._ids[i] for i in keep],
+                [self._payloads[i] for i in keep],
+            )
+            self._dirty = True
+
+    def save(self) -> None:
+        """Write a new generation and flip CURRENT atomically."""
+        with self._lock:
+            if not self._dirty and self.exists:
+                return
+            gen = f"gen-{time.time_ns()}"
+            gdir = self.root / gen
+            gdir.mkdir(parents=True, exist_ok=True)
+            np.save(gdir / "vectors.npy", np.ascontiguousarray(self._vecs, dtype=np.float32))
+            with open(gdir / "points.jsonl", "w", encoding="utf-8") as fh:
+                for pid, payload in zip(self._ids, self._payloads):
+                    fh.write(json.dumps({"id": pid, "payload": payload}, ensure_ascii=False) + "\n")
+            tmp = self.root / "CURRENT.tmp"
+            tmp.write_text(gen, encoding="utf-8")
+            os.replace(tmp, self.root / "CURRENT")
+            self.generation = gen
+            self._dirty = False
+            self._prune()
+
+    def _prune(self) -> None:
+        gens = sorted(p for p in self.root.glob("gen-*") if p.is_dir())
+        for old in gens[:-self.KEEP_GENERATIONS]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    # --- reads ---------------------------------------------------------------
+    def get_vectors(self, ids: Sequence[str]) -> Dict[str, List[float]]:
+        with self._lock:
+            return {str(pid): self._vecs[self._pos[str(pid)]].tolist() for pid in ids if str(pid) in self._pos}
+
+    def get_payloads(self, ids: Sequence[str], fields: Optional[Sequence[str]] = None) -> Dict[str, dict]:
+        with self._lock:
+            return {str(pid): _select(self._payloads[self._pos[str(pid)]], fields)
+                    for pid in ids if str(pid) in self._pos}
+
+    def search(self, query: Sequence[float], limit: int, doc_ids: Optional[Sequence[str]] = None,
+               fields: Optional[Sequence[str]] = None) -> List[Hit]:
+        """Exact top-`limit` by cosine; `fields` limits the returned payload keys (None = all)."""
+        return self.search_batch([query], limit, doc_ids=doc_ids, fields=fields)[0]
+
+    def search_batch(self, queries: Sequence[Sequence[float]], limit: int,
+                     doc_ids: Optional[Sequence[str]] = None,
+                     fields: Optional[Sequence[str]] = None) -> List[List[Hit]]:
+        """Top-`limit` for every query with one matrix product."""
+        with self._lock:
+            vecs, ids, payloads, codes = self._vecs, self._ids, self._payloads, self._doc_codes
+            doc_index, n = self._doc_index, len(vecs)  # ids/payloads may grow after the lock is released
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        if n == 0 or limit <= 0:
+            return [[] for _ in range(len(q))]
+
+        scores = q @ vecs.T  # (queries, points)
+        if doc_ids:
+            wanted = [doc_index[d] for d in doc_ids if d in doc_index]
+            if not wanted:
+                return [[] for _ in range(len(q))]
+            scores = np.where(np.isin(codes, wanted)[None, :], scores, -np.inf)
+
+        k = min(int(limit), n)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k] if k < n else np.tile(np.arange(n), (len(q), 1))
+        results = []
+        for row, cand in zip(scores, top):
+            cand = cand[np.argsort(-row[cand])]
+            results.append([Hit(id=ids[i], score=float(row[i]), payload=_select(payloads[i], fields))
+                            for i in cand if row[i] > -np.inf])
+        return results
+
+
+def _select(payload: dict, fields: Optional[Sequence[str]]) -> dict:
+    """Copy of the payload (or just `fields`), so callers can't mutate the store."""
+    if fields is None:
+        return dict(payload)
+    return {k: payload[k] for k in fields if k in payload}
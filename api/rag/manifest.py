@@ -0,0 +1,73 @@
+# api/rag/manifest.py
+from __future__ import annotations
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List
+
+from api.rag.utils import contained
+from api.settings import settings
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """
+    Per-collection record of what ingest already wrote:
+      files[doc_id] = {"size", "mtime_ns", "sha256", "chunks": [{"id", "hash"}, ...]}
+    A file an ingest checkpoint caught half-written has "partial": true, size -1 and no
+    sha256, and lists the chunks already committed (so the next run rescans it).
+    `emb_path` and `tokenizer` (TokenCounter.name) are what the chunks were embedded and
+    counted with; a change to either means a rebuild. `orphans` are the point ids a reset
+    forgot: still in the collection until an ingest run finishes and deletes them.
+    Stored as JSON under DATA_DIR/manifests/<collection>.json.
+    """
+
+    def __init__(self, collection: str, emb_path: str = "", files: Dict[str, dict] | None = None,
+                 tokenizer: str = "", orphans: List[str] | None = None):
+        self.collection = collection
+        self.emb_path = emb_path
+        self.tokenizer = tokenizer
+        self.orphans: List[str] = orphans or []
+        self.files: Dict[str, dict] = files or {}
+
+    @staticmethod
+    def path_for(collection: str) -> Path:
+        return contained(Path(settings.DATA_DIR) / "manifests", collection, ".json")
+
+    @classmethod
+    def load(cls, collection: str) -> "Manifest":
+        p = cls.path_for(collection)
+        if not p.exists():
+            return cls(collection)
+        data = json.loads(p.read_text(encoding="utf-8"))
+        return cls(collection, data.get("emb_path", ""), data.get("files", {}), data.get("tokenizer", ""),
+                   data.get("orphans", []))
+
+    def save(self) -> None:
+        p = self.path_for(self.collection)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"emb_path": self.emb_path, "tokenizer": self.tokenizer,
+                                  "orphans": self.orphans, "files": self.files}), encoding="utf-8")
+        tmp.replace(p)
+
+    def reset(self, emb_path: str, tokenizer: str, keep_orphans: bool = True) -> None:
+        """
+        Forget every file (new collection, --full, a different embedding model or tokenizer).
+        Their point ids move to `orphans` unless `keep_orphans` is off (the collection is new).
+        """
+        if keep_orphans:
+            known = set(self.orphans)
+            self.orphans += [pid for doc_id in self.files for pid in self.point_ids(doc_id) if pid not in known]
+        else:
+            self.orphans = []
+        self.emb_path = emb_path
+        self.tokenizer = tokenizer
+        self.files = {}
+
+    def point_ids(self, doc_id: str) -> List[str]:
+        entry = self.files.get(doc_id)
+        return [c["id"] for c in entry["chunks"]] if entry else []
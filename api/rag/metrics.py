@@ -0,0 +1,219 @@
+# api/rag/metrics.py
+"""
+Dependency-free Prometheus metrics (text exposition format 0.0.4).
+
+Updates are plain int/float arithmetic on the event loop thread, so keeping them on in
+production costs well under a microsecond per observation. Each uvicorn worker keeps
+its own numbers; scrape every worker (or run one) to see all of them.
+"""
+from __future__ import annotations
+import os
+import resource
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from api.rag.batcher import Histogram
+
+LabelValues = Tuple[str, ...]
+
+_SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _Value(_Metric):
+    """One number per label set, or a callback (`fn`) read at scrape time."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 fn: Callable[[], float] | None = None):
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._fn = fn
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        if self._fn is not None:
+            try:
+                return self.header() + [f"{self.name} {_num(self._fn())}"]
+            except Exception:  # a broken probe must not break the scrape
+                return []
+        return self.header() + [
+            f"{self.name}{_labels(self.label_names, k)} {_num(v)}" for k, v in sorted(self._values.items())
+        ]
+
+
+class Counter(_Value):
+    kind = "counter"
+
+
+class Gauge(_Value):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+
+class HistogramMetric(_Metric):
+    """Labelled family of fixed-bucket histograms (`source` exports an existing Histogram)."""
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = _SECONDS, source: Callable[[], Histogram | None] | None = None):
+        super().__init__(name, help, labels)
+        self.buckets = list(buckets)
+        self._children: Dict[LabelValues, Histogram] = {}
+        self._source = source
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        h = self._children.get(key)
+        if h is None:
+            h = self._children[key] = Histogram(self.buckets)
+        h.observe(value)
+
+    def _series(self) -> Iterable[Tuple[LabelValues, Histogram]]:
+        if self._source is None:
+            return sorted(self._children.items(), key=lambda kv: kv[0])
+        h = self._source()
+        return [((), h)] if h is not None else []
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, h in self._series():
+            running = 0
+            for bound, count in zip(h.bounds + [float("inf")], h.counts):
+                running += count
+                le = 'le="' + _num(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, key)} {_num(float(h.sum))}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, key)} {h.total}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render() -> str:
+    """Every registered metric in Prometheus text format."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# -----------------------------------------------------------------------------
+# Process gauges (read at scrape time, no background thread)
+# -----------------------------------------------------------------------------
+_PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def _rss_bytes() -> float:
+    try:
+        with open("/proc/self/statm", encoding="ascii") as fh:
+            return int(fh.read().split()[1]) * _PAGE
+    except OSError:  # not Linux: fall back to the peak
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _cpu_seconds() -> float:
+    ru = resource.getrusage(resource.RUSAGE_SELF)
+    return ru.ru_utime + ru.ru_stime
+
+
+def _open_fds() -> float:
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return float("nan")
+
+
+_START = time.time()
+
+Gauge("process_resident_memory_bytes", "Resident memory size in bytes.", fn=_rss_bytes)
+Counter("process_cpu_seconds_total", "User + system CPU time in seconds.", fn=_cpu_seconds)
+Gauge("process_open_fds", "Open file descriptors.", fn=_open_fds)
+Gauge("process_start_time_seconds", "Start time of the process since the epoch in seconds.", fn=lambda: _START)
+
+# -----------------------------------------------------------------------------
+# HTTP middleware: in-flight gauge + per-route latency (covers /ping/* too)
+# -----------------------------------------------------------------------------
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being served (incl. open streams).")
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route template and status.", ["path", "status"])
+HTTP_SECONDS = HistogramMetric("http_request_duration_seconds",
+                               "Request duration until the last body byte (streams included).", ["path"])
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware, so streaming responses count until their last chunk
+    (BaseHTTPMiddleware would stop the clock when the headers go out).
+    Paths are route templates, keeping label cardinality bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", "<unmatched>")
+            HTTP_SECONDS.observe(time.perf_counter() - t0, path=path)
+            HTTP_REQUESTS.inc(path=path, status=str(status))
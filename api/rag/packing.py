@@ -0,0 +1,108 @@
+# api/rag/packing.py
+from __future__ import annotations
+import re
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from api.rag.prompts import CONTEXT_SEPARATOR, build_prompt
+from api.rag.tokens import TokenCounter
+
+TEMPLATE_SLACK = 32  # Ollama wraps the prompt in the model's chat template; keep room for it
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+@dataclass
+class Packed:
+    prompt: str
+    hits: list
+    contexts: List[str]
+    info: dict = field(default_factory=dict)
+
+
+def sentences(text: str) -> List[str]:
+    """Split after . ! ? and at line breaks; "".join(result) == text."""
+    pieces, start = [], 0
+    for m in _SENTENCE_END.finditer(text):
+        if m.end() > start and m.start() > start:
+            pieces.append(text[start:m.end()])
+            start = m.end()
+    if start < len(text):
+        pieces.append(text[start:])
+    return pieces
+
+
+def _fit(text: str, limit: int, counter: TokenCounter) -> tuple[str, int]:
+    """Longest run of leading sentences within `limit` tokens ("" if not even the first fits)."""
+    pieces = sentences(text)
+    used = k = 0
+    for n in counter.count_batch(pieces):
+        if used + n > limit:
+            break
+        used += n
+        k += 1
+    return "".join(pieces[:k]).rstrip(), used
+
+
+def label(hit) -> str:
+    """Citation tag put in front of each context chunk, in the form SYSTEM asks the model to cite."""
+    return f"[{hit.payload.get('doc_id')}#{hit.payload.get('chunk_id')}] "
+
+
+def pack_prompt(hits: list, query: str, counter: TokenCounter, max_prompt_tokens: int,
+                texts: Optional[Sequence[Optional[Tuple[str, int]]]] = None,
+                build: Callable[[List[str], str], str] = build_prompt) -> Packed:
+    """
+    Fill the prompt with chunks in score order (hits arrive sorted high→low) until
+    `max_prompt_tokens` is reached; the first chunk that doesn't fit is cut at the last
+    sentence boundary that does, and everything after it is dropped.
+    Chunk sizes come from the `n_tokens` stored at ingest, so packing is a sum; only
+    chunks ingested without it or counted by another tokenizer than `counter`, and the
+    one being cut, are tokenized here.
+    `texts` optionally replaces hit i's text with (text, n_tokens), e.g. a compressed one
+    (its n_tokens is trusted under the same tokenizer check as the hit's);
+    `build` turns the packed contexts into the prompt.
+    """
+    fixed = counter.count(build([], query)) + TEMPLATE_SLACK
+    sep = counter.count(CONTEXT_SEPARATOR)
+    budget = max_prompt_tokens - fixed
+
+    packed, contexts = [], []
+    used, truncated = 0, False
+    for i, h in enumerate(hits):
+        override = texts[i] if texts is not None else None
+        if override is not None:
+            text, n = override
+        else:
+            text, n = h.payload.get("text") or "", h.payload.get("n_tokens")
+        if n is None or h.payload.get("tokenizer") != counter.name:  # stored counts are another tokenizer's
+            n = counter.count(text)
+        tag = label(h)
+        overhead = sep + counter.count(tag)
+        left = budget - used - overhead
+        if n > left:
+            text, n = _fit(text, left, counter)
+            truncated = bool(text)
+            if text:
+                packed.append(h)
+                contexts.append(tag + text)
+                used += n + overhead
+            break
+        packed.append(h)
+        contexts.append(tag + text)
+        used += n + overhead
+
+    return Packed(
+        prompt=build(contexts, query),
+        hits=packed,
+        contexts=contexts,
+        info={
+            "tokenizer": counter.name,
+            "budget_tokens": max_prompt_tokens,
+            "context_tokens": used,
+            "prompt_tokens_counted": fixed - TEMPLATE_SLACK + used,
+            "chunks_in": len(hits),
+            "chunks_packed": len(packed),
+            "truncated": truncated,
+        },
+    )
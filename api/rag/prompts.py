@@ -8,6 +8,15 @@ SYSTEM = (
     "Use multiple citations when a sentence uses multiple chunks. Keep answers concise."
 )
 
+CONTEXT_SEPARATOR = "\n\n- "  # what each extra context chunk adds besides its text (for token packing)
+
 def build_prompt(contexts: list[str], query: str) -> str:
     ctx = "\n\n".join(f"- {c}" for c in contexts)
     return f"{SYSTEM}\n\nContext:\n{ctx}\n\nQuestion: {query}\nAnswer (with citations):"
+
+def build_followup_prompt(contexts: list[str], query: str) -> str:
+    """Later /chat turn: SYSTEM and earlier context are already in the conversation, send only what's new."""
+    if not contexts:
+        return f"Question: {query}\nAnswer (with citations):"
+    ctx = "\n\n".join(f"- {c}" for c in contexts)
+    return f"Additional context:\n{ctx}\n\nQuestion: {query}\nAnswer (with citations):"
@@ -0,0 +1,142 @@
+# api/rag/scheduler.py
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Literal, Sequence, get_args
+
+Priority = Literal["interactive", "batch"]  # what the API accepts; anything else is a 422
+PRIORITIES = get_args(Priority)  # earlier = served first
+
+
+class Rejected(Exception):
+    """Load shed: the caller should answer `status` with a Retry-After of `retry_after_s`."""
+
+    def __init__(self, reason: str, status: int, retry_after_s: float, message: str):
+        super().__init__(message)
+        self.reason = reason
+        self.status = status
+        self.retry_after_s = max(1, math.ceil(retry_after_s))
+
+    def body(self) -> dict:
+        return {"ok": False, "error": str(self), "reason": self.reason, "retry_after_s": self.retry_after_s}
+
+
+class GenerationScheduler:
+    """
+    Admission control in front of Ollama.
+
+    At most `max_concurrency` generations run at once; the rest wait in a priority
+    queue (interactive before batch, FIFO within a class) of at most `max_queue`.
+    Waits are estimated from an EWMA of recent generation times, and a request
+    whose estimated wait + generation would overrun its deadline is rejected up
+    front instead of queueing work the client will have given up on.
+    """
+
+    def __init__(self, max_concurrency: int = 1, max_queue: int = 64,
+                 priorities: Sequence[str] = PRIORITIES, service_s: float = 0.0):
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.rank: Dict[str, int] = {p: i for i, p in enumerate(priorities)}
+        self.service_s = float(service_s)  # EWMA of generation time, 0 until the first one finishes
+        self.running = 0
+        self._heap: List[tuple] = []  # (rank, seq, future)
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.rejected: Dict[str, int] = {}
+
+    # --- estimates -----------------------------------------------------------
+    def depth(self, priority: str | None = None) -> int:
+        """Live waiters (all, or those served before a new `priority` request)."""
+        if priority is None:
+            return sum(1 for *_, f in self._heap if not f.done())
+        rank = self.rank[priority]
+        return sum(1 for r, _, f in self._heap if r <= rank and not f.done())
+
+    def estimate_wait_s(self, priority: str) -> float:
+        if self.running < self.max_concurrency and not self.depth(priority):
+            return 0.0
+        rounds = (self.depth(priority) + 1) / self.max_concurrency  # +1: the slot we wait for
+        return rounds * self.service_s
+
+    def check(self, priority: str, deadline: float) -> float:
+        """Raise Rejected if a new `priority` request can't finish before `deadline` (perf_counter)."""
+        if priority not in self.rank:
+            raise ValueError(f"Unknown priority {priority!r} (use one of {', '.join(self.rank)})")
+        wait = self.estimate_wait_s(priority)
+        if self.depth() >= self.max_queue and wait > 0:
+            self._reject("queue_full")
+            raise Rejected("queue_full", 429, wait,
+                           f"Generation queue is full ({self.max_queue} waiting); retry later")
+        remaining = deadline - time.perf_counter()
+        if wait + self.service_s > remaining:
+            self._reject("deadline")
+            raise Rejected("deadline", 503, wait,
+                           f"Estimated wait {wait:.1f}s + generation {self.service_s:.1f}s exceeds the "
+                           f"{max(0.0, remaining):.1f}s left before the deadline")
+        return wait
+
+    def _reject(self, reason: str) -> None:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+
+    # --- slots ---------------------------------------------------------------
+    @asynccontextmanager
+    async def slot(self, priority: str, deadline: float) -> AsyncIterator[dict]:
+        """
+        Hold one generation slot for the body of the `async with`.
+        Yields {"priority", "queue_depth", "est_wait_ms", "wait_ms"}; raises Rejected instead of queueing hopeless work.
+        """
+        est = self.check(priority, deadline)
+        info = {"priority": priority, "queue_depth": self.depth(priority), "est_wait_ms": round(est * 1000, 1)}
+        t_enq = time.perf_counter()
+        if self.running < self.max_concurrency and not self.depth():
+            self.running += 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._heap, (self.rank[priority], next(self._seq), fut))
+            try:
+                # leave early enough to still generate before the deadline
+                await asyncio.wait_for(fut, max(0.0, deadline - time.perf_counter() - self.service_s))
+            except asyncio.TimeoutError:
+                if fut.done() and not fut.cancelled():  # handed a slot just as time ran out
+                    self._release()
+                self._reject("timeout")
+                raise Rejected("timeout", 503, self.estimate_wait_s(priority),
+                               "Deadline reached while waiting for a generation slot") from None
+            except BaseException:
+                if fut.done() and not fut.cancelled():  # slot was handed over as we were cancelled
+                    self._release()
+                raise
+        info["wait_ms"] = round((time.perf_counter() - t_enq) * 1000, 2)
+        self.admitted += 1
+
+        t_start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            elapsed = time.perf_counter() - t_start
+            self.service_s = elapsed if self.service_s == 0 else 0.8 * self.service_s + 0.2 * elapsed
+            self._release()
+
+    def _release(self) -> None:
+        """Hand the slot straight to the best live waiter, or free it."""
+        while self._heap:
+            _, _, fut = heapq.heappop(self._heap)
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self.running -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queued": {p: sum(1 for r, _, f in self._heap if r == i and not f.done()) for p, i in self.rank.items()},
+            "service_s_ewma": round(self.service_s, 3),
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+        }
@@ -0,0 +1,85 @@
+# api/rag/sessions.py
+from __future__ import annotations
+import asyncio
+import secrets
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Hashable, Optional, Set, Tuple
+
+import numpy as np
+
+
+@dataclass
+class ChatSession:
+    """
+    One /chat conversation. `context` holds the token ids Ollama returned after the
+    last turn (the whole conversation so far); sending them back lets Ollama reuse
+    its KV cache instead of re-evaluating SYSTEM + earlier context every turn.
+    """
+    id: str
+    created: float
+    last_used: float
+    context: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int32))
+    seen: Set[Hashable] = field(default_factory=set)  # (doc_id, chunk_id) already in the conversation
+    turns: int = 0
+    resets: int = 0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)  # one turn at a time
+
+    def reset(self) -> None:
+        """Start over with a full prompt (context window used up, or Ollama returned no context)."""
+        self.context = np.zeros(0, dtype=np.int32)
+        self.seen.clear()
+        self.resets += 1
+
+
+class SessionStore:
+    """In-process chat sessions, LRU-evicted beyond `max_sessions` and expired after `ttl_s` idle."""
+
+    def __init__(self, max_sessions: int = 256, ttl_s: float = 1800.0):
+        self.max_sessions = max(1, int(max_sessions))
+        self.ttl_s = float(ttl_s)
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self.created = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _expire(self, now: float) -> None:
+        while self._sessions:
+            sid, s = next(iter(self._sessions.items()))
+            if now - s.last_used <= self.ttl_s:
+                return
+            del self._sessions[sid]
+            self.expired += 1
+
+    def get_or_create(self, session_id: Optional[str]) -> Tuple[ChatSession, bool]:
+        """The live session for `session_id`, or a new one (created=True) if unknown or expired."""
+        now = time.time()
+        self._expire(now)
+        s = self._sessions.get(session_id) if session_id else None
+        if s is not None:
+            s.last_used = now
+            self._sessions.move_to_end(s.id)
+            return s, False
+        s = ChatSession(id=secrets.token_urlsafe(16), created=now, last_used=now)
+        self._sessions[s.id] = s
+        self.created += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evicted += 1
+        return s, True
+
+    def drop(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> dict:
+        self._expire(time.time())
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "ttl_s": self.ttl_s,
+            "context_tokens": int(sum(len(s.context) for s in self._sessions.values())),
+            "created": self.created,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
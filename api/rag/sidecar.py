@@ -0,0 +1,165 @@
+# api/rag/sidecar.py
+"""
+Embedding sidecar: one process owns the SentenceTransformer, API workers send it texts
+over a Unix socket and get back raw float32 bytes (np.frombuffer, no pickled lists).
+
+Wire format, both directions:  !I header length | JSON header | raw body (header["nbytes"])
+  request  {"op": "embed", "texts": [...]}  or  {"op": "stats"}
+  response {"ok": true, "shape": [n, dim], "dtype": "float32", "nbytes": ...} + vectors
+           {"ok": false, "error": "..."}
+"""
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+from api.rag.batcher import EmbedBatcher
+from api.settings import settings
+
+log = logging.getLogger("api.sidecar")
+
+_HEADER = struct.Struct("!I")
+
+
+def socket_path() -> Path:
+    """settings.EMBED_SOCKET, or DATA_DIR/embed.sock when unset."""
+    return Path(settings.EMBED_SOCKET or Path(settings.DATA_DIR) / "embed.sock")
+
+
+async def _read(reader: asyncio.StreamReader) -> Tuple[dict, bytes]:
+    (size,) = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    header = json.loads(await reader.readexactly(size))
+    body = await reader.readexactly(header["nbytes"]) if header.get("nbytes") else b""
+    return header, body
+
+
+def _write(writer: asyncio.StreamWriter, header: dict, body=b"") -> None:
+    header["nbytes"] = len(body)
+    raw = json.dumps(header).encode("utf-8")
+    writer.write(_HEADER.pack(len(raw)) + raw)
+    if header["nbytes"]:
+        writer.write(body)
+
+
+# -----------------------------------------------------------------------------
+# Client (API workers)
+# -----------------------------------------------------------------------------
+class SidecarClient:
+    """Pooled connections to the sidecar; each connection carries one request at a time."""
+
+    def __init__(self, path: Path, connections: int = 4, timeout: float = 30.0):
+        self.path = str(path)
+        self.timeout = timeout
+        self._slots = asyncio.Semaphore(max(1, connections))
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def _call(self, header: dict) -> Tuple[dict, bytes]:
+        async with self._slots:
+            conn, resp = (self._idle.pop() if self._idle else None), None
+            try:
+                if conn is not None:
+                    try:
+                        resp, body = await self._roundtrip(conn, header)
+                    except (ConnectionError, asyncio.IncompleteReadError):
+                        conn[1].close()  # sidecar restarted since this connection was opened
+                        conn = None
+                if resp is None:
+                    conn = await asyncio.open_unix_connection(self.path)
+                    resp, body = await self._roundtrip(conn, header)
+            except BaseException:
+                if conn is not None:
+                    conn[1].close()
+                raise
+            self._idle.append(conn)
+        if not resp.get("ok"):
+            raise RuntimeError(f"embedding sidecar: {resp.get('error')}")
+        return resp, body
+
+    async def _roundtrip(self, conn, header: dict) -> Tuple[dict, bytes]:
+        reader, writer = conn
+        _write(writer, header)
+        await writer.drain()
+        return await asyncio.wait_for(_read(reader), self.timeout)
+
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        """Normalized float32 vectors, shape (len(texts), dim)."""
+        resp, body = await self._call({"op": "embed", "texts": list(texts)})
+        return np.frombuffer(body, dtype=np.float32).reshape(resp["shape"])
+
+    async def stats(self) -> dict:
+        resp, _ = await self._call({"op": "stats"})
+        resp.pop("ok", None)
+        resp.pop("nbytes", None)
+        return resp
+
+    async def aclose(self) -> None:
+        for _, writer in self._idle:
+            writer.close()
+        self._idle.clear()
+
+
+# -----------------------------------------------------------------------------
+# Server (python -m api.scripts.embed_sidecar)
+# -----------------------------------------------------------------------------
+async def serve(path: Path, model_path: str, threads: int, max_batch: int, max_wait_ms: float) -> None:
+    """Load the model once, then answer embed requests from every API worker until cancelled."""
+    from api.rag.embed import embed_array, load_embedder, set_torch_threads
+
+    t0 = time.perf_counter()
+    set_torch_threads(threads)
+    model = load_embedder(model_path)
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+    loop = asyncio.get_running_loop()
+
+    def encode_sync(texts: List[str]) -> np.ndarray:
+        return embed_array(model, texts)  # through the embedding cache shared with ingest and the workers
+
+    async def encode(texts: List[str]) -> np.ndarray:
+        return await loop.run_in_executor(pool, encode_sync, texts)
+
+    dim = (await encode(["warmup"])).shape[1]
+    # requests from different workers that land within max_wait_ms share one encode()
+    batcher = EmbedBatcher(encode, max_batch=max_batch, max_wait_ms=max_wait_ms)
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                header, _ = await _read(reader)
+                try:
+                    if header.get("op") == "stats":
+                        _write(writer, {"ok": True, "model": model_path, "dim": dim, "pid": os.getpid(),
+                                        "torch_threads": threads, **batcher.stats()})
+                    else:
+                        vecs = await asyncio.gather(*(batcher.embed(t) for t in header.get("texts", [])))
+                        arr = np.ascontiguousarray(np.stack(vecs) if vecs else np.zeros((0, dim)), dtype=np.float32)
+                        _write(writer, {"ok": True, "shape": list(arr.shape), "dtype": "float32"}, memoryview(arr).cast("B"))
+                except Exception as e:
+                    _write(writer, {"ok": False, "error": str(e)})
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # worker went away
+        finally:
+            writer.close()
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()  # stale socket from a previous run
+    server = await asyncio.start_unix_server(handle, path=str(path))
+    os.chmod(path, 0o600)
+    log.info("Embedding sidecar ready on %s in %.0f ms (model %s, dim %d, torch threads %s)",
+             path, (time.perf_counter() - t0) * 1000, model_path, dim, threads or "default")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await batcher.aclose()
+        pool.shutdown(wait=False)
+        path.unlink(missing_ok=True)
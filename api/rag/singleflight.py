@@ -0,0 +1,136 @@
+# api/rag/singleflight.py
+from __future__ import annotations
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+
+
+def normalize_query(query: str) -> str:
+    """Case/whitespace/trailing-punctuation insensitive form used to spot identical questions."""
+    return " ".join(query.casefold().split()).rstrip("?!. ")
+
+
+class Broadcast:
+    """
+    Replayable event log for one streamed answer: subscribers that join late get every
+    event from the start, then follow live until close().
+    `opened` resolves once the producer knows the stream will start (or holds its exception).
+    """
+
+    def __init__(self):
+        self.events: List[Tuple[str, dict]] = []
+        self.closed = False
+        self.opened: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._changed = asyncio.Event()
+
+    def open(self) -> None:
+        if not self.opened.done():
+            self.opened.set_result(None)
+
+    def fail(self, e: BaseException) -> None:
+        if not self.opened.done():
+            self.opened.set_exception(e)
+
+    def publish(self, event: str, data: dict) -> None:
+        self.events.append((event, data))
+        self._wake()
+
+    def close(self) -> None:
+        self.closed = True
+        self._wake()
+
+    def _wake(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def subscribe(self):
+        i = 0
+        while True:
+            while i < len(self.events):
+                yield self.events[i]
+                i += 1
+            if self.closed:
+                return
+            await self._changed.wait()
+
+
+class WaitTimeout(TimeoutError):
+    """A follower's own timeout ran out before the shared execution finished (which goes on)."""
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent work: the first caller for a key starts it as a
+    detached task, later callers with the same key wait for that task instead of
+    starting their own. A caller that disconnects doesn't cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._streams: Dict[Hashable, Broadcast] = {}
+        self._tasks: Set[asyncio.Task] = set()  # strong refs for detached stream producers
+        self.leaders = 0
+        self.followers = 0
+
+    def _track(self, table: dict, key: Hashable, value: Any, task: asyncio.Task) -> None:
+        table[key] = value
+        self._tasks.add(task)
+
+        def done(t: asyncio.Task) -> None:
+            self._tasks.discard(t)
+            if table.get(key) is value:
+                del table[key]
+            if not t.cancelled():
+                t.exception()  # retrieved here so an unawaited failure isn't logged as "never retrieved"
+
+        task.add_done_callback(done)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]],
+                 timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Returns (result, shared); shared=True when another caller's execution was reused.
+        A follower waits at most `timeout` seconds for it, then gets WaitTimeout (the leader
+        runs fn() under its own limits).
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._track(self._calls, key, task, task)
+            self.leaders += 1
+            return await asyncio.shield(task), False
+        self.followers += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout), True
+        except asyncio.TimeoutError:
+            if task.done():  # the execution itself timed out: same error as the leader gets
+                raise
+            raise WaitTimeout(f"no result within {timeout:.1f}s") from None
+
+    def stream(self, key: Hashable, produce: Callable[[Broadcast], Awaitable[None]]) -> Tuple[Broadcast, bool]:
+        """Join (or start) the streamed execution for `key`; `produce` publishes into the Broadcast."""
+        bc = self._streams.get(key)
+        if bc is not None:
+            self.followers += 1
+            return bc, True
+
+        bc = Broadcast()
+
+        async def run() -> None:
+            try:
+                await produce(bc)
+            except BaseException as e:
+                bc.fail(e)
+                raise
+            finally:
+                bc.open()  # no-op unless produce() returned without opening
+                bc.close()
+
+        self._track(self._streams, key, bc, asyncio.create_task(run()))
+        self.leaders += 1
+        return bc, False
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "executions": self.leaders,
+            "coalesced": self.followers,
+        }
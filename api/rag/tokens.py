@@ -0,0 +1,91 @@
+# api/rag/tokens.py
+from __future__ import annotations
+import logging
+import math
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from api.rag.utils import hf_cached_file
+from api.settings import settings
+
+log = logging.getLogger("api.tokens")
+
+
+class TokenCounter:
+    """
+    Counts tokens with a Hugging Face fast tokenizer (`tokenizers`, no torch).
+    Accepts a tokenizer.json, a model folder containing one, or a hub name (taken
+    from the local HF cache when it is there, downloaded otherwise). If none of
+    those load, falls back to a chars/4 estimate and says so in `name`.
+    Loading may hit the network: keep the first call off the event loop.
+    """
+
+    def __init__(self, name_or_path: str, cache_size: int = 8192):
+        self.name = name_or_path
+        self._tok = None
+        try:
+            self._tok = self._load(name_or_path)
+        except Exception as e:
+            log.warning("Tokenizer %r unavailable, estimating tokens as chars/4: %s", name_or_path, e)
+            self.name = "chars/4 estimate"
+        # repeated texts (system prompt, popular chunks) are counted once
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    @staticmethod
+    def _local_file(name_or_path: str) -> Optional[Path]:
+        """tokenizer.json on disk: the path itself, inside the folder, or in the HF cache for a hub name."""
+        p = Path(name_or_path).expanduser()
+        if p.is_dir():
+            p = p / "tokenizer.json"
+        if p.is_file():
+            return p
+        return hf_cached_file(name_or_path, "tokenizer.json")
+
+    @classmethod
+    def _load(cls, name_or_path: str):
+        from tokenizers import Tokenizer
+
+        local = cls._local_file(name_or_path)
+        tok = Tokenizer.from_file(str(local)) if local else Tokenizer.from_pretrained(name_or_path)
+        tok.no_truncation()  # the embedder's 256/512 limit must not cap prompt counts
+        tok.no_padding()
+        return tok
+
+    @property
+    def estimated(self) -> bool:
+        """True when the tokenizer could not be loaded and counts are the chars/4 estimate."""
+        return self._tok is None
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._tok is None:
+            return math.ceil(len(text) / 4)
+        return len(self._tok.encode(text, add_special_tokens=False).ids)
+
+    def count_batch(self, texts: Sequence[str]) -> List[int]:
+        """Counts for many texts in one (parallel, Rust-side) encode_batch call."""
+        if self._tok is None or not texts:
+            return [self._count(t) for t in texts]
+        encs = self._tok.encode_batch(list(texts), add_special_tokens=False)
+        return [len(e.ids) for e in encs]
+
+
+_counter: Optional[TokenCounter] = None
+_counter_lock = threading.Lock()
+
+
+def token_counter() -> TokenCounter:
+    """Shared counter for PROMPT_TOKENIZER (the embedder's tokenizer when unset); the first call loads it."""
+    global _counter
+    with _counter_lock:
+        if _counter is None:
+            _counter = TokenCounter(settings.PROMPT_TOKENIZER or settings.EMB_PATH)
+    return _counter
+
+
+def loaded_counter() -> Optional[TokenCounter]:
+    """The shared counter if it is loaded already, else None (never blocks)."""
+    return _counter
@@ -1,5 +1,34 @@
 # rag/utils.py
 from pathlib import Path
+from typing import Optional
+
+COLLECTION_NAME = r"^[A-Za-z0-9_-]+$"  # what the API accepts as a collection name
+
+
+def contained(root: Path, name: str, suffix: str = "") -> Path:
+    """root/<name><suffix>, refusing names that would land anywhere but directly inside root."""
+    base = Path(root).resolve()
+    p = (base / f"{name}{suffix}").resolve()
+    if not name or p.parent != base or p.name != f"{name}{suffix}":
+        raise ValueError(f"invalid collection name: {name!r}")
+    return p
+
+
+def hf_cached_file(repo: str, filename: str) -> Optional[Path]:
+    """`filename` of hub model `repo` in the local HF cache (current snapshot), or None; no network."""
+    try:
+        from huggingface_hub import try_to_load_from_cache
+    except ImportError:
+        return None
+    for name in (repo, f"sentence-transformers/{repo}"):  # SentenceTransformer's short names
+        try:
+            cached = try_to_load_from_cache(name, filename)
+        except Exception:  # not a valid repo id
+            continue
+        if isinstance(cached, str):
+            return Path(cached)
+    return None
+
 
 def infer_title_from_text_or_name(text: str, fallback_name: str) -> str:
     for line in text.splitlines():
@@ -1,35 +1,461 @@
 # api/rag/vector.py
 from __future__ import annotations
-from typing import List, Dict
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Dict, Optional, Sequence
+import os
+import re
+import threading
+import time
 import uuid
 
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import Distance, VectorParams, PointStruct
+import numpy as np
 from api.settings import settings
+from api.rag.local_index import LocalIndex
+from api.rag.utils import contained
 
-_client: QdrantClient | None = None
+if TYPE_CHECKING:  # qdrant_client costs ~0.7 s to import; only the Qdrant backend loads it
+    from qdrant_client import AsyncQdrantClient, QdrantClient
+    from qdrant_client.http.models import Filter
+
+
+# -----------------------------------------------------------------------------
+# Backends: settings.VECTOR_BACKEND = "qdrant" (default) | "local".
+# Ingest uses the sync methods, the API the async ones.
+# -----------------------------------------------------------------------------
+def _as_list(vector: Sequence[float]) -> List[float]:
+    return np.asarray(vector, dtype=np.float32).tolist()
+
+
+def collection_config(dim: int, quantization: Optional[str] = None, on_disk: Optional[bool] = None) -> dict:
+    """create_collection() kwargs: cosine vectors, optionally on disk and quantized (defaults: QDRANT_* settings)."""
+    from qdrant_client.http.models import (
+        BinaryQuantization, BinaryQuantizationConfig, Distance, ScalarQuantization, ScalarQuantizationConfig,
+        ScalarType, VectorParams,
+    )
+    mode = settings.QDRANT_QUANTIZATION if quantization is None else quantization
+    if mode == "scalar":
+        quant = ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    elif mode == "binary":
+        quant = BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    elif mode == "none":
+        quant = None
+    else:
+        raise ValueError(f"Unknown QDRANT_QUANTIZATION: {mode!r} (use 'none', 'scalar' or 'binary')")
+    return {
+        "vectors_config": VectorParams(size=dim, distance=Distance.COSINE,
+                                       on_disk=settings.QDRANT_ON_DISK if on_disk is None else on_disk),
+        "quantization_config": quant,
+    }
+
+
+def search_params(exact: bool = False, quantization: Optional[str] = None):
+    """Exact search skips quantization; otherwise oversample on quantized vectors and rescore (ignored if unquantized)."""
+    from qdrant_client.http.models import QuantizationSearchParams, SearchParams
+    if exact:
+        return SearchParams(exact=True, quantization=QuantizationSearchParams(ignore=True))
+    if (settings.QDRANT_QUANTIZATION if quantization is None else quantization) == "none":
+        return None
+    return SearchParams(quantization=QuantizationSearchParams(
+        rescore=settings.QDRANT_QUANT_RESCORE, oversampling=settings.QDRANT_QUANT_OVERSAMPLING,
+    ))
+
+
+def _doc_filter(doc_ids: Optional[Sequence[str]]) -> Optional[Filter]:
+    if not doc_ids:
+        return None
+    from qdrant_client.http.models import FieldCondition, Filter, MatchAny
+    return Filter(must=[FieldCondition(key="doc_id", match=MatchAny(any=list(doc_ids)))])
+
+
+class QdrantBackend:
+    name = "qdrant"
+
+    def __init__(self, url: str):
+        self.url = url
+        self._client: QdrantClient | None = None
+        self._aclient: AsyncQdrantClient | None = None
+
+    def client(self) -> QdrantClient:
+        if self._client is None:
+            from qdrant_client import QdrantClient
+            self._client = QdrantClient(location=self.url)  # URL, or ":memory:" for tests/benchmarks
+        return self._client
+
+    def aclient(self) -> AsyncQdrantClient:
+        if self._aclient is None:
+            from qdrant_client import AsyncQdrantClient
+            self._aclient = AsyncQdrantClient(location=self.url)
+        return self._aclient
+
+    # --- ingest (sync) -------------------------------------------------------
+    def ensure_collection(self, collection_name: str, dim: int) -> bool:
+        q = self.client()
+        if q.collection_exists(collection_name) or collection_name in self.aliases():
+            return False
+        q.create_collection(collection_name=collection_name, **collection_config(dim))
+        return True
+
+    def upsert(self, collection_name: str, points: List[Dict], wait: bool) -> None:
+        from qdrant_client.http.models import PointStruct
+        qpoints = [
+            PointStruct(id=p.get("id") or str(uuid.uuid4()), vector=_as_list(p["vector"]), payload=p["payload"])
+            for p in points
+        ]
+        self.client().upsert(collection_name=collection_name, points=qpoints, wait=wait)
+
+    def aliases(self) -> Dict[str, str]:
+        """alias -> collection it points to."""
+        return {a.alias_name: a.collection_name for a in self.client().get_aliases().aliases}
+
+    def fetch_vectors(self, collection_name: str, ids: List[str]) -> Dict[str, List[float]]:
+        recs = self.client().retrieve(collection_name=collection_name, ids=ids, with_payload=False, with_vectors=True)
+        return {str(r.id): r.vector for r in recs}
+
+    def delete(self, collection_name: str, ids: List[str]) -> None:
+        from qdrant_client.http.models import PointIdsList
+        self.client().delete(collection_name=collection_name, points_selector=PointIdsList(points=ids), wait=True)
+
+    def barrier(self, collection_name: str, last_points: List[Dict]) -> None:
+        # Qdrant applies a shard's updates in order, so re-sending the last batch with
+        # wait=True (a no-op thanks to deterministic ids) returns once everything before it is applied.
+        if last_points:
+            self.upsert(collection_name, last_points, wait=True)
+
+    # --- API (async) ---------------------------------------------------------
+    async def aensure_collection(self, collection_name: str, dim: int) -> None:
+        q = self.aclient()
+        if await q.collection_exists(collection_name):
+            return
+        aliases = (await q.get_aliases()).aliases
+        if not any(a.alias_name == collection_name for a in aliases):  # an alias (see reindex) is fine too
+            await q.create_collection(collection_name=collection_name, **collection_config(dim))
+
+    async def aresolve_alias(self, name: str) -> str:
+        """The collection `name` points to if it is an alias (see reindex), else `name`."""
+        aliases = (await self.aclient().get_aliases()).aliases
+        return next((a.collection_name for a in aliases if a.alias_name == name), name)
+
+    async def search(self, collection_name: str, vector: Sequence[float], limit: int,
+                     exact: bool = False, doc_ids: Optional[Sequence[str]] = None,
+                     fields: Optional[Sequence[str]] = None) -> list:
+        res = await self.aclient().query_points(
+            collection_name=collection_name,
+            query=_as_list(vector),
+            limit=limit,
+            with_payload=list(fields) if fields is not None else True,
+            query_filter=_doc_filter(doc_ids),
+            search_params=search_params(exact),
+        )
+        return res.points
+
+    async def search_batch(self, collection_name: str, vectors: Sequence[Sequence[float]], limit: int,
+                           exact: bool = False, doc_ids: Optional[Sequence[str]] = None,
+                           fields: Optional[Sequence[str]] = None) -> List[list]:
+        """Many queries, one round trip."""
+        if not len(vectors):
+            return []
+        from qdrant_client.http.models import QueryRequest
+        requests = [
+            QueryRequest(
+                query=_as_list(v),
+                limit=limit,
+                with_payload=list(fields) if fields is not None else True,
+                filter=_doc_filter(doc_ids),
+                params=search_params(exact),
+            )
+            for v in vectors
+        ]
+        res = await self.aclient().query_batch_points(collection_name=collection_name, requests=requests)
+        return [r.points for r in res]
+
+    async def fetch_payloads(self, collection_name: str, ids: Sequence[str],
+                             fields: Optional[Sequence[str]] = None) -> Dict[str, dict]:
+        recs = await self.aclient().retrieve(
+            collection_name=collection_name,
+            ids=list(ids),
+            with_payload=list(fields) if fields is not None else True,
+            with_vectors=False,
+        )
+        return {str(r.id): r.payload or {} for r in recs}
+
+    async def count(self, collection_name: str) -> int:
+        return (await self.aclient().count(collection_name=collection_name, exact=True)).count
+
+    async def describe(self, collection_name: str) -> dict:
+        info = await self.aclient().get_collection(collection_name)
+        quant = info.config.quantization_config
+        return {
+            "vector_size": info.config.params.vectors.size,
+            "distance": info.config.params.vectors.distance,
+            "on_disk": bool(info.config.params.vectors.on_disk),
+            "quantization": type(quant).__name__.replace("Quantization", "").lower() if quant else "none",
+        }
+
+    async def ping(self) -> dict:
+        resp = await self.aclient().get_collections()
+        return {"collections": [c.name for c in resp.collections]}
+
+    async def aclose(self) -> None:
+        if self._aclient is not None:
+            await self._aclient.close()
+
+
+class LocalBackend:
+    """In-process NumPy index per collection under DATA_DIR/local (no Qdrant needed)."""
+    name = "local"
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._indexes: Dict[str, LocalIndex] = {}
+
+    def index(self, collection_name: str) -> LocalIndex:
+        idx = self._indexes.get(collection_name)
+        if idx is None:
+            idx = LocalIndex(contained(self.root, collection_name), settings.EMB_DIM).load()
+            self._indexes[collection_name] = idx
+        else:
+            idx.refresh()
+        return idx
+
+    # --- ingest (sync) -------------------------------------------------------
+    def ensure_collection(self, collection_name: str, dim: int) -> bool:
+        idx = self.index(collection_name)
+        if idx.exists:
+            return False
+        idx.save()
+        return True
+
+    def upsert(self, collection_name: str, points: List[Dict], wait: bool) -> None:
+        idx = self.index(collection_name)
+        idx.upsert(
+            [p.get("id") or str(uuid.uuid4()) for p in points],
+            [p["vector"] for p in points],
+            [p["payload"] for p in points],
+        )
+        if wait:
+            idx.save()
+
+    def fetch_vectors(self, collection_name: str, ids: List[str]) -> Dict[str, List[float]]:
+        return self.index(collection_name).get_vectors(ids)
+
+    def delete(self, collection_name: str, ids: List[str]) -> None:
+        idx = self.index(collection_name)
+        idx.delete(ids)
+        idx.save()
+
+    def barrier(self, collection_name: str, last_points: List[Dict]) -> None:
+        self.index(collection_name).save()
+
+    # --- API (async; everything is in-process and sub-millisecond) ----------
+    async def aensure_collection(self, collection_name: str, dim: int) -> None:
+        self.index(collection_name)
+
+    async def aresolve_alias(self, name: str) -> str:
+        return name
+
+    async def search(self, collection_name: str, vector: Sequence[float], limit: int,
+                     exact: bool = False, doc_ids: Optional[Sequence[str]] = None,
+                     fields: Optional[Sequence[str]] = None) -> list:
+        return self.index(collection_name).search(vector, limit, doc_ids=doc_ids, fields=fields)
+
+    async def search_batch(self, collection_name: str, vectors: Sequence[Sequence[float]], limit: int,
+                           exact: bool = False, doc_ids: Optional[Sequence[str]] = None,
+                           fields: Optional[Sequence[str]] = None) -> List[list]:
+        return self.index(collection_name).search_batch(vectors, limit, doc_ids=doc_ids, fields=fields)
+
+    async def fetch_payloads(self, collection_name: str, ids: Sequence[str],
+                             fields: Optional[Sequence[str]] = None) -> Dict[str, dict]:
+        return self.index(collection_name).get_payloads(ids, fields)
+
+    async def count(self, collection_name: str) -> int:
+        return len(self.index(collection_name))
+
+    async def describe(self, collection_name: str) -> dict:
+        return {"vector_size": self.index(collection_name).dim, "distance": "Cosine"}
+
+    async def ping(self) -> dict:
+        return {"collections": sorted(p.name for p in self.root.glob("*") if (p / "CURRENT").exists())}
+
+    async def aclose(self) -> None:
+        pass
+
+
+_backend: QdrantBackend | LocalBackend | None = None
+
+def backend() -> QdrantBackend | LocalBackend:
+    global _backend
+    if _backend is None:
+        if settings.VECTOR_BACKEND == "local":
+            _backend = LocalBackend(Path(settings.DATA_DIR) / "local")
+        elif settings.VECTOR_BACKEND == "qdrant":
+            _backend = QdrantBackend(settings.QDRANT_URL)
+        else:
+            raise ValueError(f"Unknown VECTOR_BACKEND: {settings.VECTOR_BACKEND!r} (use 'qdrant' or 'local')")
+    return _backend
 
 def client() -> QdrantClient:
-    global _client
-    if _client is None:
-        _client = QdrantClient(url=settings.QDRANT_URL)
-    return _client
+    """Sync Qdrant client (Qdrant backend only)."""
+    b = backend()
+    if not isinstance(b, QdrantBackend):
+        raise RuntimeError("client() needs VECTOR_BACKEND=qdrant")
+    return b.client()
+
+
+# -----------------------------------------------------------------------------
+# Ingest helpers (sync, backend-agnostic)
+# -----------------------------------------------------------------------------
+def ensure_collection(collection_name: str, dim: int) -> bool:
+    """Create the collection if missing. Returns True when it was just created."""
+    return backend().ensure_collection(collection_name, dim)
+
+_ID_NAMESPACE = uuid.UUID("6f1c3a52-3c1e-4b8e-9a57-0d2b1f6c9e41")
+
+def point_id(doc_id: str, chunk_id: int, chunk_hash: str) -> str:
+    """Deterministic point id: re-ingesting the same chunk overwrites instead of duplicating."""
+    return str(uuid.uuid5(_ID_NAMESPACE, f"{doc_id}#{chunk_id}#{chunk_hash}"))
+
+def upsert_chunks(collection_name: str, points: List[Dict], wait: bool = True):
+    """
+    points: [{'id': '...', 'vector': [...], 'payload': {...}}, ...]  ('id' optional → random;
+    'vector' may be a float32 array, converted only here)
+    wait=False returns once the batch is queued; follow up with barrier().
+    """
+    backend().upsert(collection_name, points, wait=wait)
+    bump_collection_version(collection_name)
+
+def barrier(collection_name: str, last_points: List[Dict]):
+    """Wait until every update sent with wait=False is applied (local: write the index)."""
+    backend().barrier(collection_name, last_points)
+    bump_collection_version(collection_name)
+
+def fetch_vectors(collection_name: str, ids: List[str]) -> Dict[str, List[float]]:
+    """Stored vectors by point id (missing ids are simply absent from the result)."""
+    if not ids:
+        return {}
+    return backend().fetch_vectors(collection_name, ids)
+
+def delete_points(collection_name: str, ids: List[str]):
+    if not ids:
+        return
+    backend().delete(collection_name, ids)
+    bump_collection_version(collection_name)
+
+
+# -----------------------------------------------------------------------------
+# Shadow collections (Qdrant only): reindex builds `<alias>_v<stamp>` with HNSW
+# deferred, then flips the alias named by settings.QDRANT_COLLECTION onto it.
+# -----------------------------------------------------------------------------
+HNSW_M = 16  # Qdrant's defaults, for a config that leaves them unset
+INDEXING_THRESHOLD_KB = 20000
+
+
+def versioned_name(alias: str) -> str:
+    return f"{alias}_v{time.strftime('%Y%m%d%H%M%S')}"
 
-def ensure_collection(collection_name: str, dim: int):
+
+def versions(alias: str) -> List[str]:
+    """Collections built by reindex for `alias`, oldest first."""
+    pattern = re.compile(rf"^{re.escape(alias)}_v\d{{14}}$")
+    return sorted(c.name for c in client().get_collections().collections if pattern.match(c.name))
+
+
+def resolve_alias(name: str) -> str:
+    """The collection an alias points to (`name` itself for plain collections and the local backend)."""
+    b = backend()
+    return b.aliases().get(name, name) if isinstance(b, QdrantBackend) else name
+
+
+def create_bulk_collection(collection_name: str, dim: int, like: Optional[str] = None) -> dict:
+    """
+    New collection tuned for bulk upload: no HNSW graph (m=0) and no indexing until finish_bulk_load().
+    Returns the update_collection() kwargs that finish_bulk_load() restores: the HNSW m and
+    indexing threshold of `like` (the collection being replaced) if it exists, else the ones
+    the server gave the new collection.
+    """
+    from qdrant_client.http.models import HnswConfigDiff, OptimizersConfigDiff
     q = client()
-    existing = [c.name for c in q.get_collections().collections]
-    if collection_name not in existing:
-        q.create_collection(
+    q.create_collection(collection_name=collection_name, **collection_config(dim))
+    try:
+        source = like if like and q.collection_exists(like) else collection_name
+        config = q.get_collection(source).config
+        m, threshold = config.hnsw_config.m, config.optimizer_config.indexing_threshold
+        q.update_collection(
             collection_name=collection_name,
-            vectors_config=VectorParams(size=dim, distance=Distance.COSINE),
+            hnsw_config=HnswConfigDiff(m=0),
+            optimizers_config=OptimizersConfigDiff(indexing_threshold=0),
         )
+    except BaseException:
+        q.delete_collection(collection_name)
+        raise
+    return {
+        "hnsw_config": HnswConfigDiff(m=HNSW_M if m is None else m),
+        "optimizers_config": OptimizersConfigDiff(
+            indexing_threshold=INDEXING_THRESHOLD_KB if threshold is None else threshold),
+    }
+
+
+def finish_bulk_load(collection_name: str, restore: dict, timeout_s: float = 600.0) -> float:
+    """
+    Turn indexing back on with `restore` (what create_bulk_collection() returned) and wait
+    until the optimizer is done (status green). Returns seconds waited.
+    """
+    from qdrant_client.http.models import CollectionStatus
+    q = client()
+    t0 = time.perf_counter()
+    q.update_collection(collection_name=collection_name, **restore)
+    while q.get_collection(collection_name).status != CollectionStatus.GREEN:
+        if time.perf_counter() - t0 > timeout_s:
+            raise TimeoutError(f"{collection_name} still optimizing after {timeout_s:.0f}s")
+        time.sleep(1.0)
+    return time.perf_counter() - t0
+
 
-def upsert_chunks(collection_name: str, points: List[Dict]):
+def swap_alias(alias: str, collection_name: str, replace_collection: bool = False) -> None:
     """
-    points: [{'vector': [...], 'payload': {...}}, ...]
+    Point `alias` at `collection_name` in one atomic alias update, then bump the alias'
+    version stamp so API caches drop answers from the old collection.
+    replace_collection deletes a plain collection that still holds the alias' name
+    (one-time migration: queries fail for the moment between the two calls).
     """
-    qpoints = [
-        PointStruct(id=str(uuid.uuid4()), vector=p["vector"], payload=p["payload"])
-        for p in points
-    ]
-    client().upsert(collection_name=collection_name, points=qpoints, wait=True)
+    from qdrant_client.http.models import CreateAlias, CreateAliasOperation, DeleteAlias, DeleteAliasOperation
+    q = client()
+    ops = []
+    if alias in backend().aliases():
+        ops.append(DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias)))
+    elif q.collection_exists(alias):
+        if not replace_collection:
+            raise RuntimeError(f"{alias!r} is a collection, not an alias; pass replace_collection to migrate it")
+        q.delete_collection(alias)
+    ops.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=collection_name, alias_name=alias)))
+    q.update_collection_aliases(change_aliases_operations=ops)
+    bump_collection_version(alias)
+
+
+def drop_collection(collection_name: str) -> None:
+    client().delete_collection(collection_name)
+
+
+# -----------------------------------------------------------------------------
+# Collection version stamp: bumped on every write so readers (e.g. the API's
+# answer cache) can tell the collection changed without asking the backend.
+# -----------------------------------------------------------------------------
+def _version_path(collection_name: str) -> Path:
+    return contained(Path(settings.DATA_DIR) / "versions", f"{settings.VECTOR_BACKEND}-{collection_name}", ".txt")
+
+
+def collection_version(collection_name: str) -> str:
+    """Current version stamp ("" if the collection was never written through ingest)."""
+    try:
+        return _version_path(collection_name).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return ""
+
+
+def bump_collection_version(collection_name: str) -> str:
+    p = _version_path(collection_name)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    stamp = f"{time.time_ns()}-{os.getpid()}"
+    tmp = p.with_suffix(f".{os.getpid()}-{threading.get_ident()}.tmp")
+    tmp.write_text(stamp, encoding="utf-8")
+    tmp.replace(p)  # atomic on POSIX, readers never see a half-written stamp
+    return stamp
@@ -0,0 +1,37 @@
+# api/scripts/embed_sidecar.py
+from __future__ import annotations
+import asyncio
+import logging
+import os
+from pathlib import Path
+from typing import Optional
+import typer
+
+from api.settings import settings
+
+app = typer.Typer(add_completion=False, help="Serve query embeddings to every API worker from one process")
+
+
+@app.command("serve")
+def serve(
+    socket: Optional[Path] = typer.Option(None, "--socket", help="Unix socket path (default: EMBED_SOCKET or DATA_DIR/embed.sock)"),
+    model: str = typer.Option(settings.EMB_PATH, "--model", help="SentenceTransformer name or path"),
+    threads: int = typer.Option(settings.EMBED_TORCH_THREADS, "--threads", help="torch intra-op threads (0 = torch default)"),
+    max_batch: int = typer.Option(settings.EMBED_BATCH_MAX, "--max-batch", help="Max texts per encode() across workers"),
+    max_wait_ms: float = typer.Option(settings.EMBED_BATCH_WAIT_MS, "--max-wait-ms", help="How long a request waits for company"),
+):
+    """Run the embedding sidecar (start it before API workers that use EMBED_MODE=sidecar)."""
+    if threads > 0:  # must be set before torch is imported to cap OpenMP/MKL pools too
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ.setdefault(var, str(threads))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    from api.rag.sidecar import serve as run_sidecar, socket_path
+    try:
+        asyncio.run(run_sidecar(socket or socket_path(), model, threads, max_batch, max_wait_ms))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    app()
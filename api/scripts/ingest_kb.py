@@ -1,27 +1,23 @@
 # api/scripts/ingest_kb.py
 from __future__ import annotations
+import json
 import os
+import time
 from pathlib import Path
-from typing import Iterable, List, Tuple
+from typing import Optional
 import typer
 
 # our settings and rag helpers
 from api.settings import settings
-from api.rag.chunker import chunk_text
 from api.rag.embed import load_embedder, embed_texts
-from api.rag.vector import ensure_collection, upsert_chunks
+from api.rag.ingest import IngestReport, ingest, iter_files
+from api.rag.lexical import drop_index
+from api.rag.manifest import Manifest
+from api.rag.vector import (
+    client, create_bulk_collection, drop_collection, finish_bulk_load, resolve_alias, swap_alias, versioned_name, versions,
+)
 
-app = typer.Typer(add_completion=False, help="Ingest local KB into Qdrant")
-
-
-def _iter_files(root: Path, exts: Tuple[str, ...]) -> Iterable[Path]:
-    for p in root.rglob("*"):
-        if p.is_file() and p.suffix.lower() in exts:
-            yield p
-
-
-def _read_text_file(p: Path) -> str:
-    return p.read_text(encoding="utf-8", errors="ignore")
+app = typer.Typer(add_completion=False, help="Ingest local KB into the vector store (Qdrant or the local index)")
 
 
 @app.command("load")
@@ -30,52 +26,256 @@ def load(
     collection: str = typer.Option(settings.QDRANT_COLLECTION, "--collection", "-c"),
     exts: str = typer.Option(".md,.txt", "--exts", help="Comma-separated extensions to include"),
     batch_size: int = typer.Option(128, "--batch-size", "-b", help="Upsert batch size"),
+    embed_batch_size: int = typer.Option(64, "--embed-batch-size", help="Chunks per encode() call, packed across files"),
+    workers: int = typer.Option(min(4, os.cpu_count() or 1), "--workers", "-w", help="Processes for read+chunk (1 = in-process)"),
+    upsert_concurrency: int = typer.Option(4, "--upsert-concurrency", help="Upsert batches in flight"),
+    full: bool = typer.Option(False, "--full", help="Ignore the manifest and re-embed every file"),
+    sentence_vectors: bool = typer.Option(True, "--sentence-vectors/--no-sentence-vectors",
+                                          help="Also embed each chunk's sentences (for context compression)"),
+    lexical: bool = typer.Option(settings.LEXICAL_INDEX, "--lexical/--no-lexical",
+                                 help="Keep the BM25 index for hybrid retrieval in sync"),
+    read_ahead_mb: float = typer.Option(settings.INGEST_READ_AHEAD_MB, "--read-ahead-mb",
+                                        help="File bytes the read workers may get ahead of the embedder"),
+    stream_file_mb: float = typer.Option(settings.INGEST_STREAM_FILE_MB, "--stream-file-mb",
+                                         help="Files this big or bigger are streamed in-process, window by window"),
+    checkpoint_s: float = typer.Option(settings.INGEST_CHECKPOINT_S, "--checkpoint-s",
+                                       help="Commit (barrier + manifest + BM25) at most this often; 0 = only at the end"),
 ):
     """
-    Walk kb_dir → read text files → chunk → embed → upsert to Qdrant.
+    Walk kb_dir → read changed text files → chunk → embed new chunks → upsert (api/rag/ingest.py).
+
+    Incremental: a manifest (DATA_DIR/manifests/<collection>.json) remembers each file's
+    size/mtime/sha256 and its chunk hashes. Unchanged files are skipped without being read,
+    only new chunks are embedded, and points of removed files/chunks are deleted.
+
+    Pipelined: a process pool reads and chunks files while the main thread embeds full
+    cross-file batches, and a thread pool upserts with wait=False behind it.
+
+    Memory-bounded: every stage hands on a bounded amount (read-ahead bytes, one embed
+    batch, --upsert-concurrency upsert batches) and blocks when the next one is full.
+    Big files are never held whole; vectors stay float32 arrays until upsert. The run
+    ends with the peak RSS of this process and of the read workers.
+
+    Resumable: every --checkpoint-s the pipeline is drained and the manifest saved, so
+    re-running after a crash or Ctrl-C continues from the last checkpoint (drop --full).
+
+    With --lexical, the BM25 index (DATA_DIR/lexical/<collection>) gets the same adds and
+    deletes; if it is missing next to an existing manifest, it is rebuilt from every file.
     """
     exts_tuple = tuple(s.strip().lower() for s in exts.split(",") if s.strip())
     typer.echo(f"KB path: {kb_dir} | exts: {exts_tuple} | collection: {collection}")
 
-    # 1) make sure collection exists (dim must match current EMB_DIM)
-    ensure_collection(collection_name=collection, dim=settings.EMB_DIM)
-
-    # 2) load embedder once
-    embedder = load_embedder(settings.EMB_PATH)
-
-    total_files = 0
-    total_chunks = 0
-    batch_points: List[dict] = []
-
-    for f in _iter_files(kb_dir, exts_tuple):
-        total_files += 1
-        doc_id = f.relative_to(kb_dir).as_posix()
-
-        text = _read_text_file(f)
-        chunks = chunk_text(text)
-        vecs = embed_texts(embedder, chunks)
-
-        # accumulate points
-        for i, (chunk, vec) in enumerate(zip(chunks, vecs)):
-            batch_points.append(
-                {
-                    "vector": vec,
-                    "payload": {"doc_id": doc_id, "chunk_id": i, "text": chunk},
-                }
-            )
-        total_chunks += len(chunks)
-
-        # flush in batches
-        if len(batch_points) >= batch_size:
-            upsert_chunks(collection_name=collection, points=batch_points)
-            batch_points.clear()
-            typer.echo(f"Upserted so far: {total_chunks} chunks")
-
-    # flush remainder
-    if batch_points:
-        upsert_chunks(collection_name=collection, points=batch_points)
-
-    typer.secho(f"Done. Files: {total_files}, Chunks: {total_chunks}", fg=typer.colors.GREEN)
+    def progress(p: dict) -> None:
+        if p["phase"] == "waiting":
+            typer.echo("Waiting for the collection lock (another ingest is running)…")
+        elif p["phase"] == "ingesting" and p["checkpoints"] > checkpoints[0]:
+            checkpoints[0] = p["checkpoints"]
+            typer.echo(f"Checkpoint {p['checkpoints']}: {p['files_done']}/{p['files_total']} files, "
+                       f"{p['chunks_written']} chunks, {p['chunks_per_s']:.1f} chunks/s, ETA {_eta(p['eta_s'])}")
+
+    checkpoints = [0]
+    report = ingest(kb_dir, collection, exts=exts_tuple, batch_size=batch_size, embed_batch_size=embed_batch_size,
+                    workers=workers, upsert_concurrency=upsert_concurrency, full=full,
+                    sentence_vectors=sentence_vectors, lexical=lexical, read_ahead_mb=read_ahead_mb,
+                    stream_file_mb=stream_file_mb, checkpoint_s=checkpoint_s, progress=progress)
+    _print_report(report)
+
+
+def _eta(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return "?"
+    return f"{seconds / 60:.0f}m{seconds % 60:02.0f}s" if seconds >= 60 else f"{seconds:.0f}s"
+
+
+def _print_report(report: IngestReport) -> None:
+    typer.secho(
+        f"Done. Files: {report.files} (changed {report.changed}, removed {report.removed}"
+        + (f", resumed {report.resumed}" if report.resumed else "") + "), "
+        f"Chunks embedded: {report.embedded}, reused: {report.reused}, deleted: {report.deleted}"
+        + (f", BM25 rows: {report.lexical_rows}" if report.lexical_rows is not None else ""),
+        fg=typer.colors.GREEN,
+    )
+    typer.echo("Throughput per stage:")
+    for stage in report.stages:
+        typer.echo(stage.line())
+    written, wall = report.embedded + report.reused, report.wall_s
+    typer.echo(f"  {'wall':<10} {written:>7} chunks in {wall:7.2f}s      → {written / wall if wall else 0.0:9.1f} chunks/s")
+    if report.cache:
+        c = report.cache
+        typer.echo(f"Embedding cache: {c['hits']} hits (disk {c['disk_hits']}), "
+                   f"{c['misses']} misses → {c['hit_rate']:.1%} hit rate")
+    typer.echo(f"Peak RSS: {report.peak_rss_mb:.0f} MB" + (
+        f", read workers {report.workers_rss_mb:.0f} MB (shared pages included)"
+        if report.workers_rss_mb is not None else ""))
+
+
+@app.command("submit")
+def submit(
+    kb_dir: Path = typer.Argument(..., help="Folder to ingest: on the API host (under INGEST_ROOT), or local with --upload"),
+    api: str = typer.Option(f"http://localhost:{settings.PORT}", "--api", help="Running RAG API"),
+    collection: str = typer.Option(settings.QDRANT_COLLECTION, "--collection", "-c"),
+    exts: str = typer.Option(".md,.txt", "--exts", help="Comma-separated extensions to include"),
+    full: bool = typer.Option(False, "--full", help="Ignore the manifest and re-embed every file"),
+    upload: bool = typer.Option(False, "--upload", help="Send the local files' contents instead of a server path"),
+    follow: bool = typer.Option(True, "--follow/--no-follow", help="Poll the job until it finishes"),
+    interval: float = typer.Option(2.0, "--interval", help="Seconds between polls"),
+):
+    """Queue the same ingest as a background job on the API (POST /ingest/jobs) and follow its progress."""
+    import httpx
+
+    exts_list = [s.strip().lower() for s in exts.split(",") if s.strip()]
+    body: dict = {"collection": collection, "exts": exts_list, "full": full}
+    if upload:
+        body["files"] = [{"name": f.relative_to(kb_dir).as_posix(),
+                          "content": f.read_text(encoding="utf-8", errors="ignore")}
+                         for f in sorted(iter_files(kb_dir, tuple(exts_list)))]
+    else:
+        body["path"] = str(kb_dir)
+    with httpx.Client(base_url=api, timeout=60.0) as http:
+        r = http.post("/ingest/jobs", json=body).json()
+        if not r.get("ok"):
+            typer.secho(f"Rejected: {r.get('error')}", fg=typer.colors.RED)
+            raise typer.Exit(1)
+        job = r["job"]
+        typer.echo(f"Job {job['id']} queued")
+        while follow and job["status"] in ("queued", "running"):
+            time.sleep(interval)
+            job = http.get(f"/ingest/jobs/{job['id']}").json()["job"]
+            p = job.get("progress") or {}
+            if p.get("phase") == "ingesting":
+                typer.echo(f"  {p['files_done']}/{p['files_total']} files, {p['chunks_written']} chunks, "
+                           f"{p['chunks_per_s']:.1f} chunks/s, ETA {_eta(p.get('eta_s'))}")
+    if job["status"] == "failed":
+        typer.secho(f"Job {job['id']} failed: {job.get('error')}", fg=typer.colors.RED)
+        raise typer.Exit(1)
+    if job["status"] == "done":
+        typer.secho(f"Job {job['id']} done: {json.dumps(job['result'])}", fg=typer.colors.GREEN)
+
+
+def _require_qdrant() -> None:
+    if settings.VECTOR_BACKEND != "qdrant":
+        typer.secho("reindex/rollback need VECTOR_BACKEND=qdrant (aliases are a Qdrant feature)", fg=typer.colors.RED)
+        raise typer.Exit(2)
+
+
+def _smoke_check(collection: str, query: str) -> int:
+    """Points in `collection`; raises unless it has some and `query` finds a hit."""
+    n = client().count(collection, exact=True).count
+    if n == 0:
+        raise RuntimeError(f"{collection} is empty")
+    vec = embed_texts(load_embedder(settings.EMB_PATH), [query])[0]
+    hits = client().query_points(collection, query=vec, limit=1, with_payload=["doc_id"]).points
+    if not hits:
+        raise RuntimeError(f"smoke query {query!r} found nothing in {collection}")
+    typer.echo(f"Smoke query {query!r}: {n} points, top hit {hits[0].payload.get('doc_id')} ({hits[0].score:.3f})")
+    return n
+
+
+def _prune(alias: str, keep: int) -> None:
+    """Drop reindexed versions beyond the newest `keep` (never the one the alias points to)."""
+    current = resolve_alias(alias)
+    old = versions(alias)[:-max(1, keep)]
+    for name in old:
+        if name == current:
+            continue
+        drop_collection(name)
+        Manifest.path_for(name).unlink(missing_ok=True)
+        drop_index(name)
+        typer.echo(f"Dropped old version {name}")
+
+
+@app.command("reindex")
+def reindex(
+    kb_dir: Path = typer.Argument(..., exists=True, file_okay=False, help="Folder with KB files"),
+    alias: str = typer.Option(settings.QDRANT_COLLECTION, "--alias", "-a", help="Alias the API reads (QDRANT_COLLECTION)"),
+    exts: str = typer.Option(".md,.txt", "--exts", help="Comma-separated extensions to include"),
+    batch_size: int = typer.Option(256, "--batch-size", "-b", help="Upsert batch size"),
+    embed_batch_size: int = typer.Option(64, "--embed-batch-size", help="Chunks per encode() call, packed across files"),
+    workers: int = typer.Option(min(4, os.cpu_count() or 1), "--workers", "-w", help="Processes for read+chunk (1 = in-process)"),
+    upsert_concurrency: int = typer.Option(4, "--upsert-concurrency", help="Upsert batches in flight"),
+    sentence_vectors: bool = typer.Option(True, "--sentence-vectors/--no-sentence-vectors",
+                                          help="Also embed each chunk's sentences (for context compression)"),
+    lexical: bool = typer.Option(settings.LEXICAL_INDEX, "--lexical/--no-lexical",
+                                 help="Also build the BM25 index for hybrid retrieval"),
+    smoke_query: str = typer.Option("What is this knowledge base about?", "--smoke-query",
+                                    help="Must return a hit from the new collection before the alias moves"),
+    optimize_timeout: float = typer.Option(600.0, "--optimize-timeout", help="Seconds to wait for HNSW indexing"),
+    keep: int = typer.Option(settings.REINDEX_KEEP_VERSIONS, "--keep", help="Versions kept for rollback, current included"),
+    flip: bool = typer.Option(True, "--flip/--no-flip", help="Move the alias to the new version when it passes"),
+    replace_collection: bool = typer.Option(False, "--replace-collection",
+                                            help="Delete a plain collection named like the alias (first migration only)"),
+):
+    """
+    Rebuild the whole KB into a new collection <alias>_v<timestamp>, then flip the alias to it.
+
+    The new collection is bulk-loaded with HNSW off (m=0, indexing_threshold=0) so
+    upserts don't build the graph batch by batch; indexing is switched on once at
+    the end, with the m and indexing_threshold of the version being replaced (the
+    server defaults on a first build), and the command waits for the optimizer before running a smoke query.
+    Only then is the alias moved, in one atomic call: /ask keeps answering from the
+    old version throughout. The newest --keep versions stay around for `rollback`.
+    """
+    _require_qdrant()
+    t0 = time.perf_counter()
+    name = versioned_name(alias)
+    restore = create_bulk_collection(name, settings.EMB_DIM, like=resolve_alias(alias))
+    typer.echo(f"Building {name} (HNSW deferred)")
+    try:
+        load(kb_dir=kb_dir, collection=name, exts=exts, batch_size=batch_size, embed_batch_size=embed_batch_size,
+             workers=workers, upsert_concurrency=upsert_concurrency, full=True, sentence_vectors=sentence_vectors,
+             lexical=lexical, read_ahead_mb=settings.INGEST_READ_AHEAD_MB,
+             stream_file_mb=settings.INGEST_STREAM_FILE_MB, checkpoint_s=0)
+        waited = finish_bulk_load(name, restore, timeout_s=optimize_timeout)
+        typer.echo(f"Indexed {name} in {waited:.1f}s")
+        _smoke_check(name, smoke_query)
+        if flip:
+            swap_alias(alias, name, replace_collection=replace_collection)
+            if replace_collection:  # these belonged to the plain collection just deleted
+                Manifest.path_for(alias).unlink(missing_ok=True)
+                drop_index(alias)
+    except BaseException:
+        typer.secho(f"Reindex failed, dropping {name}; {alias} is unchanged", fg=typer.colors.RED)
+        drop_collection(name)
+        Manifest.path_for(name).unlink(missing_ok=True)
+        drop_index(name)
+        raise
+
+    if not flip:
+        typer.secho(f"Built {name}; {alias} unchanged (flip it with: rollback --to {name})", fg=typer.colors.GREEN)
+        return
+    typer.secho(f"{alias} → {name} ({time.perf_counter() - t0:.1f}s)", fg=typer.colors.GREEN)
+    _prune(alias, keep)
+
+
+@app.command("rollback")
+def rollback(
+    alias: str = typer.Option(settings.QDRANT_COLLECTION, "--alias", "-a"),
+    to: str = typer.Option("", "--to", help="Version to point the alias at (default: the one before the current)"),
+):
+    """Point the alias at another kept version (instant: no data is copied)."""
+    _require_qdrant()
+    kept, current = versions(alias), resolve_alias(alias)
+    if not to:
+        older = [v for v in kept if v < current]
+        if not older:
+            typer.secho(f"No version older than {current} to roll back to", fg=typer.colors.RED)
+            raise typer.Exit(1)
+        to = older[-1]
+    if to not in kept:
+        typer.secho(f"{to} is not a kept version of {alias}: {', '.join(kept) or 'none'}", fg=typer.colors.RED)
+        raise typer.Exit(1)
+    swap_alias(alias, to)
+    typer.secho(f"{alias} → {to} (was {current})", fg=typer.colors.GREEN)
+
+
+@app.command("versions")
+def list_versions(alias: str = typer.Option(settings.QDRANT_COLLECTION, "--alias", "-a")):
+    """Kept versions of the alias, oldest first; * marks the live one."""
+    _require_qdrant()
+    current = resolve_alias(alias)
+    for name in versions(alias):
+        n = client().count(name, exact=False).count
+        typer.echo(f"{'*' if name == current else ' '} {name}  {n} points")
 
 
 if __name__ == "__main__":
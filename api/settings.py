@@ -4,12 +4,80 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     EMB_PATH: str = "sentence-transformers/all-MiniLM-L6-v2"
     EMB_DIM: int = 384
+    EMB_BACKEND: str = "torch"  # "torch" | "torch-int8" | "onnx" | "openvino" (see api/rag/embed.py)
+    EMB_MODEL_FILE: str = ""  # onnx/openvino: exported file inside EMB_PATH, e.g. "onnx/model_qint8_avx512_vnni.onnx"
+    EMB_CACHE_ENABLED: bool = True  # persistent text -> vector cache, keyed by model + sha256(text)
+    EMB_CACHE_PATH: str = ""  # SQLite file ("" = DATA_DIR/embeddings.sqlite), shared by ingest, workers and the sidecar
+    EMB_CACHE_MAX_MB: float = 1024.0  # least recently used vectors are deleted beyond this
+    EMB_CACHE_MEMORY_ENTRIES: int = 4096  # in-process LRU in front of the file, for hot queries
+    CHUNK_TARGET_TOKENS: int = 200  # chunk size target for ingest (PROMPT_TOKENIZER tokens); keep under the embedder's 256
+    CHUNK_MIN_TOKENS: int = 64  # a smaller chunk absorbs the subsections that follow it
+    INGEST_READ_AHEAD_MB: float = 64.0  # file bytes ingest's read workers may hold ahead of the embedder
+    INGEST_STREAM_FILE_MB: float = 16.0  # bigger files are streamed through the chunker instead of loaded whole
+    INGEST_CHECKPOINT_S: float = 30.0  # ingest commits (barrier + manifest + BM25) this often; a rerun resumes there
+    INGEST_JOBS_ENABLED: bool = True  # POST /ingest/jobs runs ingest in background worker processes
+    INGEST_JOB_WORKERS: int = 1  # jobs run at once (each in its own process; one collection is never ingested twice at once)
+    INGEST_JOB_NICE: int = 10  # niceness of job processes, so /ask keeps the CPU first
+    INGEST_JOB_TORCH_THREADS: int = 0  # torch threads per job process (0 = torch default)
+    INGEST_ROOT: str = "."  # POST /ingest/jobs only reads directories under this one
 
+    VECTOR_BACKEND: str = "qdrant"  # "qdrant" | "local" (in-process NumPy index under DATA_DIR/local)
     QDRANT_URL: str = "http://localhost:6333"
-    QDRANT_COLLECTION: str = "kb_en"
+    QDRANT_COLLECTION: str = "kb_en"  # collection, or the alias `ingest_kb reindex` flips between versions
+    REINDEX_KEEP_VERSIONS: int = 3  # reindexed collections kept (current included) for rollback
+    QDRANT_QUANTIZATION: str = "none"  # "none" | "scalar" (int8, 4x smaller) | "binary" (1 bit/dim, 32x); new collections only
+    QDRANT_ON_DISK: bool = False  # keep original float32 vectors on disk (mmap); quantized ones stay in RAM
+    QDRANT_QUANT_OVERSAMPLING: float = 2.0  # fetch limit*this candidates by quantized score ...
+    QDRANT_QUANT_RESCORE: bool = True  # ... then rescore them with the original vectors
 
     OLLAMA_URL: str = "http://localhost:11434"
     OLLAMA_MODEL: str = "phi3:mini"  # ensure this model is pulled in Ollama
+    OLLAMA_TIMEOUT: float = 120.0
+    OLLAMA_MAX_CONNECTIONS: int = 16  # pooled keep-alive connections to Ollama
+    OLLAMA_KEEP_ALIVE: str = "30m"  # how long Ollama keeps the model loaded after a call
+    OLLAMA_NUM_CTX: int = 4096  # model context window (prompt + answer)
+
+    ANSWER_RESERVE_TOKENS: int = 512  # kept free for the answer (also sent as num_predict)
+    PROMPT_MAX_TOKENS: int = 0  # prompt budget (0 = OLLAMA_NUM_CTX - ANSWER_RESERVE_TOKENS)
+    COMPRESS_CONTEXT: bool = False  # default for the request's `compress`: keep only query-relevant sentences
+    COMPRESS_TOP_SENTENCES: int = 2  # best-matching sentences kept per chunk ...
+    COMPRESS_NEIGHBORS: int = 1  # ... plus this many on each side of each
+    PROMPT_TOKENIZER: str = ""  # tokenizer.json / folder / HF name for packing ("" = EMB_PATH's); set the LLM's for exact budgets
+
+    LEXICAL_INDEX: bool = True  # ingest also builds a BM25 index (DATA_DIR/lexical/<collection>)
+    HYBRID_RETRIEVAL: bool = False  # default for the request's `hybrid`: BM25 + vector search fused with RRF
+    RRF_K: int = 60  # reciprocal rank fusion constant: score = sum of 1 / (RRF_K + rank)
+    LEXICAL_MIN_MATCH: float = 0.3  # hybrid: a BM25-only hit needs this share of the query's best possible BM25 score
+
+    WARMUP_ENABLED: bool = True  # load embedder + Ollama model + collection at startup; gates /ready
+    WARMUP_RETRY_S: float = 5.0  # retry interval for warmup steps whose dependency is down
+
+    BATCH_GEN_CONCURRENCY: int = 2  # default Ollama calls in flight for /ask/batch
+
+    GEN_MAX_CONCURRENCY: int = 1  # generations sent to Ollama at once (match OLLAMA_NUM_PARALLEL)
+    GEN_MAX_QUEUE: int = 64  # waiting generations before new ones get 429
+    GEN_DEADLINE_S: float = 110.0  # interactive default; stays under the UI's 120 s timeout
+    GEN_BATCH_DEADLINE_S: float = 3600.0  # /ask/batch default
+    COALESCE_ENABLED: bool = True  # identical concurrent /ask(/stream) questions share one execution
+
+    CHAT_MAX_SESSIONS: int = 256  # /chat conversations kept per worker (LRU beyond this)
+    CHAT_SESSION_TTL_S: float = 1800.0  # idle conversations expire after this
+
+    EMBED_MODE: str = "inprocess"  # "inprocess" | "sidecar" (one shared model process, see api/scripts/embed_sidecar.py)
+    EMBED_SOCKET: str = ""  # sidecar Unix socket ("" = DATA_DIR/embed.sock)
+    EMBED_SIDECAR_CONNECTIONS: int = 4  # pooled socket connections per API worker
+    EMBED_TORCH_THREADS: int = 0  # torch intra-op threads for whoever owns the model (0 = torch default)
+    EMBED_WORKERS: int = 1  # threads for encode(); torch already parallelises inside one call
+    EMBED_BATCH_MAX: int = 32  # max queries folded into one encode()
+    EMBED_BATCH_WAIT_MS: float = 3.0  # how long the first query waits for company
+
+    DATA_DIR: str = "data"  # local state: collection version stamps, manifests, indexes
+
+    SEMANTIC_CACHE_ENABLED: bool = True
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # min cosine between queries to reuse an answer
+    SEMANTIC_CACHE_TTL_S: float = 3600.0
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 1024
+    SEMANTIC_CACHE_MAX_MB: float = 64.0
 
     HOST: str = "0.0.0.0"
     PORT: int = 8010